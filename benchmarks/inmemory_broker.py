@@ -0,0 +1,170 @@
+"""In-memory stand-in for RabbitMQ, shared by the processes of a load test.
+
+Implements the slice of aio-pika the services use: ``connect_robust``,
+channels, the default exchange, and queues consumed by callback or by
+iterator. Each queue is a ``multiprocessing`` queue created up front, so a
+message published in one process is delivered once, to a consumer of the
+queue in any process. Nothing is persisted, messages published to an
+unknown queue are dropped (as by RabbitMQ's default exchange), and requeued
+messages go to the back of the queue.
+
+    broker = Broker(multiprocessing.get_context("spawn"), ["image.uploaded"])
+    # In each service process, before it connects:
+    broker.install(messaging)
+"""
+
+import asyncio
+import itertools
+import queue
+import threading
+from multiprocessing.context import BaseContext
+from types import ModuleType
+from typing import Any, Awaitable, Callable
+
+_POLL_SECONDS = 0.05
+
+
+class Broker:
+    def __init__(self, context: BaseContext, queue_names: list[str]) -> None:
+        self.queues = {name: context.Queue() for name in queue_names}
+
+    def install(self, messaging: ModuleType) -> None:
+        """Make a service's ``messaging`` module connect to this broker."""
+        messaging.connect_robust = self.connect
+
+    async def connect(self, url: str = "", **kwargs: Any) -> "Connection":
+        return Connection(self)
+
+
+class Connection:
+    def __init__(self, broker: Broker) -> None:
+        self._broker = broker
+        self._consumers: list[_Consumer] = []
+
+    async def channel(self, **kwargs: Any) -> "Channel":
+        return Channel(self)
+
+    async def close(self) -> None:
+        for consumer in self._consumers:
+            consumer.stop()
+
+
+class Channel:
+    def __init__(self, connection: Connection) -> None:
+        self._connection = connection
+        self.default_exchange = Exchange(connection._broker)
+
+    async def set_qos(self, prefetch_count: int = 0, **kwargs: Any) -> None:
+        pass
+
+    async def declare_queue(self, name: str, **kwargs: Any) -> "Queue":
+        return Queue(self._connection, name)
+
+
+class Exchange:
+    def __init__(self, broker: Broker) -> None:
+        self._broker = broker
+
+    async def publish(self, message: Any, routing_key: str, **kwargs: Any) -> None:
+        target = self._broker.queues.get(routing_key)
+        if target is not None:
+            target.put((message.body, dict(message.headers or {}), False))
+
+
+class IncomingMessage:
+    def __init__(
+        self, source: Any, body: bytes, headers: dict, redelivered: bool
+    ) -> None:
+        self._source = source
+        self.body = body
+        self.headers = headers
+        self.redelivered = redelivered
+
+    async def ack(self) -> None:
+        pass
+
+    async def nack(self, requeue: bool = True) -> None:
+        if requeue:
+            self._source.put((self.body, self.headers, True))
+
+    async def reject(self, requeue: bool = False) -> None:
+        await self.nack(requeue=requeue)
+
+
+class _Consumer:
+    """Moves messages from a process-shared queue into this event loop."""
+
+    def __init__(self, source: Any) -> None:
+        self._source = source
+        self._loop = asyncio.get_running_loop()
+        self._stopped = threading.Event()
+        self.messages: asyncio.Queue[IncomingMessage] = asyncio.Queue()
+        threading.Thread(target=self._pump, daemon=True).start()
+
+    def _pump(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                body, headers, redelivered = self._source.get(timeout=_POLL_SECONDS)
+            except queue.Empty:
+                continue
+            message = IncomingMessage(self._source, body, headers, redelivered)
+            self._loop.call_soon_threadsafe(self.messages.put_nowait, message)
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+class Queue:
+    def __init__(self, connection: Connection, name: str) -> None:
+        self._connection = connection
+        self._source = connection._broker.queues[name]
+        self._tags = itertools.count()
+        self._consumers: dict[str, tuple[_Consumer, asyncio.Task]] = {}
+
+    def _consumer(self) -> _Consumer:
+        consumer = _Consumer(self._source)
+        self._connection._consumers.append(consumer)
+        return consumer
+
+    async def consume(
+        self, callback: Callable[[IncomingMessage], Awaitable[None]]
+    ) -> str:
+        consumer = self._consumer()
+        tasks: set[asyncio.Task] = set()
+
+        async def deliver() -> None:
+            while True:
+                task = asyncio.create_task(callback(await consumer.messages.get()))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+
+        tag = f"ctag-{next(self._tags)}"
+        self._consumers[tag] = (consumer, asyncio.create_task(deliver()))
+        return tag
+
+    async def cancel(self, tag: str) -> None:
+        consumer, task = self._consumers.pop(tag)
+        consumer.stop()
+        task.cancel()
+
+    def iterator(self) -> "QueueIterator":
+        return QueueIterator(self)
+
+
+class QueueIterator:
+    def __init__(self, queue: Queue) -> None:
+        self._queue = queue
+        self._consumer: _Consumer | None = None
+
+    async def __aenter__(self) -> "QueueIterator":
+        self._consumer = self._queue._consumer()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        self._consumer.stop()
+
+    def __aiter__(self) -> "QueueIterator":
+        return self
+
+    async def __anext__(self) -> IncomingMessage:
+        return await self._consumer.messages.get()
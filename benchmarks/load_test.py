@@ -0,0 +1,528 @@
+"""End-to-end load test of gateway, storage and preview on local stand-ins.
+
+Each service runs in its own process, as in production, but nothing else
+is needed: object storage is the in-memory S3 from
+``services/storage/benchmarks``, the database a SQLite file (or any
+``--database-url``), and RabbitMQ the in-memory broker next to this file.
+
+Seed images are uploaded first and timed until their previews are
+recorded, which covers the whole upload-to-preview pipeline. Then
+``--concurrency`` clients send a weighted mix of uploads, metadata reads,
+downloads and preview fetches through the gateway for ``--duration``
+seconds. The report gives throughput and latency per operation and the
+peak RSS of each service as JSON; pass an earlier report as ``--compare``
+to print the differences.
+
+    python benchmarks/load_test.py --duration 30 --concurrency 32 \\
+        --mix upload=1,metadata=4,download=2,preview=4 --output run.json
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+import httpx
+
+from inmemory_broker import Broker
+
+ROOT = Path(__file__).resolve().parents[1]
+SERVICES = ROOT / "services"
+# Storage first: its benchmarks package (fake_s3) must win over preview's.
+sys.path[:0] = [
+    str(SERVICES / name) for name in ("storage", "gateway", "preview", "common")
+]
+
+OPERATIONS = ("upload", "metadata", "download", "preview")
+PREVIEW_SIZES = (256, 512, 1024)
+QUEUES = ("image.uploaded", "preview.generated")
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def _latency_ms(values: list[float]) -> dict | None:
+    if not values:
+        return None
+    return {
+        "p50": round(_percentile(values, 50) * 1000, 2),
+        "p99": round(_percentile(values, 99) * 1000, 2),
+        "max": round(max(values) * 1000, 2),
+    }
+
+
+def _peak_rss_mib(who: int) -> float:
+    peak = resource.getrusage(who).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+# --- service processes ------------------------------------------------------
+
+
+def _serve(app: Any, port: int, stop: Any) -> None:
+    import uvicorn
+
+    server = uvicorn.Server(
+        uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning")
+    )
+
+    def wait_for_stop() -> None:
+        stop.wait()
+        server.should_exit = True
+
+    threading.Thread(target=wait_for_stop, daemon=True).start()
+    server.run()
+
+
+def _fake_s3(port: int, stop: Any, broker: Broker, latency: float) -> None:
+    from benchmarks.fake_s3 import FakeS3
+
+    _serve(FakeS3(latency).app(), port, stop)
+
+
+def _storage(port: int, stop: Any, broker: Broker, latency: float) -> None:
+    from storage import main, messaging
+
+    broker.install(messaging)
+    _serve(main.app, port, stop)
+
+
+def _gateway(port: int, stop: Any, broker: Broker, latency: float) -> None:
+    from gateway import main
+
+    _serve(main.app, port, stop)
+
+
+def _preview(port: int, stop: Any, broker: Broker, latency: float) -> None:
+    from preview import main, messaging
+
+    broker.install(messaging)
+
+    async def run() -> None:
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+
+        def wait_for_stop() -> None:
+            stop.wait()
+            loop.call_soon_threadsafe(task.cancel)
+
+        threading.Thread(target=wait_for_stop, daemon=True).start()
+        try:
+            await main.main()
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+
+
+def _run_service(
+    name: str,
+    target: Callable[..., None],
+    env: dict[str, str],
+    log_level: str,
+    results: Any,
+    *args: Any,
+) -> None:
+    os.environ.update(env)
+    # Set before the services configure logging, which then does nothing.
+    logging.basicConfig(level=log_level.upper())
+    try:
+        target(*args)
+    finally:
+        peak = {name: _peak_rss_mib(resource.RUSAGE_SELF)}
+        if name == "preview":
+            # The largest of the processing pool's workers.
+            peak["preview_pool"] = _peak_rss_mib(resource.RUSAGE_CHILDREN)
+        results.put(peak)
+
+
+class Stack:
+    """The services and stand-ins, each in a process of its own."""
+
+    def __init__(self, args: argparse.Namespace, workdir: str) -> None:
+        self.args = args
+        self.context = multiprocessing.get_context("spawn")
+        self.broker = Broker(self.context, list(QUEUES))
+        self.results = self.context.Queue()
+        self.ports = {name: _free_port() for name in ("s3", "storage", "gateway")}
+        self.processes: list[tuple[str, Any, Any]] = []
+        s3 = f"127.0.0.1:{self.ports['s3']}"
+        database_url = args.database_url or (
+            f"sqlite+aiosqlite:///{os.path.join(workdir, 'storage.db')}"
+        )
+        self.env = {
+            "STORAGE_DATABASE_URL": database_url,
+            "STORAGE_MINIO_ENDPOINT": s3,
+            "STORAGE_MINIO_ACCESS_KEY": "bench",
+            "STORAGE_MINIO_SECRET_KEY": "bench-secret",
+            "GATEWAY_STORAGE_BASE_URL": f"http://127.0.0.1:{self.ports['storage']}",
+            "PREVIEW_MINIO_ENDPOINT": s3,
+            "PREVIEW_MINIO_ACCESS_KEY": "bench",
+            "PREVIEW_MINIO_SECRET_KEY": "bench-secret",
+            "PREVIEW_METRICS_PORT": "0",
+        }
+        if args.processing_workers is not None:
+            self.env["PREVIEW_PROCESSING_WORKERS"] = str(args.processing_workers)
+        for item in args.env:
+            key, _, value = item.partition("=")
+            self.env[key] = value
+
+    def _start(self, name: str, target: Callable[..., None], port: int) -> None:
+        stop = self.context.Event()
+        process = self.context.Process(
+            target=_run_service,
+            args=(
+                name,
+                target,
+                self.env,
+                self.args.log_level,
+                self.results,
+                port,
+                stop,
+                self.broker,
+                self.args.s3_latency_ms / 1000,
+            ),
+            name=name,
+        )
+        process.start()
+        self.processes.append((name, process, stop))
+
+    def start(self) -> None:
+        self._start("fake_s3", _fake_s3, self.ports["s3"])
+        _wait_for_http(f"http://127.0.0.1:{self.ports['s3']}/")
+        self._start("storage", _storage, self.ports["storage"])
+        _wait_for_http(f"http://127.0.0.1:{self.ports['storage']}/stats")
+        self._start("preview", _preview, 0)
+        self._start("gateway", _gateway, self.ports["gateway"])
+        _wait_for_http(f"http://127.0.0.1:{self.ports['gateway']}/stats")
+
+    def stop(self) -> dict[str, float]:
+        """Stop the processes, front to back, and return their peak RSS."""
+        for _, process, stop in reversed(self.processes):
+            stop.set()
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        peak: dict[str, float] = {}
+        for _ in self.processes:
+            try:
+                peak.update(self.results.get(timeout=5))
+            except queue.Empty:
+                break
+        return peak
+
+
+def _wait_for_http(url: str, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up")
+
+
+# --- load -------------------------------------------------------------------
+
+
+def _corpus(count: int, size: tuple[int, int], seed: int) -> list[bytes]:
+    from PIL import Image
+
+    rng = random.Random(seed)
+    images = []
+    for _ in range(count):
+        noise = Image.effect_noise(size, 48).convert("RGB")
+        tint = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+        buffer = io.BytesIO()
+        Image.blend(noise, tint, 0.5).save(buffer, format="JPEG", quality=85)
+        images.append(buffer.getvalue())
+    return images
+
+
+class Load:
+    def __init__(
+        self, client: httpx.AsyncClient, corpus: list[bytes], rng: random.Random
+    ) -> None:
+        self.client = client
+        self.corpus = corpus
+        self.rng = rng
+        self.image_ids: list[str] = []
+        self.latencies: dict[str, list[float]] = {op: [] for op in OPERATIONS}
+        # Per operation, the number of failures by status code (or error).
+        self.errors: dict[str, dict[str, int]] = {op: {} for op in OPERATIONS}
+
+    async def upload(self) -> httpx.Response:
+        content = self.rng.choice(self.corpus)
+        response = await self.client.post(
+            "/images", files={"file": ("bench.jpg", content, "image/jpeg")}
+        )
+        if response.status_code == 201:
+            self.image_ids.append(response.json()["id"])
+        return response
+
+    async def metadata(self) -> httpx.Response:
+        image_id = self.rng.choice(self.image_ids)
+        return await self.client.get(f"/images/{image_id}")
+
+    async def download(self) -> httpx.Response:
+        image_id = self.rng.choice(self.image_ids)
+        return await self.client.get(f"/images/{image_id}/file")
+
+    async def preview(self) -> httpx.Response:
+        image_id = self.rng.choice(self.image_ids)
+        size = self.rng.choice(PREVIEW_SIZES)
+        return await self.client.get(f"/images/{image_id}/preview/{size}")
+
+    async def run_one(self, op: str) -> httpx.Response | None:
+        started = time.perf_counter()
+        try:
+            response = await getattr(self, op)()
+        except httpx.HTTPError as exc:
+            error = type(exc).__name__
+        else:
+            if response.is_success:
+                self.latencies[op].append(time.perf_counter() - started)
+                return response
+            error = str(response.status_code)
+        self.errors[op][error] = self.errors[op].get(error, 0) + 1
+        return None
+
+
+async def _seed(load: Load, count: int, timeout: float) -> dict:
+    """Upload ``count`` images and time each until its previews are recorded."""
+
+    async def one() -> float | None:
+        started = time.perf_counter()
+        response = await load.run_one("upload")
+        if response is None:
+            return None
+        image_id = response.json()["id"]
+        while time.perf_counter() - started < timeout:
+            response = await load.client.get(f"/images/{image_id}")
+            if response.status_code == 200 and response.json().get("previews"):
+                return time.perf_counter() - started
+            await asyncio.sleep(0.05)
+        return None
+
+    lags = await asyncio.gather(*(one() for _ in range(count)))
+    ready = [lag for lag in lags if lag is not None]
+    return {
+        "images": count,
+        "timed_out": count - len(ready),
+        "upload_to_preview_ms": _latency_ms(ready),
+    }
+
+
+async def _drive(args: argparse.Namespace, base_url: str) -> dict:
+    rng = random.Random(args.seed)
+    width, _, height = args.image_size.partition("x")
+    corpus = _corpus(args.corpus, (int(width), int(height)), args.seed)
+    ops = list(args.mix)
+    weights = [args.mix[op] for op in ops]
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=base_url, limits=limits, timeout=60.0
+    ) as client:
+        load = Load(client, corpus, rng)
+        pipeline = await _seed(load, args.seed_images, args.preview_timeout)
+        if not load.image_ids:
+            raise RuntimeError(f"No seed image could be uploaded: {load.errors}")
+        # Only the mixed load is reported per operation.
+        load.latencies["upload"].clear()
+        load.errors["upload"].clear()
+
+        deadline = time.perf_counter() + args.duration
+
+        async def worker() -> None:
+            while time.perf_counter() < deadline:
+                await load.run_one(rng.choices(ops, weights)[0])
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+
+    operations = {}
+    for op in ops:
+        done = load.latencies[op]
+        errors = sum(load.errors[op].values())
+        operations[op] = {
+            "requests": len(done) + errors,
+            "errors": errors,
+            "errors_by_status": load.errors[op],
+            "throughput_rps": round(len(done) / elapsed, 1),
+            "latency_ms": _latency_ms(done),
+        }
+    everything = [value for op in ops for value in load.latencies[op]]
+    errors = sum(operations[op]["errors"] for op in ops)
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "operations": operations,
+        "total": {
+            "requests": len(everything) + errors,
+            "errors": errors,
+            "throughput_rps": round(len(everything) / elapsed, 1),
+            "latency_ms": _latency_ms(everything),
+        },
+        "preview_pipeline": pipeline,
+    }
+
+
+# --- reporting --------------------------------------------------------------
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _flatten(report: dict, prefix: str = "") -> dict[str, float]:
+    values: dict[str, float] = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            values.update(_flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            values[name] = value
+    return values
+
+
+def _compare(baseline: dict, report: dict) -> str:
+    """A table of the numbers that differ between two reports."""
+    sections = ("operations", "total", "preview_pipeline", "peak_rss_mib")
+    before = _flatten({key: baseline.get(key, {}) for key in sections})
+    after = _flatten({key: report.get(key, {}) for key in sections})
+    lines = [
+        f"{'metric':<48} {'baseline':>12} {'current':>12} {'change':>8}",
+    ]
+    for name in sorted(before.keys() & after.keys()):
+        old, new = before[name], after[name]
+        if old == new:
+            continue
+        change = f"{(new - old) / old * 100:+.1f}%" if old else "n/a"
+        lines.append(f"{name:<48} {old:>12} {new:>12} {change:>8}")
+    return "\n".join(lines)
+
+
+def _parse_mix(value: str) -> dict[str, float]:
+    mix = {}
+    for item in value.split(","):
+        op, _, weight = item.partition("=")
+        if op not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f"Unknown operation: {op}")
+        mix[op] = float(weight or 1)
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError("All weights are zero")
+    return mix
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--duration", type=float, default=20.0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument(
+        "--mix",
+        type=_parse_mix,
+        default="upload=1,metadata=4,download=2,preview=4",
+        help="weights of the operations, e.g. upload=1,preview=4",
+    )
+    parser.add_argument("--seed-images", type=int, default=16)
+    parser.add_argument("--preview-timeout", type=float, default=60.0)
+    parser.add_argument("--image-size", default="1600x1200")
+    parser.add_argument("--corpus", type=int, default=8, help="distinct images")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--s3-latency-ms", type=float, default=1.0)
+    parser.add_argument(
+        "--database-url", help="storage database; a temporary SQLite file if unset"
+    )
+    parser.add_argument(
+        "--processing-workers", type=int, help="PREVIEW_PROCESSING_WORKERS"
+    )
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="extra service settings, e.g. STORAGE_DOWNLOAD_MODE=proxy",
+    )
+    parser.add_argument("--log-level", default="warning")
+    parser.add_argument("--output", help="write the report here, not to stdout")
+    parser.add_argument("--compare", help="an earlier report to compare against")
+    args = parser.parse_args()
+
+    started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    with tempfile.TemporaryDirectory() as workdir:
+        stack = Stack(args, workdir)
+        try:
+            stack.start()
+            results = asyncio.run(
+                _drive(args, f"http://127.0.0.1:{stack.ports['gateway']}")
+            )
+        finally:
+            peak_rss = stack.stop()
+
+    report = {
+        "commit": _commit(),
+        "started_at": started_at,
+        "config": {
+            "duration_s": args.duration,
+            "concurrency": args.concurrency,
+            "mix": args.mix,
+            "seed_images": args.seed_images,
+            "image_size": args.image_size,
+            "s3_latency_ms": args.s3_latency_ms,
+            "database": "sqlite" if not args.database_url else "external",
+            "processing_workers": args.processing_workers,
+            "env": args.env,
+        },
+        **results,
+        "peak_rss_mib": peak_rss,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+    else:
+        print(output)
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print(_compare(baseline, report), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""HTTP conditional request evaluation, shared by storage and the gateway.
+
+Storage answers revalidations from image metadata and the gateway from
+the validators of the responses it caches; both must answer alike.
+"""
+
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def parse_http_date(value: str | None) -> datetime | None:
+    try:
+        return _as_utc(parsedate_to_datetime(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def _truncate(value: datetime) -> datetime:
+    # HTTP dates have one-second resolution.
+    return _as_utc(value).replace(microsecond=0)
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def etag_matches(header: str, etag: str | None) -> bool:
+    """Weak comparison of ``etag`` against an ``If-None-Match`` list."""
+    if header.strip() == "*":
+        return True
+    if etag is None:
+        return False
+    target = _opaque(etag)
+    return any(_opaque(candidate) == target for candidate in header.split(","))
+
+
+def is_not_modified(
+    if_none_match: str | None,
+    if_modified_since: str | None,
+    etag: str | None,
+    last_modified: datetime | None,
+) -> bool:
+    """Whether a GET or HEAD may be answered with 304 (RFC 9110, 13.2.2).
+
+    ``If-Modified-Since`` only counts without ``If-None-Match``. A missing
+    validator matches nothing but ``If-None-Match: *``.
+    """
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if if_modified_since is not None and last_modified is not None:
+        since = parse_http_date(if_modified_since)
+        return since is not None and _truncate(last_modified) <= since
+    return False
+
+
+def if_range_matches(
+    if_range: str | None, etag: str, last_modified: datetime
+) -> bool:
+    """Whether a ``Range`` request may be honoured given its ``If-Range``."""
+    if if_range is None:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', "W/")):
+        # If-Range requires strong comparison, so weak tags never match.
+        return not if_range.startswith("W/") and if_range == etag
+    date = parse_http_date(if_range)
+    return date is not None and _truncate(last_modified) == date
+
+
+def validator_headers(
+    etag: str, last_modified: datetime, expires_at: datetime
+) -> dict[str, str]:
+    """Validators and a Cache-Control lifetime that never outlives the image."""
+    remaining = _as_utc(expires_at) - datetime.now(timezone.utc)
+    max_age = max(int(remaining.total_seconds()), 0)
+    return {
+        "ETag": etag,
+        "Last-Modified": format_datetime(_truncate(last_modified), usegmt=True),
+        "Cache-Control": f"public, max-age={max_age}, immutable",
+    }
@@ -0,0 +1,96 @@
+"""Preview encoding shared by the preview worker and on-demand renders.
+
+Both must produce the same preview for the same original, so the formats,
+box fitting and encoder settings live here once.
+"""
+
+import io
+
+from PIL import Image
+
+try:
+    import pillow_avif  # noqa: F401 - registers an AVIF encoder with Pillow
+except ImportError:  # pragma: no cover - optional dependency
+    pillow_avif = None
+
+CONTENT_TYPE_TO_FORMAT = {
+    "image/jpeg": "JPEG",
+    "image/png": "PNG",
+    "image/gif": "GIF",
+    "image/webp": "WEBP",
+    "image/bmp": "BMP",
+}
+
+# Box sizes the preview worker renders by default and storage serves.
+PREVIEW_SIZES = [256, 512, 1024]
+
+# Extra encodings stored next to the original-format preview, keyed by the
+# name used in settings and in object names.
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "avif": ("AVIF", "image/avif"),
+}
+
+
+def parse_variant_formats(value: str | list[str]) -> list[str]:
+    """Variant names from a comma-separated string or a list, validated."""
+    if isinstance(value, str):
+        value = [item for item in value.split(",") if item.strip()]
+    formats = [item.strip().lower() for item in value]
+    unknown = set(formats) - set(VARIANT_FORMATS)
+    if unknown:
+        raise ValueError(f"Unsupported preview formats: {sorted(unknown)}")
+    return formats
+
+
+def parse_preview_sizes(value: str | list[int]) -> list[int]:
+    """Preview sizes from a comma-separated string or a list, validated."""
+    if isinstance(value, str):
+        value = [int(item) for item in value.split(",") if item.strip()]
+    if any(size <= 0 for size in value):
+        raise ValueError("Preview sizes must be positive")
+    return value
+
+
+def can_encode(variant: str) -> bool:
+    Image.init()
+    return VARIANT_FORMATS[variant][0] in Image.SAVE
+
+
+def resolve_format(content_type: str | None, fallback: str | None) -> str:
+    """Pillow format for a preview kept in the original's format."""
+    fmt = CONTENT_TYPE_TO_FORMAT.get((content_type or "").lower())
+    return (fmt or fallback or "PNG").upper()
+
+
+def fit(width: int, height: int, size: int) -> tuple[int, int]:
+    """Dimensions that fit a ``size`` square box, like ``Image.thumbnail``."""
+    if width <= size and height <= size:
+        return width, height
+    if width >= height:
+        return size, max(round(height * size / width), 1)
+    return max(round(width * size / height), 1), size
+
+
+def flatten_palette(image: Image.Image) -> Image.Image:
+    """Palette images can only be resized with NEAREST, so expand them."""
+    if image.mode == "P":
+        return image.convert("RGBA" if "transparency" in image.info else "RGB")
+    return image
+
+
+def encode(image: Image.Image, output_format: str) -> bytes:
+    save_kwargs: dict[str, object] = {}
+    if output_format == "JPEG":
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        save_kwargs["optimize"] = True
+        save_kwargs["quality"] = 85
+    elif output_format in ("WEBP", "AVIF"):
+        if image.mode not in ("RGB", "RGBA"):
+            alpha = "A" in image.mode or "transparency" in image.info
+            image = image.convert("RGBA" if alpha else "RGB")
+        save_kwargs["quality"] = 80 if output_format == "WEBP" else 60
+    buffer = io.BytesIO()
+    image.save(buffer, format=output_format, **save_kwargs)
+    return buffer.getvalue()
@@ -0,0 +1,52 @@
+"""Request metrics middleware shared by the HTTP services."""
+
+import time
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from prometheus_client import Histogram
+    from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class MetricsMiddleware:
+    """Observes ``histogram`` for every HTTP request.
+
+    The histogram is labelled by method, route and status. Routes are
+    labelled by their path template, so ids in URLs do not add label
+    values; requests that match no route share ``"unmatched"``.
+    """
+
+    def __init__(self, app: "ASGIApp", histogram: "Histogram") -> None:
+        self.app = app
+        self.histogram = histogram
+
+    async def __call__(
+        self, scope: "Scope", receive: "Receive", send: "Send"
+    ) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = None
+
+        def observe(code: int) -> None:
+            route = scope.get("route")
+            self.histogram.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(code),
+            ).observe(time.perf_counter() - started)
+
+        async def send_wrapper(message: "Message") -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                observe(status)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if status is None:
+                observe(500)
@@ -0,0 +1,73 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Generic, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class _Call(Generic[T]):
+    def __init__(
+        self, task: asyncio.Task, discard: Callable[[T], Any] | None
+    ) -> None:
+        self.task = task
+        self.discard = discard
+        self.waiters = 0
+
+    def abandoned(self) -> None:
+        """Hand the result to ``discard`` once no caller is left to take it."""
+        if self.waiters or self.discard is None or not self.task.done():
+            return
+        if not self.task.cancelled() and self.task.exception() is None:
+            self.discard(self.task.result())
+        self.discard = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one execution.
+
+    The shared call runs as its own task, so a caller that goes away (e.g. a
+    disconnected client) does not cancel it for the others still waiting.
+    If every caller goes away, its result is passed to ``discard``, e.g. to
+    release what it holds.
+    """
+
+    def __init__(self) -> None:
+        self._calls: dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(
+        self,
+        key: Hashable,
+        func: Callable[[], Awaitable[T]],
+        discard: Callable[[T], Any] | None = None,
+    ) -> T:
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()), discard)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda done: self._forget(key, call))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        except asyncio.CancelledError:
+            call.waiters -= 1
+            call.abandoned()
+            raise
+
+    def _forget(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            # Mark the exception retrieved in case every caller went away.
+            call.task.exception()
+        call.abandoned()
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "in_flight": len(self._calls),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,174 @@
+"""Optional OpenTelemetry tracing, shared by the services.
+
+Spans are recorded only once ``init_tracing`` is called with a service's
+settings naming an exporter, and the OpenTelemetry SDK is installed;
+otherwise every helper here is a no-op. Trace context travels in W3C
+``traceparent`` headers, over HTTP and in AMQP message headers alike.
+"""
+
+import logging
+import threading
+from contextlib import AbstractContextManager, nullcontext
+from typing import TYPE_CHECKING, Any, Mapping, Protocol
+
+if TYPE_CHECKING:
+    from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    from opentelemetry import propagate
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, SpanExportResult
+    from opentelemetry.trace import SpanKind, Tracer
+except ImportError:  # pragma: no cover - optional dependency
+    propagate = None
+    Tracer = None
+
+log = logging.getLogger(__name__)
+
+_provider: "TracerProvider | None" = None
+_tracer: "Tracer | None" = None
+
+
+class TracingSettings(Protocol):
+    """The tracing fields every service's settings have."""
+
+    tracing_exporter: str
+    tracing_file_path: str
+    tracing_otlp_endpoint: str | None
+
+
+class JsonLinesExporter:
+    """Appends each finished span to a file as one line of JSON."""
+
+    def __init__(self, path: str) -> None:
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, spans) -> "SpanExportResult":
+        with self._lock:
+            for span in spans:
+                self._file.write(span.to_json(indent=None) + "\n")
+            self._file.flush()
+        return SpanExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def _create_exporter(settings: TracingSettings):
+    if settings.tracing_exporter == "file":
+        return JsonLinesExporter(settings.tracing_file_path)
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+    except ImportError:
+        log.warning("opentelemetry-exporter-otlp-proto-http not installed")
+        return None
+    # Without an endpoint, the exporter reads OTEL_EXPORTER_OTLP_* variables.
+    return OTLPSpanExporter(endpoint=settings.tracing_otlp_endpoint)
+
+
+def init_tracing(service_name: str, settings: TracingSettings) -> None:
+    global _provider, _tracer
+    if settings.tracing_exporter == "none" or _tracer is not None:
+        return
+    if propagate is None:
+        log.warning("OpenTelemetry SDK not installed; tracing disabled")
+        return
+    exporter = _create_exporter(settings)
+    if exporter is None:
+        log.warning("No span exporter available; tracing disabled")
+        return
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": service_name})
+    )
+    _provider.add_span_processor(BatchSpanProcessor(exporter))
+    _tracer = _provider.get_tracer(__name__)
+
+
+def shutdown_tracing() -> None:
+    """Export the spans still buffered and stop tracing."""
+    global _provider, _tracer
+    if _provider is not None:
+        _provider.shutdown()
+        _provider = _tracer = None
+
+
+def span(
+    name: str,
+    parent: Mapping[str, Any] | None = None,
+    kind: str = "internal",
+    **attributes: Any,
+) -> AbstractContextManager:
+    """Context manager recording a span under the current one.
+
+    ``parent`` takes propagation headers to continue a remote trace
+    instead, e.g. those of an incoming request or message.
+    """
+    if _tracer is None:
+        return nullcontext()
+    return _tracer.start_as_current_span(
+        name,
+        context=propagate.extract(parent) if parent is not None else None,
+        kind=SpanKind[kind.upper()],
+        attributes=attributes,
+    )
+
+
+def inject() -> dict[str, str]:
+    """Headers carrying the current trace context; empty when not tracing."""
+    headers: dict[str, str] = {}
+    if _tracer is not None:
+        propagate.inject(headers)
+    return headers
+
+
+def record_span(name: str, start_ns: int, end_ns: int, **attributes: Any) -> None:
+    """Record a span that has already finished, under the current span.
+
+    For work timed elsewhere, such as in a processing pool worker.
+    """
+    if _tracer is None:
+        return
+    _tracer.start_span(name, start_time=start_ns, attributes=attributes).end(
+        end_time=end_ns
+    )
+
+
+class TracingMiddleware:
+    """Records a server span per HTTP request, continuing the caller's trace."""
+
+    def __init__(self, app: "ASGIApp") -> None:
+        self.app = app
+
+    async def __call__(
+        self, scope: "Scope", receive: "Receive", send: "Send"
+    ) -> None:
+        if scope["type"] != "http" or _tracer is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        with span(scope["method"], parent=headers, kind="server") as current:
+
+            async def send_wrapper(message: "Message") -> None:
+                if message["type"] == "http.response.start":
+                    current.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                route = getattr(scope.get("route"), "path", None)
+                if route is not None:
+                    current.update_name(f"{scope['method']} {route}")
+                    current.set_attribute("http.route", route)
@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from common.conditional import (
+    etag_matches,
+    if_range_matches,
+    is_not_modified,
+    validator_headers,
+)
+
+CREATED_AT = datetime(2024, 5, 10, 12, 30, 15, 123456, tzinfo=timezone.utc)
+HTTP_DATE = "Fri, 10 May 2024 12:30:15 GMT"
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ('"abc"', True),
+        ('W/"abc"', True),
+        ('"x", "abc"', True),
+        ("*", True),
+        ('"abcd"', False),
+    ],
+)
+def test_etag_matches(header: str, expected: bool) -> None:
+    assert etag_matches(header, '"abc"') is expected
+
+
+def test_if_none_match_takes_precedence_over_if_modified_since() -> None:
+    assert not is_not_modified('"other"', HTTP_DATE, '"abc"', CREATED_AT)
+    assert is_not_modified('"abc"', None, '"abc"', CREATED_AT)
+
+
+def test_missing_validators_match_nothing_but_a_wildcard() -> None:
+    assert not is_not_modified('"abc"', None, None, CREATED_AT)
+    assert not is_not_modified(None, HTTP_DATE, '"abc"', None)
+    assert is_not_modified("*", None, None, None)
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        (HTTP_DATE, True),
+        ("Sat, 11 May 2024 00:00:00 GMT", True),
+        ("Fri, 10 May 2024 12:30:14 GMT", False),
+        ("not a date", False),
+    ],
+)
+def test_if_modified_since(header: str, expected: bool) -> None:
+    assert is_not_modified(None, header, '"abc"', CREATED_AT) is expected
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        (None, True),
+        ('"abc"', True),
+        ('W/"abc"', False),
+        ('"other"', False),
+        (HTTP_DATE, True),
+        ("Sat, 11 May 2024 00:00:00 GMT", False),
+    ],
+)
+def test_if_range_matches(header: str | None, expected: bool) -> None:
+    assert if_range_matches(header, '"abc"', CREATED_AT) is expected
+
+
+def test_validator_headers_bound_max_age_by_expiry() -> None:
+    expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
+
+    headers = validator_headers('"abc"', CREATED_AT, expires_at)
+
+    assert headers["ETag"] == '"abc"'
+    assert headers["Last-Modified"] == HTTP_DATE
+    max_age = int(headers["Cache-Control"].split("max-age=")[1].split(",")[0])
+    assert 3590 <= max_age <= 3600
+
+
+def test_validator_headers_never_negative_for_expired_images() -> None:
+    expires_at = datetime.now(timezone.utc) - timedelta(hours=1)
+
+    headers = validator_headers('"abc"', CREATED_AT, expires_at)
+
+    assert "max-age=0," in headers["Cache-Control"]
@@ -0,0 +1,66 @@
+import io
+
+import pytest
+from PIL import Image
+
+from common.imaging import (
+    encode,
+    fit,
+    flatten_palette,
+    parse_preview_sizes,
+    parse_variant_formats,
+    resolve_format,
+)
+
+
+def test_parse_variant_formats_splits_and_normalises() -> None:
+    assert parse_variant_formats(" WebP, avif,") == ["webp", "avif"]
+    assert parse_variant_formats(["AVIF"]) == ["avif"]
+
+
+def test_parse_variant_formats_rejects_unknown_names() -> None:
+    with pytest.raises(ValueError, match="Unsupported preview formats"):
+        parse_variant_formats("webp,heic")
+
+
+def test_parse_preview_sizes_splits_and_validates() -> None:
+    assert parse_preview_sizes("128, 640,") == [128, 640]
+    assert parse_preview_sizes([256]) == [256]
+    with pytest.raises(ValueError, match="must be positive"):
+        parse_preview_sizes("256,0")
+
+
+def test_resolve_format_prefers_the_content_type() -> None:
+    assert resolve_format("IMAGE/JPEG", "PNG") == "JPEG"
+    assert resolve_format("application/octet-stream", "gif") == "GIF"
+    assert resolve_format(None, None) == "PNG"
+
+
+def test_fit_keeps_aspect_ratio_and_never_upscales() -> None:
+    assert fit(4000, 1000, 512) == (512, 128)
+    assert fit(1000, 4000, 512) == (128, 512)
+    assert fit(300, 200, 512) == (300, 200)
+    assert fit(10000, 1, 512) == (512, 1)
+
+
+def test_flatten_palette_keeps_transparency() -> None:
+    opaque = Image.new("P", (4, 4))
+    transparent = Image.new("P", (4, 4))
+    transparent.info["transparency"] = 0
+
+    assert flatten_palette(opaque).mode == "RGB"
+    assert flatten_palette(transparent).mode == "RGBA"
+
+
+@pytest.mark.parametrize(
+    ("mode", "output_format", "expected_mode"),
+    [("RGBA", "JPEG", "RGB"), ("LA", "WEBP", "RGBA"), ("L", "WEBP", "RGB")],
+)
+def test_encode_converts_to_a_mode_the_format_supports(
+    mode: str, output_format: str, expected_mode: str
+) -> None:
+    content = encode(Image.new(mode, (8, 8)), output_format)
+
+    with Image.open(io.BytesIO(content)) as decoded:
+        assert decoded.format == output_format
+        assert decoded.mode == expected_mode
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+from prometheus_client import CollectorRegistry, Histogram
+
+from common.metrics import MetricsMiddleware
+
+REGISTRY = CollectorRegistry()
+REQUEST_SECONDS = Histogram(
+    "test_http_request_duration_seconds",
+    "Time from receiving a request to sending its response headers.",
+    ["method", "route", "status"],
+    registry=REGISTRY,
+)
+
+
+def _count(route: str, status: str) -> float:
+    value = REGISTRY.get_sample_value(
+        "test_http_request_duration_seconds_count",
+        {"method": "GET", "route": route, "status": status},
+    )
+    return value or 0.0
+
+
+def _call(app) -> None:
+    async def receive() -> dict:
+        return {"type": "http.request", "body": b""}
+
+    async def send(message: dict) -> None:
+        pass
+
+    scope = {"type": "http", "method": "GET", "path": "/images/123"}
+    asyncio.run(MetricsMiddleware(app, REQUEST_SECONDS)(scope, receive, send))
+
+
+def test_requests_are_labelled_by_route_template() -> None:
+    before = _count("/images/{image_id}", "200")
+
+    async def app(scope, receive, send) -> None:
+        scope["route"] = SimpleNamespace(path="/images/{image_id}")
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    _call(app)
+
+    assert _count("/images/{image_id}", "200") == before + 1
+
+
+def test_failed_requests_count_as_server_errors() -> None:
+    before = _count("unmatched", "500")
+
+    async def app(scope, receive, send) -> None:
+        raise RuntimeError("boom")
+
+    try:
+        _call(app)
+    except RuntimeError:
+        pass
+
+    assert _count("unmatched", "500") == before + 1
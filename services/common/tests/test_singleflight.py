@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from common.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution() -> None:
+    flight = SingleFlight()
+    calls = 0
+
+    async def render() -> str:
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "preview"
+
+    async def scenario() -> list[str]:
+        return await asyncio.gather(*(flight.do("key", render) for _ in range(5)))
+
+    assert asyncio.run(scenario()) == ["preview"] * 5
+    assert calls == 1
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 4}
+
+
+def test_later_calls_run_again() -> None:
+    flight = SingleFlight()
+    calls = 0
+
+    async def render() -> int:
+        nonlocal calls
+        calls += 1
+        return calls
+
+    async def scenario() -> tuple[int, int]:
+        return await flight.do("key", render), await flight.do("key", render)
+
+    assert asyncio.run(scenario()) == (1, 2)
+
+
+def test_errors_reach_every_waiter() -> None:
+    flight = SingleFlight()
+
+    async def render() -> None:
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    async def scenario() -> list[object]:
+        return await asyncio.gather(
+            flight.do("key", render), flight.do("key", render), return_exceptions=True
+        )
+
+    results = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+
+
+def test_cancelled_waiter_does_not_cancel_shared_call() -> None:
+    flight = SingleFlight()
+    finished = False
+
+    async def render() -> str:
+        nonlocal finished
+        await asyncio.sleep(0.02)
+        finished = True
+        return "preview"
+
+    async def scenario() -> str:
+        first = asyncio.create_task(flight.do("key", render))
+        second = asyncio.create_task(flight.do("key", render))
+        await asyncio.sleep(0)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(scenario()) == "preview"
+    assert finished is True
+
+
+def test_result_nobody_waits_for_is_discarded() -> None:
+    flight = SingleFlight()
+    discarded = []
+
+    async def render() -> str:
+        await asyncio.sleep(0.01)
+        return "preview"
+
+    async def scenario() -> None:
+        waiter = asyncio.create_task(flight.do("key", render, discarded.append))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.sleep(0.02)
+
+    asyncio.run(scenario())
+    assert discarded == ["preview"]
+
+
+def test_result_taken_by_a_caller_is_not_discarded() -> None:
+    flight = SingleFlight()
+    discarded = []
+
+    async def render() -> str:
+        return "preview"
+
+    async def scenario() -> str:
+        return await flight.do("key", render, discarded.append)
+
+    assert asyncio.run(scenario()) == "preview"
+    assert discarded == []
@@ -0,0 +1,64 @@
+import json
+from types import SimpleNamespace
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+
+from common import tracing
+
+
+def _settings(exporter: str, path: str = "traces.jsonl") -> SimpleNamespace:
+    return SimpleNamespace(
+        tracing_exporter=exporter,
+        tracing_file_path=path,
+        tracing_otlp_endpoint=None,
+    )
+
+
+def test_helpers_are_no_ops_when_tracing_is_off() -> None:
+    with tracing.span("work", parent={"traceparent": "garbage"}):
+        assert tracing.inject() == {}
+
+
+def test_span_continues_the_trace_in_propagated_headers(monkeypatch) -> None:
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    monkeypatch.setattr(tracing, "_tracer", provider.get_tracer(__name__))
+
+    with tracing.span("upload", kind="server"):
+        headers = tracing.inject()
+    with tracing.span("process", parent=headers, kind="consumer"):
+        pass
+
+    upload, process = exporter.get_finished_spans()
+    assert "traceparent" in headers
+    assert process.context.trace_id == upload.context.trace_id
+    assert process.parent.span_id == upload.context.span_id
+
+
+def test_file_exporter_writes_finished_spans(tmp_path) -> None:
+    path = tmp_path / "traces.jsonl"
+
+    tracing.init_tracing("storage", _settings("file", str(path)))
+    try:
+        with tracing.span("db.get", rows=1):
+            pass
+    finally:
+        tracing.shutdown_tracing()
+
+    [line] = path.read_text().splitlines()
+    exported = json.loads(line)
+    assert exported["name"] == "db.get"
+    assert exported["attributes"] == {"rows": 1}
+    assert exported["resource"]["attributes"]["service.name"] == "storage"
+    assert tracing._tracer is None
+
+
+def test_init_tracing_without_an_exporter_stays_off() -> None:
+    tracing.init_tracing("storage", _settings("none"))
+
+    assert tracing._tracer is None
@@ -1,15 +1,74 @@
-from typing import Annotated
+import asyncio
+import re
+from typing import Annotated, Any, Hashable, NamedTuple
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+import httpx
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
 from fastapi.responses import StreamingResponse
-from httpx import AsyncClient, Response
+from httpx import AsyncClient
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.datastructures import UploadFile
+
+from common.conditional import is_not_modified, parse_http_date
+from common.singleflight import SingleFlight
+
+from .cache import CachedResponse, ResponseCache, get_response_cache, parse_max_age
+from .http_client import (
+    DOWNLOAD_TIMEOUT,
+    UPLOAD_TIMEOUT,
+    get_http_client,
+    get_upstream,
+)
+from .settings import get_settings
+from .upstream import UpstreamTransport
 
-from .http_client import get_http_client
 router = APIRouter()
+settings = get_settings()
+
+_FORWARDED_REQUEST_HEADERS = (
+    "accept",
+    "range",
+    "if-range",
+    "if-none-match",
+    "if-modified-since",
+)
+_PASSTHROUGH_RESPONSE_HEADERS = (
+    "content-type",
+    "content-disposition",
+    "content-length",
+    "content-range",
+    "accept-ranges",
+    "etag",
+    "last-modified",
+    "cache-control",
+    "expires",
+    "location",
+    "vary",
+)
+
+_MAX_AGE = re.compile(r"max-age=\d+")
+
+# Lets concurrent identical reads share one request to storage.
+upstream_reads = SingleFlight()
+
+_UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "properties": {"file": {"type": "string", "format": "binary"}},
+                    "required": ["file"],
+                }
+            }
+        },
+    }
+}
 
 
-async def _proxied_stream(response: Response):
+async def _proxied_stream(response: httpx.Response):
     try:
         async for chunk in response.aiter_bytes():
             yield chunk
@@ -18,20 +77,114 @@ async def _proxied_stream(response: Response):
 
 
 async def _stream_request(
-    client: AsyncClient, method: str, url: str
-) -> Response:
-    request = client.build_request(method, url)
+    client: AsyncClient,
+    method: str,
+    url: str,
+    headers: dict[str, str] | None = None,
+) -> httpx.Response:
+    request = client.build_request(
+        method, url, headers=headers, timeout=DOWNLOAD_TIMEOUT
+    )
     return await client.send(request, stream=True)
 
 
-@router.post(
-    "/images",
-    status_code=status.HTTP_201_CREATED,
-)
-async def upload_image(
-    file: Annotated[UploadFile, File()],
-    client: Annotated[AsyncClient, Depends(get_http_client)],
-):
+def _content_length(response: httpx.Response) -> int | None:
+    """The declared body size, or None if it is missing or malformed."""
+    try:
+        length = int(response.headers.get("content-length", ""))
+    except ValueError:
+        return None
+    return length if length >= 0 else None
+
+
+class SharedResponse(NamedTuple):
+    status_code: int
+    headers: list[tuple[str, str]]
+    body: bytes
+
+
+class UnsharedResponse:
+    """A response too large to share, streamed to the one caller that takes it."""
+
+    def __init__(self, response: httpx.Response) -> None:
+        self._response: httpx.Response | None = response
+
+    def take(self) -> httpx.Response | None:
+        response, self._response = self._response, None
+        return response
+
+    def discard(self) -> None:
+        response = self.take()
+        if response is not None:
+            asyncio.ensure_future(response.aclose())
+
+
+async def _fetch_shared(
+    client: AsyncClient, url: str, headers: dict[str, str], max_bytes: int
+) -> SharedResponse | UnsharedResponse:
+    """Read a GET response whole unless its body may exceed ``max_bytes``."""
+    response = await _stream_request(client, "GET", url, headers)
+    length = _content_length(response)
+    bodyless = response.status_code == 304 or response.is_redirect
+    if not bodyless and (length is None or length > max_bytes):
+        return UnsharedResponse(response)
+    try:
+        return SharedResponse(
+            response.status_code,
+            response.headers.multi_items(),
+            await response.aread(),
+        )
+    finally:
+        await response.aclose()
+
+
+def _discard_shared(result: SharedResponse | UnsharedResponse) -> None:
+    if isinstance(result, UnsharedResponse):
+        result.discard()
+
+
+async def _fetch_json(client: AsyncClient, url: str) -> tuple[int, Any]:
+    response = await client.get(url)
+    return response.status_code, response.json() if response.is_success else None
+
+
+def _passthrough_headers(response: httpx.Response) -> dict[str, str]:
+    headers = {
+        name: response.headers[name]
+        for name in _PASSTHROUGH_RESPONSE_HEADERS
+        if name in response.headers
+    }
+    if "content-length" in headers and _content_length(response) is None:
+        # Let the server frame the body rather than relay a bad length.
+        del headers["content-length"]
+    return headers
+
+
+async def _forward_upload_stream(
+    client: AsyncClient, request: Request
+) -> httpx.Response:
+    headers = {"Content-Type": request.headers.get("content-type", "")}
+    content_length = request.headers.get("content-length")
+    if content_length:
+        headers["Content-Length"] = content_length
+    return await client.post(
+        "/images",
+        content=request.stream(),
+        headers=headers,
+        timeout=UPLOAD_TIMEOUT,
+    )
+
+
+async def _forward_upload_buffered(
+    client: AsyncClient, request: Request
+) -> httpx.Response:
+    form = await request.form()
+    file = form.get("file")
+    if not isinstance(file, UploadFile):
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Missing file field",
+        )
     payload = {
         "file": (
             file.filename,
@@ -39,8 +192,23 @@ async def upload_image(
             file.content_type or "application/octet-stream",
         )
     }
+    return await client.post("/images", files=payload, timeout=UPLOAD_TIMEOUT)
+
+
+@router.post(
+    "/images",
+    status_code=status.HTTP_201_CREATED,
+    openapi_extra=_UPLOAD_REQUEST_BODY,
+)
+async def upload_image(
+    request: Request,
+    client: Annotated[AsyncClient, Depends(get_http_client)],
+):
+    if settings.stream_uploads:
+        response = await _forward_upload_stream(client, request)
+    else:
+        response = await _forward_upload_buffered(client, request)
 
-    response = await client.post("/images", files=payload)
     if response.is_error:
         detail = response.json().get("detail") if response.headers.get("content-type", "").startswith("application/json") else response.text
         raise HTTPException(
@@ -55,99 +223,251 @@ async def get_image(
     image_id: UUID,
     client: Annotated[AsyncClient, Depends(get_http_client)],
 ):
-    response = await client.get(f"/images/{image_id}")
-    if response.status_code == status.HTTP_404_NOT_FOUND:
+    url = f"/images/{image_id}"
+    if settings.coalesce_metadata:
+        # Every waiter gets the same parsed body; it must not be modified.
+        status_code, body = await upstream_reads.do(
+            url, lambda: _fetch_json(client, url)
+        )
+    else:
+        status_code, body = await _fetch_json(client, url)
+    if status_code == status.HTTP_404_NOT_FOUND:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
         )
-    if response.is_error:
+    if status_code >= 400:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="Failed to fetch image metadata",
         )
-    return response.json()
+    return body
 
 
-@router.get("/images/{image_id}/file")
-async def download_image(
-    image_id: UUID,
-    client: Annotated[AsyncClient, Depends(get_http_client)],
-):
-    response = await _stream_request(client, "GET", f"/images/{image_id}/file")
-    if response.status_code == status.HTTP_404_NOT_FOUND:
-        await response.aclose()
+def _json_response(response: httpx.Response, error_detail: str):
+    if response.is_client_error:
+        # Validation errors (bad ids, cursors, limits) are the caller's.
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
+            status_code=response.status_code,
+            detail=response.json().get("detail"),
         )
     if response.is_error:
-        detail = (
-            (await response.json()).get("detail")
-            if response.headers.get("content-type", "").startswith("application/json")
-            else await response.aread()
-        )
-        await response.aclose()
         raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail=detail or "Failed to download image",
+            status_code=status.HTTP_502_BAD_GATEWAY, detail=error_detail
         )
+    return response.json()
 
-    headers = {}
-    content_type = response.headers.get("content-type")
-    if content_type:
-        headers["Content-Type"] = content_type
-    content_disposition = response.headers.get("content-disposition")
-    if content_disposition:
-        headers["Content-Disposition"] = content_disposition
-    content_length = response.headers.get("content-length")
-    if content_length:
-        headers["Content-Length"] = content_length
 
-    return StreamingResponse(
-        _proxied_stream(response),
-        media_type=content_type,
-        headers=headers,
+@router.get("/images")
+async def list_images(
+    request: Request,
+    client: Annotated[AsyncClient, Depends(get_http_client)],
+):
+    response = await client.get(
+        "/images", params=list(request.query_params.multi_items())
     )
+    return _json_response(response, "Failed to list images")
 
 
-@router.get("/images/{image_id}/preview/{size}")
-async def get_preview(
-    image_id: UUID,
-    size: int,
+@router.post("/images/lookup")
+async def lookup_images(
+    request: Request,
     client: Annotated[AsyncClient, Depends(get_http_client)],
 ):
-    response = await _stream_request(
-        client, "GET", f"/images/{image_id}/preview/{size}"
+    response = await client.post(
+        "/images/lookup",
+        content=await request.body(),
+        headers={"Content-Type": request.headers.get("content-type", "")},
+    )
+    return _json_response(response, "Failed to look up images")
+
+
+def _cached_response(
+    request: Request, cache: ResponseCache, entry: CachedResponse
+) -> Response:
+    headers = dict(entry.headers)
+    cache_control = headers.get("cache-control")
+    if cache_control:
+        headers["cache-control"] = _MAX_AGE.sub(
+            f"max-age={cache.remaining_ttl(entry)}", cache_control
+        )
+
+    # Answered as storage would answer the same revalidation.
+    if is_not_modified(
+        request.headers.get("if-none-match"),
+        request.headers.get("if-modified-since"),
+        headers.get("etag"),
+        parse_http_date(headers.get("last-modified")),
+    ):
+        headers.pop("content-length", None)
+        headers.pop("content-type", None)
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(entry.body, headers=headers)
+
+
+async def _proxy_download(
+    request: Request,
+    client: AsyncClient,
+    url: str,
+    not_found_detail: str,
+    error_detail: str,
+    cache: ResponseCache,
+    cache_key: Hashable,
+    max_cached_bytes: int,
+    max_coalesced_bytes: int,
+) -> Response:
+    cacheable = (
+        cache.enabled
+        and max_cached_bytes > 0
+        and request.method == "GET"
+        and "range" not in request.headers
     )
+    if cacheable:
+        entry = cache.get(cache_key)
+        if entry is not None:
+            return _cached_response(request, cache, entry)
+
+    headers = {
+        name: request.headers[name]
+        for name in _FORWARDED_REQUEST_HEADERS
+        if name in request.headers
+    }
+    response = None
+    if (
+        max_coalesced_bytes > 0
+        and request.method == "GET"
+        and "range" not in request.headers
+    ):
+        shared = await upstream_reads.do(
+            (url, tuple(sorted(headers.items()))),
+            lambda: _fetch_shared(client, url, headers, max_coalesced_bytes),
+            _discard_shared,
+        )
+        if isinstance(shared, UnsharedResponse):
+            # Whoever takes it streams it; the others ask storage themselves.
+            response = shared.take()
+        else:
+            response = httpx.Response(
+                shared.status_code,
+                headers=shared.headers,
+                stream=httpx.ByteStream(shared.body),
+            )
+    if response is None:
+        response = await _stream_request(client, request.method, url, headers)
     if response.status_code == status.HTTP_404_NOT_FOUND:
         await response.aclose()
         raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Preview not found"
+            status_code=status.HTTP_404_NOT_FOUND, detail=not_found_detail
         )
-    if response.is_error:
-        detail = (
-            (await response.json()).get("detail")
-            if response.headers.get("content-type", "").startswith("application/json")
-            else await response.aread()
+    if response.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE:
+        await response.aclose()
+        raise HTTPException(
+            status_code=response.status_code,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": response.headers.get("content-range", "")},
         )
+    if response.is_error:
+        detail = None
+        if request.method != "HEAD":
+            await response.aread()
+            detail = (
+                response.json().get("detail")
+                if response.headers.get("content-type", "").startswith(
+                    "application/json"
+                )
+                else response.text
+            )
         await response.aclose()
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
-            detail=detail or "Failed to fetch preview",
+            detail=detail or error_detail,
         )
 
-    headers = {}
-    content_type = response.headers.get("content-type")
-    if content_type:
-        headers["Content-Type"] = content_type
-    content_disposition = response.headers.get("content-disposition")
-    if content_disposition:
-        headers["Content-Disposition"] = content_disposition
-    content_length = response.headers.get("content-length")
-    if content_length:
-        headers["Content-Length"] = content_length
+    headers = _passthrough_headers(response)
+    # Redirects to presigned object URLs are left for the client to follow.
+    if (
+        request.method == "HEAD"
+        or response.status_code == status.HTTP_304_NOT_MODIFIED
+        or response.is_redirect
+    ):
+        await response.aclose()
+        return Response(status_code=response.status_code, headers=headers)
+
+    if cacheable and response.status_code == status.HTTP_200_OK:
+        ttl = parse_max_age(response.headers.get("cache-control"))
+        content_length = _content_length(response)
+        if (
+            ttl
+            and content_length is not None
+            and content_length <= max_cached_bytes
+        ):
+            body = await response.aread()
+            await response.aclose()
+            cache.put(cache_key, body, headers, ttl)
+            return Response(body, headers=headers)
 
     return StreamingResponse(
         _proxied_stream(response),
-        media_type=content_type,
+        status_code=response.status_code,
+        media_type=response.headers.get("content-type"),
         headers=headers,
     )
+
+
+@router.api_route("/images/{image_id}/file", methods=["GET", "HEAD"])
+async def download_image(
+    image_id: UUID,
+    request: Request,
+    client: Annotated[AsyncClient, Depends(get_http_client)],
+    cache: Annotated[ResponseCache, Depends(get_response_cache)],
+):
+    return await _proxy_download(
+        request,
+        client,
+        f"/images/{image_id}/file",
+        "Image not found",
+        "Failed to download image",
+        cache,
+        ("file", image_id),
+        settings.cache_max_original_bytes,
+        settings.coalesce_max_original_bytes,
+    )
+
+
+@router.api_route("/images/{image_id}/preview/{size}", methods=["GET", "HEAD"])
+async def get_preview(
+    image_id: UUID,
+    size: int,
+    request: Request,
+    client: Annotated[AsyncClient, Depends(get_http_client)],
+    cache: Annotated[ResponseCache, Depends(get_response_cache)],
+):
+    return await _proxy_download(
+        request,
+        client,
+        f"/images/{image_id}/preview/{size}",
+        "Preview not found",
+        "Failed to fetch preview",
+        cache,
+        # Storage picks the preview format from Accept (and says so in Vary).
+        ("preview", image_id, size, request.headers.get("accept")),
+        settings.cache_max_preview_bytes,
+        settings.coalesce_max_preview_bytes,
+    )
+
+
+@router.get("/stats")
+async def get_stats(
+    cache: Annotated[ResponseCache, Depends(get_response_cache)],
+    upstream: Annotated[UpstreamTransport, Depends(get_upstream)],
+):
+    return {
+        "response_cache": cache.stats(),
+        "coalescing": upstream_reads.stats(),
+        "upstream": upstream.stats(),
+    }
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
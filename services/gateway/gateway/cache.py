@@ -0,0 +1,99 @@
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, NamedTuple
+
+from fastapi import Request
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    headers: dict[str, str]
+    expires_at: float
+
+
+class ResponseCache:
+    """Byte-budgeted LRU cache for small, immutable upstream responses."""
+
+    def __init__(
+        self, max_bytes: int, clock: Callable[[], float] = time.monotonic
+    ) -> None:
+        self.max_bytes = max_bytes
+        self._clock = clock
+        self._entries: OrderedDict[Hashable, CachedResponse] = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get(self, key: Hashable) -> CachedResponse | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if entry.expires_at <= self._clock():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(
+        self, key: Hashable, body: bytes, headers: dict[str, str], ttl: float
+    ) -> bool:
+        if ttl <= 0 or len(body) > self.max_bytes:
+            return False
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = CachedResponse(body, headers, self._clock() + ttl)
+        self._size += len(body)
+        while self._size > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+        return True
+
+    def remaining_ttl(self, entry: CachedResponse) -> int:
+        return max(int(entry.expires_at - self._clock()), 0)
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._size -= len(entry.body)
+
+
+def parse_max_age(cache_control: str | None) -> int | None:
+    """Shared-cache lifetime from a ``Cache-Control`` header, if cacheable."""
+    if not cache_control:
+        return None
+    lifetimes: dict[str, int] = {}
+    for directive in cache_control.lower().split(","):
+        name, _, value = directive.strip().partition("=")
+        if name in ("no-store", "no-cache", "private"):
+            return None
+        if name in ("max-age", "s-maxage"):
+            try:
+                lifetimes[name] = int(value.strip('"'))
+            except ValueError:
+                return None
+    return lifetimes.get("s-maxage", lifetimes.get("max-age"))
+
+
+def get_response_cache(request: Request) -> ResponseCache:
+    return request.app.state.response_cache
@@ -1,23 +1,128 @@
+import logging
+import math
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, Request
-from httpx import AsyncClient
+from fastapi import FastAPI, Request, status
+from fastapi.responses import JSONResponse
+from httpx import (
+    AsyncClient,
+    AsyncHTTPTransport,
+    Limits,
+    PoolTimeout,
+    Timeout,
+    TimeoutException,
+    TransportError,
+)
+from httpx import Request as UpstreamRequest
 
+from common.tracing import init_tracing, inject, shutdown_tracing
+
+from .cache import ResponseCache
+from .metrics import UPSTREAM_POOL_CONNECTIONS, UPSTREAM_POOL_MAX_CONNECTIONS
 from .settings import get_settings
+from .upstream import CircuitBreaker, CircuitOpenError, UpstreamTransport
+
+try:
+    import h2  # noqa: F401 - needed by httpx for HTTP/2
+except ImportError:  # pragma: no cover - optional dependency
+    h2 = None
 
+log = logging.getLogger(__name__)
 settings = get_settings()
 
 
+def _timeout(read: float) -> Timeout:
+    return Timeout(
+        connect=settings.upstream_connect_timeout_seconds,
+        read=read,
+        write=read,
+        pool=settings.upstream_pool_timeout_seconds,
+    )
+
+
+METADATA_TIMEOUT = _timeout(settings.upstream_read_timeout_seconds)
+DOWNLOAD_TIMEOUT = _timeout(settings.upstream_download_read_timeout_seconds)
+UPLOAD_TIMEOUT = _timeout(settings.upstream_upload_timeout_seconds)
+
+
+async def _propagate_trace(request: UpstreamRequest) -> None:
+    request.headers.update(inject())
+
+
+def create_upstream_transport() -> UpstreamTransport:
+    http2 = settings.upstream_http2
+    if http2 and h2 is None:
+        log.warning("h2 not installed; using HTTP/1.1 to storage")
+        http2 = False
+    transport = AsyncHTTPTransport(
+        limits=Limits(
+            max_connections=settings.upstream_max_connections,
+            max_keepalive_connections=settings.upstream_max_keepalive_connections,
+            keepalive_expiry=settings.upstream_keepalive_expiry_seconds,
+        ),
+        http2=http2,
+        # Without TLS there is no ALPN, so HTTP/2 needs prior knowledge.
+        http1=not (http2 and settings.storage_base_url.startswith("http://")),
+    )
+    return UpstreamTransport(
+        transport,
+        CircuitBreaker(
+            settings.upstream_breaker_failure_threshold,
+            settings.upstream_breaker_reset_seconds,
+        ),
+        max_retries=settings.upstream_max_retries,
+        retry_backoff=settings.upstream_retry_backoff_seconds,
+        retry_backoff_max=settings.upstream_retry_backoff_max_seconds,
+        max_connections=settings.upstream_max_connections,
+    )
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Create a single shared HTTP client for proxying to the storage service."""
+    init_tracing("gateway", settings)
+    app.state.response_cache = ResponseCache(settings.cache_max_bytes)
+    transport = create_upstream_transport()
+    app.state.upstream = transport
+    UPSTREAM_POOL_CONNECTIONS.set_function(transport.pool_connections)
+    UPSTREAM_POOL_MAX_CONNECTIONS.set(settings.upstream_max_connections)
     async with AsyncClient(
         base_url=settings.storage_base_url,
-        timeout=None,
+        transport=transport,
+        timeout=METADATA_TIMEOUT,
+        event_hooks={"request": [_propagate_trace]},
     ) as client:
         app.state.http_client = client
         yield
+    shutdown_tracing()
 
 
 def get_http_client(request: Request) -> AsyncClient:
     return request.app.state.http_client
+
+
+def get_upstream(request: Request) -> UpstreamTransport:
+    return request.app.state.upstream
+
+
+async def upstream_error_handler(
+    request: Request, exc: TransportError
+) -> JSONResponse:
+    """Answer for storage instead of failing with a bare 500."""
+    headers = {}
+    if isinstance(exc, CircuitOpenError):
+        code, detail = status.HTTP_503_SERVICE_UNAVAILABLE, "Storage unavailable"
+        retry_after = request.app.state.upstream.breaker.retry_after()
+        headers["Retry-After"] = str(max(math.ceil(retry_after), 1))
+    elif isinstance(exc, PoolTimeout):
+        code, detail = status.HTTP_503_SERVICE_UNAVAILABLE, "Storage busy"
+    elif isinstance(exc, TimeoutException):
+        code, detail = status.HTTP_504_GATEWAY_TIMEOUT, "Storage timed out"
+    else:
+        code, detail = status.HTTP_502_BAD_GATEWAY, "Storage unreachable"
+    # Refusals are not logged: the breaker logs opening once.
+    if not isinstance(exc, CircuitOpenError):
+        log.warning(
+            "%s %s failed upstream: %r", request.method, request.url.path, exc
+        )
+    return JSONResponse({"detail": detail}, status_code=code, headers=headers)
@@ -2,9 +2,14 @@ import logging
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from httpx import TransportError
+
+from common.metrics import MetricsMiddleware
+from common.tracing import TracingMiddleware
 
 from .api import router as api_router
-from .http_client import lifespan
+from .http_client import lifespan, upstream_error_handler
+from .metrics import REQUEST_SECONDS
 from .settings import get_settings
 
 logging.basicConfig(level=logging.INFO)
@@ -12,6 +17,7 @@ log = logging.getLogger("gateway")
 settings = get_settings()
 
 app = FastAPI(title="API Gateway", lifespan=lifespan)
+app.add_exception_handler(TransportError, upstream_error_handler)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=settings.allowed_origins or ["*"],
@@ -19,4 +25,6 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware, histogram=REQUEST_SECONDS)
+app.add_middleware(TracingMiddleware)
 app.include_router(api_router)
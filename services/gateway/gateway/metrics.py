@@ -0,0 +1,39 @@
+"""Prometheus metrics for the gateway, served at ``/metrics``."""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+REQUEST_SECONDS = Histogram(
+    "gateway_http_request_duration_seconds",
+    "Time from receiving a request to sending its response headers.",
+    ["method", "route", "status"],
+)
+UPSTREAM_IN_FLIGHT = Gauge(
+    "gateway_upstream_in_flight_requests",
+    "Requests to storage sent or waiting for a pooled connection.",
+)
+UPSTREAM_POOL_CONNECTIONS = Gauge(
+    "gateway_upstream_pool_connections",
+    "Open connections to storage, busy or idle.",
+)
+UPSTREAM_POOL_MAX_CONNECTIONS = Gauge(
+    "gateway_upstream_pool_max_connections",
+    "Limit on open connections to storage.",
+)
+UPSTREAM_RETRIES = Counter(
+    "gateway_upstream_retries",
+    "Retried requests to storage.",
+)
+UPSTREAM_FAILURES = Counter(
+    "gateway_upstream_failures",
+    "Requests to storage that failed after any retries.",
+    ["kind"],
+)
+UPSTREAM_REJECTED = Counter(
+    "gateway_upstream_rejected",
+    "Requests refused without reaching storage while the breaker was open.",
+)
+UPSTREAM_BREAKER_STATE = Gauge(
+    "gateway_upstream_circuit_state",
+    "Circuit breaker state: 0 closed, 1 half-open, 2 open.",
+)
+
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Literal
 
 from pydantic_settings import BaseSettings
 
@@ -8,6 +9,48 @@ class Settings(BaseSettings):
 
     storage_base_url: str = "http://storage:8000"
     allowed_origins: list[str] = ["*"]
+    stream_uploads: bool = True
+    cache_max_bytes: int = 0
+    cache_max_preview_bytes: int = 1024 * 1024
+    cache_max_original_bytes: int = 0
+    # Concurrent identical reads share one request to storage. Files and
+    # previews are shared only up to these sizes (0 turns sharing off);
+    # larger ones are streamed to each client separately.
+    coalesce_metadata: bool = True
+    coalesce_max_preview_bytes: int = 1024 * 1024
+    coalesce_max_original_bytes: int = 0
+    # Connection pool to storage; requests wait up to upstream_pool_timeout
+    # for a free connection, then fail with 503.
+    upstream_max_connections: int = 100
+    upstream_max_keepalive_connections: int = 20
+    upstream_keepalive_expiry_seconds: float = 5.0
+    upstream_pool_timeout_seconds: float = 2.0
+    upstream_connect_timeout_seconds: float = 2.0
+    # Read timeouts bound each wait for data from storage: for metadata,
+    # for the first and each later chunk of files and previews (which may
+    # be rendered on demand), and for storage to answer an upload.
+    upstream_read_timeout_seconds: float = 10.0
+    upstream_download_read_timeout_seconds: float = 30.0
+    upstream_upload_timeout_seconds: float = 120.0
+    # Speaks HTTP/2 to storage, which needs the h2 package installed. Over
+    # plain http this uses prior knowledge, so storage must be served by an
+    # HTTP/2-capable server (uvicorn is not).
+    upstream_http2: bool = False
+    # Extra attempts for GET and HEAD after errors, timeouts and 502-504.
+    upstream_max_retries: int = 2
+    upstream_retry_backoff_seconds: float = 0.1
+    upstream_retry_backoff_max_seconds: float = 1.0
+    # Consecutive failures that open the circuit breaker, and how long it
+    # stays open before letting a probe request through.
+    upstream_breaker_failure_threshold: int = 5
+    upstream_breaker_reset_seconds: float = 10.0
+    # "file" appends spans as JSON lines to tracing_file_path; "otlp" sends
+    # them to a collector. Needs opentelemetry-sdk installed, and for
+    # "otlp" also opentelemetry-exporter-otlp-proto-http.
+    tracing_exporter: Literal["none", "file", "otlp"] = "none"
+    tracing_file_path: str = "traces.jsonl"
+    # Defaults to the OTEL_EXPORTER_OTLP_* environment variables.
+    tracing_otlp_endpoint: str | None = None
 
     class Config:
         env_prefix = "GATEWAY_"
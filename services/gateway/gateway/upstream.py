@@ -0,0 +1,245 @@
+"""Resilient transport for the gateway's calls to the storage service.
+
+``UpstreamTransport`` wraps httpx's pooled transport. It retries idempotent
+requests that fail on the way to storage, and it fails fast through a
+circuit breaker while storage keeps failing.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Callable
+
+import httpx
+
+from .metrics import (
+    UPSTREAM_BREAKER_STATE,
+    UPSTREAM_FAILURES,
+    UPSTREAM_IN_FLIGHT,
+    UPSTREAM_REJECTED,
+    UPSTREAM_RETRIES,
+)
+
+log = logging.getLogger(__name__)
+
+_IDEMPOTENT_METHODS = ("GET", "HEAD")
+# Statuses meaning storage (or a proxy in front of it) could not answer.
+_RETRYABLE_STATUSES = (502, 503, 504)
+
+_BREAKER_STATES = ("closed", "half_open", "open")
+
+
+class CircuitOpenError(httpx.TransportError):
+    """Storage has been failing, so the request was not sent at all."""
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open, requests are refused for ``reset_timeout`` seconds. Then a
+    single probe request is let through (half-open): its success closes the
+    breaker and its failure opens it again.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        UPSTREAM_BREAKER_STATE.set(0)
+
+    def allow(self) -> bool:
+        if self.state == "open":
+            if self._clock() - self._opened_at < self.reset_timeout:
+                return False
+            self._set_state("half_open")
+        if self.state == "half_open":
+            if self._probing:
+                return False
+            self._probing = True
+        return True
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probing = False
+        self._set_state("closed")
+
+    def abandon(self) -> None:
+        """Forget a request that ended with neither success nor failure."""
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if self.state == "half_open" or (
+            self.state == "closed" and self._failures >= self.failure_threshold
+        ):
+            self._opened_at = self._clock()
+            self.opened += 1
+            self._set_state("open")
+
+    def retry_after(self) -> float:
+        """Seconds until the next probe may be sent."""
+        if self.state != "open":
+            return 0.0
+        return max(self.reset_timeout - (self._clock() - self._opened_at), 0.0)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            log.warning("Storage circuit breaker %s", state.replace("_", "-"))
+        self.state = state
+        UPSTREAM_BREAKER_STATE.set(_BREAKER_STATES.index(state))
+
+
+class _CountedStream(httpx.AsyncByteStream):
+    """Response body that marks the request finished once it is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, done: Callable[[], None]):
+        self._stream = stream
+        self._done = done
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._done is not None:
+                self._done()
+                self._done = None
+
+
+class UpstreamTransport(httpx.AsyncBaseTransport):
+    """Retries idempotent requests and refuses requests while storage is down.
+
+    GET and HEAD requests are retried with jittered exponential backoff,
+    both on connection errors and timeouts and on 502/503/504 responses.
+    Waiting too long for a pooled connection is neither retried nor counted
+    as a failure, since it says nothing about storage. Other methods are sent
+    once, since their bodies may be streams that cannot be replayed.
+    Failures, counted once per request, also feed the circuit breaker. While
+    it is open, requests raise ``CircuitOpenError`` without reaching storage.
+    """
+
+    def __init__(
+        self,
+        transport: httpx.AsyncBaseTransport,
+        breaker: CircuitBreaker,
+        max_retries: int,
+        retry_backoff: float,
+        retry_backoff_max: float,
+        max_connections: int | None = None,
+    ) -> None:
+        self._transport = transport
+        self.breaker = breaker
+        self._max_retries = max_retries
+        self._retry_backoff = retry_backoff
+        self._retry_backoff_max = retry_backoff_max
+        self._max_connections = max_connections
+        self.in_flight = 0
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.rejected = 0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            self.rejected += 1
+            UPSTREAM_REJECTED.inc()
+            raise CircuitOpenError(
+                f"Circuit open; storage unavailable for "
+                f"{self.breaker.retry_after():.1f}s more",
+                request=request,
+            )
+
+        self.requests += 1
+        retries = self._max_retries if request.method in _IDEMPOTENT_METHODS else 0
+        delay = self._retry_backoff
+        attempt = 0
+        self._started()
+        try:
+            while True:
+                try:
+                    response = await self._transport.handle_async_request(request)
+                except httpx.PoolTimeout:
+                    # The gateway's own pool is full: storage was never asked,
+                    # and retrying would only queue the request again.
+                    self.breaker.abandon()
+                    raise
+                except httpx.TransportError as exc:
+                    if attempt >= retries:
+                        self._failed(type(exc).__name__)
+                        raise
+                else:
+                    retryable = response.status_code in _RETRYABLE_STATUSES
+                    if not retryable or attempt >= retries:
+                        if retryable:
+                            self._failed(str(response.status_code))
+                        else:
+                            self.breaker.record_success()
+                        response.stream = _CountedStream(
+                            response.stream, self._finished
+                        )
+                        return response
+                    await response.aclose()
+                attempt += 1
+                self.retries += 1
+                UPSTREAM_RETRIES.inc()
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+                delay = min(delay * 2, self._retry_backoff_max)
+        except BaseException as exc:
+            if not isinstance(exc, httpx.TransportError):
+                # E.g. cancelled because the client went away.
+                self.breaker.abandon()
+            self._finished()
+            raise
+
+    def _started(self) -> None:
+        self.in_flight += 1
+        UPSTREAM_IN_FLIGHT.inc()
+
+    def _finished(self) -> None:
+        self.in_flight -= 1
+        UPSTREAM_IN_FLIGHT.dec()
+
+    def _failed(self, kind: str) -> None:
+        self.failures += 1
+        UPSTREAM_FAILURES.labels(kind).inc()
+        self.breaker.record_failure()
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def pool_connections(self) -> int:
+        """Open connections to storage, busy or idle."""
+        # httpx exposes no public view of its pool.
+        pool = getattr(self._transport, "_pool", None)
+        return len(getattr(pool, "connections", ()))
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "in_flight": self.in_flight,
+            "pool_connections": self.pool_connections(),
+            "max_connections": self._max_connections,
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "breaker": {
+                "state": self.breaker.state,
+                "opened": self.breaker.opened,
+                "retry_after_s": round(self.breaker.retry_after(), 2),
+            },
+        }
@@ -0,0 +1,119 @@
+from types import SimpleNamespace
+
+import pytest
+
+from gateway.api import _cached_response
+from gateway.cache import ResponseCache, parse_max_age
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_get_returns_stored_entry_and_counts_hits() -> None:
+    cache = ResponseCache(100)
+
+    assert cache.get("a") is None
+    cache.put("a", b"body", {"etag": '"x"'}, ttl=60)
+    entry = cache.get("a")
+
+    assert entry is not None
+    assert entry.body == b"body"
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_evicts_least_recently_used_when_over_budget() -> None:
+    cache = ResponseCache(10)
+    cache.put("a", b"aaaa", {}, ttl=60)
+    cache.put("b", b"bbbb", {}, ttl=60)
+    cache.get("a")
+
+    cache.put("c", b"cccc", {}, ttl=60)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+    assert cache.get("c") is not None
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 8
+
+
+def test_entries_expire_after_ttl() -> None:
+    clock = FakeClock()
+    cache = ResponseCache(100, clock=clock)
+    cache.put("a", b"body", {}, ttl=10)
+
+    clock.now = 9.5
+    assert cache.get("a") is not None
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["bytes"] == 0
+
+
+def test_rejects_oversized_and_uncacheable_entries() -> None:
+    cache = ResponseCache(4)
+
+    assert cache.put("a", b"too large", {}, ttl=60) is False
+    assert cache.put("b", b"ok", {}, ttl=0) is False
+    assert cache.stats()["entries"] == 0
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("public, max-age=600, immutable", 600),
+        ("max-age=600, s-maxage=60", 60),
+        ("private, max-age=600", None),
+        ("no-store", None),
+        ("public", None),
+        (None, None),
+    ],
+)
+def test_parse_max_age(header: str | None, expected: int | None) -> None:
+    assert parse_max_age(header) == expected
+
+
+@pytest.mark.parametrize(
+    ("request_headers", "status"),
+    [
+        ({}, 200),
+        ({"if-none-match": '"x"'}, 304),
+        ({"if-none-match": '"y"'}, 200),
+        ({"if-modified-since": "Fri, 10 May 2024 12:30:15 GMT"}, 304),
+        ({"if-modified-since": "Fri, 10 May 2024 12:30:14 GMT"}, 200),
+        # If-None-Match wins over If-Modified-Since, as in storage.
+        (
+            {
+                "if-none-match": '"y"',
+                "if-modified-since": "Fri, 10 May 2024 12:30:15 GMT",
+            },
+            200,
+        ),
+    ],
+)
+def test_cache_hits_evaluate_both_validators(
+    request_headers: dict[str, str], status: int
+) -> None:
+    cache = ResponseCache(100)
+    cache.put(
+        "a",
+        b"body",
+        {
+            "etag": '"x"',
+            "last-modified": "Fri, 10 May 2024 12:30:15 GMT",
+            "cache-control": "public, max-age=60",
+        },
+        ttl=60,
+    )
+
+    response = _cached_response(
+        SimpleNamespace(headers=request_headers), cache, cache.get("a")
+    )
+
+    assert response.status_code == status
+    assert response.body == (b"body" if status == 200 else b"")
@@ -0,0 +1,107 @@
+import asyncio
+from uuid import uuid4
+
+import httpx
+
+from gateway.api import upstream_reads
+from gateway.cache import ResponseCache
+from gateway.main import app
+from gateway.settings import get_settings
+
+IMAGE_ID = uuid4()
+
+
+class Storage:
+    """Answers after a short delay so that concurrent requests overlap."""
+
+    def __init__(
+        self, body: bytes = b"preview", content_length: str | None = None
+    ) -> None:
+        self.body = body
+        self.content_length = content_length
+        self.calls: list[str] = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls.append(request.url.path)
+        await asyncio.sleep(0.05)
+        if request.url.path.endswith("/preview/256"):
+            return httpx.Response(
+                200,
+                headers={
+                    "content-type": "image/jpeg",
+                    "cache-control": "public, max-age=60",
+                    "content-length": self.content_length or str(len(self.body)),
+                },
+                stream=httpx.ByteStream(self.body),
+            )
+        return httpx.Response(200, json={"id": str(IMAGE_ID)})
+
+
+def _get_concurrently(
+    storage: Storage, path: str, count: int, cache_bytes: int = 0
+) -> list[httpx.Response]:
+    async def scenario() -> list[httpx.Response]:
+        app.state.response_cache = ResponseCache(cache_bytes)
+        async with httpx.AsyncClient(
+            transport=httpx.MockTransport(storage), base_url="http://storage"
+        ) as upstream:
+            app.state.http_client = upstream
+            async with httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=app), base_url="http://gateway"
+            ) as client:
+                return await asyncio.gather(*(client.get(path) for _ in range(count)))
+
+    return asyncio.run(scenario())
+
+
+def test_concurrent_metadata_reads_share_one_upstream_request() -> None:
+    storage = Storage()
+    executions = upstream_reads.executions
+
+    responses = _get_concurrently(storage, f"/images/{IMAGE_ID}", 5)
+
+    assert [response.json() for response in responses] == [{"id": str(IMAGE_ID)}] * 5
+    assert len(storage.calls) == 1
+    assert upstream_reads.executions == executions + 1
+
+
+def test_concurrent_preview_reads_share_a_small_body() -> None:
+    storage = Storage()
+
+    responses = _get_concurrently(storage, f"/images/{IMAGE_ID}/preview/256", 5)
+
+    assert [response.content for response in responses] == [b"preview"] * 5
+    assert responses[0].headers["content-length"] == "7"
+    assert len(storage.calls) == 1
+
+
+def test_bodies_over_the_cap_are_streamed_separately() -> None:
+    storage = Storage(b"x" * (get_settings().coalesce_max_preview_bytes + 1))
+
+    responses = _get_concurrently(storage, f"/images/{IMAGE_ID}/preview/256", 3)
+
+    assert all(response.content == storage.body for response in responses)
+    # One caller streams the shared request; the others send their own.
+    assert len(storage.calls) == 3
+
+
+def test_malformed_content_length_is_treated_as_unknown() -> None:
+    storage = Storage(content_length="seven")
+
+    responses = _get_concurrently(storage, f"/images/{IMAGE_ID}/preview/256", 3)
+
+    assert [response.status_code for response in responses] == [200] * 3
+    assert all(response.content == b"preview" for response in responses)
+    # Of unknown size, so not shared: each caller streams its own request.
+    assert len(storage.calls) == 3
+
+
+def test_malformed_content_length_is_not_cached() -> None:
+    storage = Storage(content_length="-7")
+
+    [response] = _get_concurrently(
+        storage, f"/images/{IMAGE_ID}/preview/256", 1, cache_bytes=1024
+    )
+
+    assert response.content == b"preview"
+    assert app.state.response_cache.stats()["entries"] == 0
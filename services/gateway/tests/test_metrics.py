@@ -0,0 +1,28 @@
+import asyncio
+
+import httpx
+
+from gateway.main import app
+
+
+def _get_metrics() -> list[httpx.Response]:
+    async def scenario() -> list[httpx.Response]:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://gateway"
+        ) as client:
+            return [await client.get("/metrics") for _ in range(2)]
+
+    return asyncio.run(scenario())
+
+
+def test_metrics_route_serves_gateway_metrics() -> None:
+    first, second = _get_metrics()
+
+    assert first.status_code == 200
+    assert first.headers["content-type"].startswith("text/plain")
+    assert "gateway_upstream_circuit_state" in first.text
+    # The first scrape was itself observed, under its route template.
+    assert (
+        'gateway_http_request_duration_seconds_count{method="GET",'
+        'route="/metrics",status="200"}'
+    ) in second.text
@@ -0,0 +1,92 @@
+import asyncio
+from typing import AsyncIterator
+
+import httpx
+
+from gateway import api
+from gateway.main import app
+
+IMAGE = b"\x89PNG\r\n\x1a\n" + b"x" * 64
+FORM = httpx.Request(
+    "POST", "http://gateway/images", files={"file": ("a.png", IMAGE, "image/png")}
+)
+BODY = FORM.read()
+
+
+class Storage(httpx.AsyncBaseTransport):
+    """Records upload bodies chunk by chunk, as they arrive.
+
+    Unlike ``httpx.MockTransport``, it does not read the body up front.
+    """
+
+    def __init__(self) -> None:
+        self.headers: list[httpx.Headers] = []
+        self.bodies: list[bytes] = []
+        self.first_chunk = asyncio.Event()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.headers.append(request.headers)
+        body = b""
+        async for chunk in request.stream:
+            body += chunk
+            self.first_chunk.set()
+        self.bodies.append(body)
+        return httpx.Response(201, json={"id": "stored"})
+
+
+async def _upload(storage: Storage, body: AsyncIterator[bytes] | bytes):
+    async with httpx.AsyncClient(
+        transport=storage, base_url="http://storage"
+    ) as upstream:
+        app.state.http_client = upstream
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app), base_url="http://gateway"
+        ) as client:
+            return await client.post(
+                "/images",
+                content=body,
+                headers={
+                    "content-type": FORM.headers["content-type"],
+                    "content-length": str(len(BODY)),
+                },
+            )
+
+
+def test_uploads_stream_the_request_body_to_storage(monkeypatch) -> None:
+    monkeypatch.setattr(api.settings, "stream_uploads", True)
+
+    async def scenario() -> tuple[Storage, httpx.Response]:
+        storage = Storage()
+
+        async def body() -> AsyncIterator[bytes]:
+            yield BODY[:10]
+            # Only a gateway forwarding as it receives gets this far.
+            await asyncio.wait_for(storage.first_chunk.wait(), timeout=5)
+            yield BODY[10:]
+
+        return storage, await _upload(storage, body())
+
+    storage, response = asyncio.run(scenario())
+
+    assert response.status_code == 201
+    assert response.json() == {"id": "stored"}
+    # Passed through untouched: the client's own boundary and length.
+    assert storage.bodies == [BODY]
+    assert storage.headers[0]["content-type"] == FORM.headers["content-type"]
+    assert storage.headers[0]["content-length"] == str(len(BODY))
+
+
+def test_buffered_fallback_reencodes_the_form(monkeypatch) -> None:
+    monkeypatch.setattr(api.settings, "stream_uploads", False)
+    storage = Storage()
+
+    response = asyncio.run(_upload(storage, BODY))
+
+    assert response.status_code == 201
+    [body] = storage.bodies
+    content_type = storage.headers[0]["content-type"]
+    assert content_type.startswith("multipart/form-data")
+    assert content_type != FORM.headers["content-type"]
+    assert b'filename="a.png"' in body
+    assert b"Content-Type: image/png" in body
+    assert IMAGE in body
@@ -0,0 +1,140 @@
+import asyncio
+
+import httpx
+import pytest
+
+from gateway.upstream import CircuitBreaker, CircuitOpenError, UpstreamTransport
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Upstream:
+    """Answers requests from a script of statuses and exceptions."""
+
+    def __init__(self, *outcomes: int | Exception) -> None:
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome, stream=httpx.ByteStream(b"body"))
+
+
+def _transport(
+    upstream: Upstream, breaker: CircuitBreaker | None = None, max_retries: int = 2
+) -> UpstreamTransport:
+    return UpstreamTransport(
+        httpx.MockTransport(upstream),
+        breaker or CircuitBreaker(failure_threshold=3, reset_timeout=10),
+        max_retries=max_retries,
+        retry_backoff=0,
+        retry_backoff_max=0,
+    )
+
+
+def _send(transport: UpstreamTransport, method: str = "GET") -> httpx.Response:
+    async def scenario() -> httpx.Response:
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://storage"
+        ) as client:
+            return await client.request(method, "/images")
+
+    return asyncio.run(scenario())
+
+
+def test_retries_idempotent_requests_until_storage_answers() -> None:
+    upstream = Upstream(503, httpx.ConnectError("refused"), 200)
+    transport = _transport(upstream)
+
+    response = _send(transport)
+
+    assert response.status_code == 200
+    assert upstream.calls == 3
+    assert transport.stats()["retries"] == 2
+    assert transport.stats()["failures"] == 0
+    assert transport.stats()["in_flight"] == 0
+
+
+def test_does_not_retry_other_methods() -> None:
+    upstream = Upstream(503, 200)
+    transport = _transport(upstream)
+
+    response = _send(transport, "POST")
+
+    assert response.status_code == 503
+    assert upstream.calls == 1
+    assert transport.stats()["failures"] == 1
+
+
+def test_raises_the_last_error_once_retries_run_out() -> None:
+    upstream = Upstream(httpx.ReadTimeout("slow"))
+    transport = _transport(upstream, max_retries=1)
+
+    with pytest.raises(httpx.ReadTimeout):
+        _send(transport)
+
+    assert upstream.calls == 2
+    assert transport.stats()["failures"] == 1
+    assert transport.stats()["in_flight"] == 0
+
+
+def test_pool_timeouts_are_neither_retried_nor_failures() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10)
+    upstream = Upstream(httpx.PoolTimeout("pool full"))
+    transport = _transport(upstream, breaker)
+
+    with pytest.raises(httpx.PoolTimeout):
+        _send(transport)
+
+    assert upstream.calls == 1
+    assert transport.stats()["failures"] == 0
+    assert transport.stats()["in_flight"] == 0
+    assert breaker.state == "closed"
+
+
+def test_open_breaker_fails_fast_then_lets_one_probe_through() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    upstream = Upstream(httpx.ConnectError("refused"))
+    transport = _transport(upstream, breaker, max_retries=0)
+
+    for _ in range(2):
+        with pytest.raises(httpx.ConnectError):
+            _send(transport)
+    assert breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        _send(transport)
+    assert upstream.calls == 2
+    assert transport.stats()["rejected"] == 1
+    assert breaker.retry_after() == 10
+
+    clock.now = 10
+    upstream.outcomes = [200]
+    assert _send(transport).status_code == 200
+    assert breaker.state == "closed"
+
+
+def test_failed_probe_reopens_breaker() -> None:
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=5, clock=clock)
+    breaker.record_failure()
+    clock.now = 5
+
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert breaker.opened == 2
+    assert not breaker.allow()
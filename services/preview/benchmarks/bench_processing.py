@@ -0,0 +1,239 @@
+"""Time preview processing per source format, image size and preview size.
+
+Generates a synthetic corpus (JPEG, PNG with alpha, GIF with transparency,
+WebP and BMP, 0.3 to 50 MP by default) and runs ``render_previews`` on each
+image in a fresh interpreter, so peak memory reflects that image alone.
+Reports decode time, resize and encode time and output bytes per preview
+size, megapixels per second and peak memory, as a table and optionally as
+JSON. Times are medians over ``--repeat`` runs.
+
+    cd services/preview
+    python -m benchmarks.bench_processing --json results.json
+    python -m benchmarks.bench_processing --formats jpeg,png --megapixels 2,24
+
+Generating the 50 MP images takes a while; pass ``--corpus-dir`` to keep
+the corpus between runs.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any
+
+from PIL import Image
+
+from .bench_resize import ROOT, SIZES, _max_rss_mib
+
+MEGAPIXELS = [0.3, 2, 12, 24, 50]
+# Keyed by the corpus file extension.
+FORMATS = {
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+    "bmp": "image/bmp",
+}
+
+
+def _photo(megapixels: float) -> Image.Image:
+    width = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+    height = width * 2 // 3
+    # Noise over a gradient compresses like a photo rather than a flat fill.
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    return Image.blend(noise, gradient, 0.5)
+
+
+def _make_input(path: Path, fmt: str, megapixels: float) -> None:
+    image = _photo(megapixels)
+    if fmt == "jpeg":
+        image.save(path, format="JPEG", quality=90)
+    elif fmt == "png":
+        alpha = Image.linear_gradient("L").rotate(90).resize(image.size)
+        image.putalpha(alpha)
+        image.save(path, format="PNG")
+    elif fmt == "gif":
+        palette = image.convert("P", palette=Image.Palette.ADAPTIVE, colors=255)
+        palette.save(path, format="GIF", transparency=0)
+    elif fmt == "webp":
+        image.save(path, format="WEBP", quality=90)
+    else:
+        image.save(path, format="BMP")
+
+
+def _corpus(directory: Path, formats: list[str], sizes: list[float]) -> list[Path]:
+    paths = []
+    for megapixels in sizes:
+        for fmt in formats:
+            path = directory / f"{megapixels:g}mp.{fmt}"
+            if not path.exists():
+                print(f"Generating {path.name}", file=sys.stderr)
+                _make_input(path, fmt, megapixels)
+            paths.append(path)
+    return paths
+
+
+def _child(
+    path: Path, sizes: list[int], variants: list[str], repeat: int
+) -> dict[str, Any]:
+    from preview.processing import render_previews
+
+    data = path.read_bytes()
+    content_type = FORMATS[path.suffix[1:]]
+    with Image.open(path) as image:
+        width, height = image.size
+    baseline = _max_rss_mib()
+    runs = []
+    for _ in range(repeat):
+        previews, timings = render_previews(data, sizes, content_type, None, variants)
+        runs.append((previews, timings))
+
+    def median(values: list[float]) -> float:
+        return round(statistics.median(values) * 1000, 2)
+
+    by_size: dict[int, dict[str, Any]] = {}
+    for size in sorted(set(sizes)):
+        formats = [fmt for key, fmt in runs[0][1].encode if key == size]
+        by_size[size] = {
+            "resize_ms": median([timings.resize[size] for _, timings in runs]),
+            "encode_ms": {
+                fmt: median([timings.encode[size, fmt] for _, timings in runs])
+                for fmt in formats
+            },
+            "bytes": {
+                preview.format or "original": len(preview.content)
+                for preview in runs[0][0]
+                if preview.size == size
+            },
+        }
+    totals = [
+        timings.decode + sum(timings.resize.values()) + sum(timings.encode.values())
+        for _, timings in runs
+    ]
+    peak = _max_rss_mib()
+    return {
+        "format": runs[0][1].source_format,
+        "dimensions": f"{width}x{height}",
+        "megapixels": round(width * height / 1_000_000, 2),
+        "input_bytes": len(data),
+        "decode_ms": median([timings.decode for _, timings in runs]),
+        "total_ms": median(totals),
+        "megapixels_per_s": round(
+            width * height / 1_000_000 / statistics.median(totals), 1
+        ),
+        "sizes": by_size,
+        "peak_rss_mib": round(peak, 1),
+        "rss_growth_mib": round(peak - baseline, 1),
+    }
+
+
+def _table(results: list[dict[str, Any]]) -> str:
+    header = (
+        f"{'format':<6} {'MP':>6} {'decode':>9} {'total':>9} {'MP/s':>7} "
+        f"{'peak':>8} {'size':>5} {'resize':>9} {'encode':>9} {'bytes':>9}"
+    )
+    lines = [header, "-" * len(header)]
+    for result in results:
+        case = (
+            f"{result['format']:<6} {result['megapixels']:>6} "
+            f"{result['decode_ms']:>7.2f}ms {result['total_ms']:>7.2f}ms "
+            f"{result['megapixels_per_s']:>7} {result['peak_rss_mib']:>5.1f}MiB"
+        )
+        # Sizes are strings once read back from JSON.
+        steps = sorted(result["sizes"].items(), key=lambda item: -int(item[0]))
+        for size, step in steps:
+            encode = sum(step["encode_ms"].values())
+            lines.append(
+                f"{case} {size:>5} {step['resize_ms']:>7.2f}ms "
+                f"{encode:>7.2f}ms {sum(step['bytes'].values()):>9}"
+            )
+            case = " " * len(case)
+    return "\n".join(lines)
+
+
+def _csv(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--formats", type=_csv, default=list(FORMATS))
+    parser.add_argument(
+        "--megapixels",
+        type=lambda value: [float(item) for item in _csv(value)],
+        default=MEGAPIXELS,
+    )
+    parser.add_argument(
+        "--sizes",
+        type=lambda value: [int(item) for item in _csv(value)],
+        default=SIZES,
+    )
+    parser.add_argument(
+        "--variants",
+        type=_csv,
+        default=[],
+        help="Extra encodings per preview, e.g. webp,avif",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--corpus-dir", type=Path)
+    parser.add_argument("--json", type=Path, help="Also write the results here")
+    parser.add_argument("--child", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        # The service itself and the code it shares with the other services.
+        sys.path[:0] = [str(ROOT), str(ROOT.parent / "common")]
+        result = _child(args.child, args.sizes, args.variants, args.repeat)
+        print(json.dumps(result))
+        return
+
+    unknown = set(args.formats) - set(FORMATS)
+    if unknown:
+        parser.error(f"Unknown formats: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = args.corpus_dir or Path(tmp)
+        directory.mkdir(parents=True, exist_ok=True)
+        results = []
+        for path in _corpus(directory, args.formats, args.megapixels):
+            print(f"Processing {path.name}", file=sys.stderr)
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.bench_processing",
+                    "--child",
+                    str(path),
+                    "--sizes",
+                    ",".join(map(str, args.sizes)),
+                    "--variants",
+                    ",".join(args.variants),
+                    "--repeat",
+                    str(args.repeat),
+                ],
+                cwd=ROOT,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results.append(json.loads(output))
+
+    print(_table(results))
+    if args.json:
+        report = {
+            "sizes": args.sizes,
+            "variants": args.variants,
+            "repeat": args.repeat,
+            "results": results,
+        }
+        args.json.write_text(json.dumps(report, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
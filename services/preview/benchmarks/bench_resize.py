@@ -0,0 +1,150 @@
+"""Compare CPU time and peak RSS of the legacy and cascaded resize engines.
+
+Each run happens in a fresh interpreter so ``ru_maxrss`` reflects only that
+engine. The input is a synthetic photo-like JPEG (24 MP by default).
+
+    cd services/preview
+    python -m benchmarks.bench_resize --megapixels 24 --repeat 3
+"""
+
+import argparse
+import io
+import json
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+from PIL import Image
+
+ROOT = Path(__file__).resolve().parents[1]
+SIZES = [256, 512, 1024]
+
+
+def legacy_generate_resized_versions(
+    image_bytes: bytes, sizes: list[int], content_type: str | None
+) -> Dict[int, bytes]:
+    """The pre-cascade engine: one full-resolution copy per size."""
+    from common.imaging import resolve_format
+
+    resized: Dict[int, bytes] = {}
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        output_format = resolve_format(content_type, image.format)
+        for size in sizes:
+            copy = image.copy()
+            copy.thumbnail((size, size))
+            if output_format.upper() == "JPEG" and copy.mode != "RGB":
+                copy = copy.convert("RGB")
+            buffer = io.BytesIO()
+            save_kwargs: dict[str, object] = {}
+            if output_format.upper() == "JPEG":
+                save_kwargs["optimize"] = True
+                save_kwargs["quality"] = 85
+            copy.save(buffer, format=output_format, **save_kwargs)
+            resized[size] = buffer.getvalue()
+    return resized
+
+
+def _make_input(path: Path, megapixels: float) -> None:
+    width = int((megapixels * 1_000_000 * 3 / 2) ** 0.5)
+    height = width * 2 // 3
+    # Noise over a gradient compresses like a photo rather than a flat fill.
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    gradient = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    Image.blend(noise, gradient, 0.5).save(path, format="JPEG", quality=90)
+
+
+def _max_rss_mib() -> float:
+    # VmHWM starts afresh at exec, unlike ru_maxrss which a child inherits
+    # from the (much larger) parent that generated the input.
+    try:
+        for line in Path("/proc/self/status").read_text().splitlines():
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _child(variant: str, path: Path, repeat: int) -> dict:
+    from preview.processing import generate_resized_versions
+
+    engine = (
+        legacy_generate_resized_versions
+        if variant == "legacy"
+        else generate_resized_versions
+    )
+    data = path.read_bytes()
+    baseline = _max_rss_mib()
+    cpu_times = []
+    for _ in range(repeat):
+        started = time.process_time()
+        engine(data, SIZES, "image/jpeg")
+        cpu_times.append(time.process_time() - started)
+    peak = _max_rss_mib()
+    return {
+        "variant": variant,
+        "cpu_s_best": round(min(cpu_times), 3),
+        "cpu_s_mean": round(sum(cpu_times) / len(cpu_times), 3),
+        "peak_rss_mib": round(peak, 1),
+        "rss_growth_mib": round(peak - baseline, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--megapixels", type=float, default=24)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--child", choices=["legacy", "cascade"])
+    parser.add_argument("--input", type=Path)
+    args = parser.parse_args()
+
+    if args.child:
+        # The service itself and the code it shares with the other services.
+        sys.path[:0] = [str(ROOT), str(ROOT.parent / "common")]
+        print(json.dumps(_child(args.child, args.input, args.repeat)))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "input.jpg"
+        _make_input(path, args.megapixels)
+        with Image.open(path) as image:
+            dimensions = image.size
+        results = []
+        for variant in ("legacy", "cascade"):
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.bench_resize",
+                    "--child",
+                    variant,
+                    "--input",
+                    str(path),
+                    "--repeat",
+                    str(args.repeat),
+                ],
+                cwd=ROOT,
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+            results.append(json.loads(output))
+
+    print(
+        json.dumps(
+            {
+                "input": f"{dimensions[0]}x{dimensions[1]} JPEG",
+                "sizes": SIZES,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -39,6 +39,11 @@ async def download_image(bucket: str, object_name: str) -> bytes:
 async def upload_preview(
     object_name: str, content: bytes, content_type: str
 ) -> None:
+    """Store a preview, replacing any stored under ``object_name``.
+
+    The storage service may render the same preview on demand meanwhile.
+    Both encode it the same way, so whichever write lands last is harmless.
+    """
     try:
         await asyncio.to_thread(
             minio_client.put_object,
@@ -53,8 +58,10 @@ async def upload_preview(
         raise
 
 
-def build_preview_name(object_name: str, size: int) -> str:
+def build_preview_name(
+    object_name: str, size: int, variant: str | None = None
+) -> str:
     path = Path(object_name)
-    suffix = path.suffix or ""
+    suffix = f".{variant}" if variant else path.suffix or ""
     stem = path.stem or "image"
     return f"{stem}_{size}{suffix}"
@@ -1,22 +1,61 @@
 import asyncio
 import logging
+import signal
 from typing import Any
 
+from common.imaging import VARIANT_FORMATS, can_encode
+from common.tracing import init_tracing, record_span, shutdown_tracing, span
+
 from .clients.minio_client import (
     build_preview_name,
     download_image,
     ensure_bucket,
     upload_preview,
 )
-from .messaging import close_rabbit, consume_image_uploaded
-from .processing import generate_resized_versions
+from .messaging import (
+    close_rabbit,
+    consume_image_uploaded,
+    publish_preview_generated,
+)
+from .metrics import observe_queue_lag, observe_timings, start_metrics_server
+from .pool import close_pool, init_pool, run_in_pool
+from .processing import Timings, render_previews
 from .settings import get_settings
 
 log = logging.getLogger("preview")
 logging.basicConfig(level=logging.INFO)
 settings = get_settings()
 
-PREVIEW_SIZES = [256, 512, 1024]
+
+def _encodable_variants() -> list[str]:
+    variants = []
+    for variant in settings.variant_formats:
+        if can_encode(variant):
+            variants.append(variant)
+        else:
+            log.warning("Pillow cannot encode %s; skipping that variant", variant)
+    return variants
+
+
+VARIANTS = _encodable_variants()
+
+
+def _trace_timings(timings: Timings) -> None:
+    """Lay the pool worker's steps out as spans, one after another."""
+    at = timings.started_ns
+
+    def step(name: str, seconds: float, **attributes: object) -> None:
+        nonlocal at
+        end = at + int(seconds * 1e9)
+        record_span(name, at, end, **attributes)
+        at = end
+
+    step("decode", timings.decode, format=timings.source_format)
+    for size, seconds in timings.resize.items():
+        step("resize", seconds, size=size)
+        for (encoded_size, fmt), seconds in timings.encode.items():
+            if encoded_size == size:
+                step("encode", seconds, size=size, format=fmt)
 
 
 async def handle_image_uploaded(payload: dict[str, Any]) -> None:
@@ -27,35 +66,81 @@ async def handle_image_uploaded(payload: dict[str, Any]) -> None:
     if not object_name:
         raise ValueError("Message missing object_name")
 
-    original_bytes = await download_image(bucket, object_name)
-    previews = generate_resized_versions(original_bytes, PREVIEW_SIZES, content_type)
+    with span("minio.download_image"):
+        original_bytes = await download_image(bucket, object_name)
+    with span("render_previews", bytes=len(original_bytes)):
+        previews, timings = await run_in_pool(
+            render_previews,
+            original_bytes,
+            settings.sizes,
+            content_type,
+            settings.max_image_pixels,
+            VARIANTS,
+        )
+        if timings is not None:
+            _trace_timings(timings)
     if not previews:
         log.warning("No previews generated for object %s", object_name)
         return
+    observe_timings(timings)
 
-    for size, content in previews.items():
-        preview_name = build_preview_name(object_name, size)
-        await upload_preview(
-            preview_name, content, content_type or "application/octet-stream"
-        )
+    manifest = []
+    for preview in previews:
+        preview_name = build_preview_name(object_name, preview.size, preview.format)
+        if preview.format:
+            preview_type = VARIANT_FORMATS[preview.format][1]
+        else:
+            preview_type = content_type or "application/octet-stream"
+        with span("minio.upload_preview", size=preview.size, type=preview_type):
+            await upload_preview(preview_name, preview.content, preview_type)
         log.info(
             "Preview uploaded: %s (%d bytes) for original %s",
             preview_name,
-            len(content),
+            len(preview.content),
             object_name,
         )
+        manifest.append(
+            {
+                "size": preview.size,
+                "format": preview.format,
+                "object_name": preview_name,
+                "content_type": preview_type,
+                "bytes": len(preview.content),
+                "width": preview.width,
+                "height": preview.height,
+            }
+        )
+
+    await publish_preview_generated(
+        {
+            "id": payload.get("id"),
+            "bucket": bucket,
+            "object_name": object_name,
+            "previews": manifest,
+        }
+    )
+    observe_queue_lag(payload.get("created_at"))
 
 
 async def main() -> None:
+    # Treat SIGTERM like Ctrl+C so in-flight messages drain before exit.
+    main_task = asyncio.current_task()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, main_task.cancel)
+
+    start_metrics_server()
+    init_tracing("preview", settings)
     await ensure_bucket(settings.preview_bucket)
+    init_pool()
     try:
         await consume_image_uploaded(handle_image_uploaded)
     finally:
         await close_rabbit()
+        close_pool()
+        shutdown_tracing()
 
 
 if __name__ == "__main__":
     try:
         asyncio.run(main())
-    except KeyboardInterrupt:
+    except (KeyboardInterrupt, asyncio.CancelledError):
         pass
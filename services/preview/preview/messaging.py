@@ -2,7 +2,9 @@ import asyncio
 import json
 import logging
 from json import JSONDecodeError
-from typing import Awaitable, Callable
+from typing import Any, AsyncIterable, Awaitable, Callable
+
+from common.tracing import inject, span
 
 from .settings import get_settings
 
@@ -10,9 +12,17 @@ log = logging.getLogger(__name__)
 settings = get_settings()
 
 try:
-    from aio_pika import IncomingMessage, RobustChannel, RobustConnection, connect_robust
+    from aio_pika import (
+        DeliveryMode,
+        IncomingMessage,
+        Message,
+        RobustChannel,
+        RobustConnection,
+        connect_robust,
+    )
 except Exception:  # pragma: no cover - optional dependency
     IncomingMessage = RobustChannel = RobustConnection = connect_robust = None
+    DeliveryMode = Message = None
 
 rabbit_connection: RobustConnection | None = None
 rabbit_channel: RobustChannel | None = None
@@ -25,6 +35,9 @@ async def init_rabbit() -> None:
         return
     rabbit_connection = await connect_robust(settings.rabbitmq_url)
     rabbit_channel = await rabbit_connection.channel()
+    await rabbit_channel.set_qos(prefetch_count=settings.prefetch_count)
+    # Declared here too so events are kept even before storage first runs.
+    await rabbit_channel.declare_queue(settings.preview_generated_queue, durable=True)
 
 
 async def close_rabbit() -> None:
@@ -32,6 +45,23 @@ async def close_rabbit() -> None:
         await rabbit_connection.close()
 
 
+async def publish_preview_generated(payload: dict[str, Any]) -> None:
+    if rabbit_channel is None or Message is None:
+        log.warning("RabbitMQ channel not initialized; skipping publish")
+        return
+    # Persistent: storage relies on these events to find previews to delete.
+    with span(f"publish {settings.preview_generated_queue}", kind="producer"):
+        await rabbit_channel.default_exchange.publish(
+            Message(
+                body=json.dumps(payload).encode("utf-8"),
+                content_type="application/json",
+                delivery_mode=DeliveryMode.PERSISTENT,
+                headers=inject(),
+            ),
+            routing_key=settings.preview_generated_queue,
+        )
+
+
 async def _handle_message(
     message: "IncomingMessage",
     handler: Callable[[dict], Awaitable[None]],
@@ -44,7 +74,13 @@ async def _handle_message(
         return
 
     try:
-        await handler(payload)
+        # Continues the trace of the upload that published the message.
+        with span(
+            f"process {settings.rabbitmq_queue}",
+            parent=message.headers,
+            kind="consumer",
+        ):
+            await handler(payload)
     except asyncio.CancelledError:
         raise
     except Exception as exc:  # pragma: no cover - runtime path
@@ -54,6 +90,51 @@ async def _handle_message(
         await message.ack()
 
 
+async def _drain(tasks: set[asyncio.Task], timeout: float) -> None:
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    if pending:
+        log.warning(
+            "Cancelling %d unfinished handlers after %.0fs", len(pending), timeout
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.wait(pending)
+
+
+async def _consume(
+    messages: AsyncIterable["IncomingMessage"],
+    handler: Callable[[dict], Awaitable[None]],
+    max_concurrency: int,
+    shutdown_timeout: float,
+) -> None:
+    """Handle up to ``max_concurrency`` messages at once.
+
+    Handlers still running when the stream ends or the consumer is cancelled
+    get ``shutdown_timeout`` seconds to finish; the rest are cancelled
+    without an ack so the broker redelivers them.
+    """
+    slots = asyncio.Semaphore(max_concurrency)
+    in_flight: set[asyncio.Task] = set()
+
+    async def run(message: "IncomingMessage") -> None:
+        try:
+            await _handle_message(message, handler)
+        except Exception:
+            log.exception("Failed to settle message")
+        finally:
+            slots.release()
+
+    try:
+        async for message in messages:
+            await slots.acquire()
+            task = asyncio.create_task(run(message))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+    finally:
+        if in_flight:
+            await _drain(set(in_flight), shutdown_timeout)
+
+
 async def consume_image_uploaded(
     handler: Callable[[dict], Awaitable[None]]
 ) -> None:
@@ -69,5 +150,9 @@ async def consume_image_uploaded(
     )
 
     async with queue.iterator() as iterator:
-        async for message in iterator:
-            await _handle_message(message, handler)
+        await _consume(
+            iterator,
+            handler,
+            settings.max_concurrency,
+            settings.shutdown_timeout_seconds,
+        )
@@ -0,0 +1,58 @@
+"""Prometheus metrics for the preview worker, served on ``metrics_port``."""
+
+from datetime import datetime, timezone
+
+from prometheus_client import Histogram, start_http_server
+
+from .processing import Timings
+from .settings import get_settings
+
+settings = get_settings()
+
+DECODE_SECONDS = Histogram(
+    "preview_decode_seconds",
+    "Time to decode an original, by its format.",
+    ["format"],
+)
+RESIZE_SECONDS = Histogram(
+    "preview_resize_seconds",
+    "Time to downscale to one preview size.",
+    ["size"],
+)
+ENCODE_SECONDS = Histogram(
+    "preview_encode_seconds",
+    "Time to encode one preview, by size and output format.",
+    ["size", "format"],
+)
+QUEUE_LAG_SECONDS = Histogram(
+    "preview_queue_lag_seconds",
+    "Time from an image's upload until its previews are ready.",
+    buckets=(0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800),
+)
+
+
+def start_metrics_server() -> None:
+    if settings.metrics_port:
+        start_http_server(settings.metrics_port)
+
+
+def observe_timings(timings: Timings) -> None:
+    DECODE_SECONDS.labels(timings.source_format.lower()).observe(timings.decode)
+    for size, seconds in timings.resize.items():
+        RESIZE_SECONDS.labels(str(size)).observe(seconds)
+    for (size, fmt), seconds in timings.encode.items():
+        ENCODE_SECONDS.labels(str(size), fmt.lower()).observe(seconds)
+
+
+def observe_queue_lag(uploaded_at: str | None) -> None:
+    """Record the lag for an upload's ``created_at`` ISO timestamp, if any."""
+    if not uploaded_at:
+        return
+    try:
+        created = datetime.fromisoformat(uploaded_at)
+    except ValueError:
+        return
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    lag = (datetime.now(timezone.utc) - created).total_seconds()
+    QUEUE_LAG_SECONDS.observe(max(lag, 0.0))
@@ -0,0 +1,63 @@
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, TypeVar
+
+from .settings import get_settings
+
+log = logging.getLogger(__name__)
+settings = get_settings()
+
+T = TypeVar("T")
+
+executor: ProcessPoolExecutor | None = None
+
+
+def _create_executor() -> ProcessPoolExecutor:
+    # Recycling workers returns memory Pillow's allocator holds on to.
+    return ProcessPoolExecutor(
+        max_workers=settings.processing_workers or os.cpu_count() or 1,
+        max_tasks_per_child=settings.processing_max_tasks_per_child,
+    )
+
+
+def init_pool() -> None:
+    global executor
+    if settings.processing_workers == 0:
+        log.info("Processing images in threads of the worker process")
+        return
+    if executor is None:
+        executor = _create_executor()
+
+
+def close_pool() -> None:
+    global executor
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
+        executor = None
+
+
+async def run_in_pool(func: Callable[..., T], *args: object) -> T:
+    """Run CPU-bound ``func`` off the event loop and return its result.
+
+    Arguments and results cross a process boundary, so both must pickle.
+    """
+    global executor
+    pool = executor
+    if pool is None:
+        return await asyncio.to_thread(func, *args)
+
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pool, functools.partial(func, *args))
+    except BrokenProcessPool:
+        # A worker died (e.g. OOM-killed). Replace the pool once so later
+        # messages still get processed, and fail this one.
+        if executor is pool:
+            log.error("Processing pool broke; starting a new one")
+            executor = _create_executor()
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise
@@ -1,51 +1,133 @@
 import io
 import logging
-from typing import Dict
+import time
+from typing import NamedTuple
 
 from PIL import Image
 
+from common.imaging import (
+    VARIANT_FORMATS,
+    encode,
+    fit,
+    flatten_palette,
+    resolve_format,
+)
+
 log = logging.getLogger(__name__)
 
-CONTENT_TYPE_TO_FORMAT = {
-    "image/jpeg": "JPEG",
-    "image/png": "PNG",
-    "image/gif": "GIF",
-    "image/webp": "WEBP",
-    "image/bmp": "BMP",
-}
 
+class Preview(NamedTuple):
+    size: int
+    # A VARIANT_FORMATS key, or None for the original's own format.
+    format: str | None
+    content: bytes
+    width: int
+    height: int
+
+
+class Timings(NamedTuple):
+    """Seconds spent in each step of one ``render_previews`` call."""
 
-def _resolve_format(content_type: str | None, fallback: str | None) -> str:
-    if content_type:
-        fmt = CONTENT_TYPE_TO_FORMAT.get(content_type.lower())
-        if fmt:
-            return fmt
-    if fallback:
-        return fallback
-    return "PNG"
+    source_format: str
+    # Wall clock time decoding started, in nanoseconds since the epoch.
+    started_ns: int
+    decode: float
+    # Keyed by preview size.
+    resize: dict[int, float]
+    # Keyed by preview size and Pillow format name.
+    encode: dict[tuple[int, str], float]
+
+
+class ImageTooLargeError(ValueError):
+    """The image has more pixels than the configured limit allows."""
 
 
 def generate_resized_versions(
-    image_bytes: bytes, sizes: list[int], content_type: str | None
-) -> Dict[int, bytes]:
-    resized: Dict[int, bytes] = {}
+    image_bytes: bytes,
+    sizes: list[int],
+    content_type: str | None,
+    max_pixels: int | None = None,
+    variants: list[str] | tuple[str, ...] = (),
+) -> list[Preview]:
+    """Encode a preview fitting each ``size`` box, plus each of ``variants``.
+
+    The original is decoded once, at the smallest JPEG scale that still
+    covers the largest preview, and each preview is downscaled from the
+    next larger one rather than from the original.
+    """
+    previews, _ = render_previews(
+        image_bytes, sizes, content_type, max_pixels, variants
+    )
+    return previews
+
+
+def render_previews(
+    image_bytes: bytes,
+    sizes: list[int],
+    content_type: str | None,
+    max_pixels: int | None = None,
+    variants: list[str] | tuple[str, ...] = (),
+) -> tuple[list[Preview], Timings | None]:
+    """``generate_resized_versions``, also timing each step.
+
+    Timings are returned rather than recorded so they survive the trip back
+    from a processing pool worker. They are None if no preview was made.
+    """
+    targets = []
+    for size in sizes:
+        if size <= 0:
+            log.warning("Skipping non-positive preview size: %s", size)
+        else:
+            targets.append(size)
+    if not targets:
+        return [], None
+
+    resized: list[Preview] = []
+    resize_seconds: dict[int, float] = {}
+    encode_seconds: dict[tuple[int, str], float] = {}
     with Image.open(io.BytesIO(image_bytes)) as image:
-        output_format = _resolve_format(content_type, image.format)
-        for size in sizes:
-            if size <= 0:
-                log.warning("Skipping non-positive preview size: %s", size)
-                continue
-            copy = image.copy()
-            copy.thumbnail((size, size))
-            if output_format.upper() == "JPEG" and copy.mode != "RGB":
-                copy = copy.convert("RGB")
-            buffer = io.BytesIO()
-            save_kwargs: dict[str, object] = {}
-            if output_format.upper() == "JPEG":
-                save_kwargs["optimize"] = True
-                save_kwargs["quality"] = 85
-            copy.save(buffer, format=output_format, **save_kwargs)
-            resized[size] = buffer.getvalue()
-            buffer.close()
-            copy.close()
-    return resized
+        # Image.open only reads the header, so this runs before any decoding.
+        if max_pixels and image.width * image.height > max_pixels:
+            raise ImageTooLargeError(
+                f"Image is {image.width}x{image.height}, over {max_pixels} pixels"
+            )
+        output_format = resolve_format(content_type, image.format)
+        extra = [
+            variant
+            for variant in variants
+            if VARIANT_FORMATS[variant][0] != output_format
+        ]
+
+        width, height = image.size
+        largest = max(targets)
+        # For JPEGs, let libjpeg decode straight to a reduced scale.
+        image.draft(None, (largest, largest))
+        started_ns = time.time_ns()
+        started = time.perf_counter()
+        image.load()
+        current = flatten_palette(image)
+        decode_seconds = time.perf_counter() - started
+
+        for size in sorted(set(targets), reverse=True):
+            target = fit(width, height, size)
+            started = time.perf_counter()
+            if target != current.size:
+                current = current.resize(
+                    target, Image.Resampling.LANCZOS, reducing_gap=3.0
+                )
+            resize_seconds[size] = time.perf_counter() - started
+            dimensions = current.size
+            for variant in [None, *extra]:
+                fmt = VARIANT_FORMATS[variant][0] if variant else output_format
+                started = time.perf_counter()
+                content = encode(current, fmt)
+                encode_seconds[size, fmt] = time.perf_counter() - started
+                resized.append(Preview(size, variant, content, *dimensions))
+        timings = Timings(
+            image.format or output_format,
+            started_ns,
+            decode_seconds,
+            resize_seconds,
+            encode_seconds,
+        )
+    return resized, timings
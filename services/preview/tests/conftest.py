@@ -3,6 +3,7 @@ import sys
 
 
 ROOT = pathlib.Path(__file__).resolve().parents[1]
-if str(ROOT) not in sys.path:
-    sys.path.append(str(ROOT))
-
+# The service itself and the code it shares with the other services.
+for path in (ROOT, ROOT.parent / "common"):
+    if str(path) not in sys.path:
+        sys.path.append(str(path))
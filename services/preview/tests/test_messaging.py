@@ -9,12 +9,13 @@ os.environ.setdefault("PREVIEW_MINIO_ENDPOINT", "localhost:9000")
 os.environ.setdefault("PREVIEW_MINIO_ACCESS_KEY", "test-access-key")
 os.environ.setdefault("PREVIEW_MINIO_SECRET_KEY", "test-secret-key")
 
-from preview.messaging import _handle_message
+from preview.messaging import _consume, _handle_message
 
 
 class DummyMessage:
     def __init__(self, body: bytes):
         self.body = body
+        self.headers: dict = {}
         self.acked = False
         self.nacked = False
         self.rejected = False
@@ -89,3 +90,64 @@ def test_handle_message_propagates_cancelled_error() -> None:
 
     with pytest.raises(asyncio.CancelledError):
         asyncio.run(_handle_message(message, handler))
+
+
+async def _iterate(messages: list[DummyMessage]):
+    for message in messages:
+        yield message
+
+
+def test_consume_bounds_concurrent_handlers() -> None:
+    messages = [DummyMessage(json.dumps({"n": n}).encode("utf-8")) for n in range(10)]
+    running = 0
+    peak = 0
+
+    async def handler(_: dict) -> None:
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+
+    asyncio.run(_consume(_iterate(messages), handler, 3, shutdown_timeout=1))
+
+    assert peak == 3
+    assert all(message.acked for message in messages)
+
+
+def test_consume_drains_in_flight_handlers_when_cancelled() -> None:
+    message = DummyMessage(json.dumps({"id": "123"}).encode("utf-8"))
+    started = asyncio.Event()
+
+    async def forever():
+        yield message
+        await asyncio.Event().wait()
+
+    async def handler(_: dict) -> None:
+        started.set()
+        await asyncio.sleep(0.05)
+
+    async def scenario() -> None:
+        consumer = asyncio.create_task(
+            _consume(forever(), handler, 2, shutdown_timeout=1)
+        )
+        await started.wait()
+        consumer.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await consumer
+
+    asyncio.run(scenario())
+
+    assert message.acked is True
+
+
+def test_consume_cancels_handlers_past_shutdown_timeout() -> None:
+    message = DummyMessage(json.dumps({"id": "123"}).encode("utf-8"))
+
+    async def handler(_: dict) -> None:
+        await asyncio.sleep(10)
+
+    asyncio.run(_consume(_iterate([message]), handler, 1, shutdown_timeout=0.01))
+
+    assert message.acked is False
+    assert message.nacked is False
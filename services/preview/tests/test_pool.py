@@ -0,0 +1,56 @@
+import asyncio
+import io
+import os
+
+import pytest
+from PIL import Image
+
+os.environ.setdefault("PREVIEW_MINIO_ENDPOINT", "localhost:9000")
+os.environ.setdefault("PREVIEW_MINIO_ACCESS_KEY", "test-access-key")
+os.environ.setdefault("PREVIEW_MINIO_SECRET_KEY", "test-secret-key")
+
+from preview import pool
+from preview.processing import generate_resized_versions
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def pool_settings():
+    yield pool.settings
+    pool.close_pool()
+
+
+def _run(image: bytes) -> dict[int, bytes]:
+    previews = asyncio.run(
+        pool.run_in_pool(generate_resized_versions, image, [16, 32], "image/png")
+    )
+    return {preview.size: preview.content for preview in previews}
+
+
+def test_run_in_pool_uses_worker_processes(pool_settings, monkeypatch) -> None:
+    monkeypatch.setattr(pool_settings, "processing_workers", 1)
+    monkeypatch.setattr(pool_settings, "processing_max_tasks_per_child", 1)
+    pool.init_pool()
+    assert pool.executor is not None
+
+    # Two tasks with one task per child exercises worker recycling.
+    first = _run(_png(64, 48))
+    second = _run(_png(48, 64))
+
+    assert Image.open(io.BytesIO(first[32])).size == (32, 24)
+    assert Image.open(io.BytesIO(second[16])).size == (12, 16)
+
+
+def test_run_in_pool_without_workers_uses_threads(pool_settings, monkeypatch) -> None:
+    monkeypatch.setattr(pool_settings, "processing_workers", 0)
+    pool.init_pool()
+    assert pool.executor is None
+
+    previews = _run(_png(64, 64))
+
+    assert sorted(previews) == [16, 32]
@@ -0,0 +1,133 @@
+import io
+
+import pytest
+from PIL import Image
+
+from common.imaging import can_encode
+from preview.processing import (
+    ImageTooLargeError,
+    generate_resized_versions,
+    render_previews,
+)
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def _size(content: bytes) -> tuple[int, int]:
+    with Image.open(io.BytesIO(content)) as image:
+        return image.size
+
+
+def _by_size(previews) -> dict[int, bytes]:
+    return {preview.size: preview.content for preview in previews}
+
+
+def test_previews_fit_each_box_and_keep_aspect_ratio() -> None:
+    original = _encode(Image.new("RGB", (3000, 2000), (10, 120, 200)), "JPEG")
+
+    previews = _by_size(
+        generate_resized_versions(original, [256, 1024, 512], "image/jpeg")
+    )
+
+    assert {size: _size(content) for size, content in previews.items()} == {
+        1024: (1024, 683),
+        512: (512, 341),
+        256: (256, 171),
+    }
+
+
+def test_small_images_are_not_upscaled() -> None:
+    original = _encode(Image.new("RGB", (100, 300)), "PNG")
+
+    previews = _by_size(generate_resized_versions(original, [256, 512], "image/png"))
+
+    assert _size(previews[256]) == (85, 256)
+    assert _size(previews[512]) == (100, 300)
+
+
+def test_palette_images_keep_their_format() -> None:
+    original = _encode(Image.new("P", (600, 400)), "GIF")
+
+    previews = _by_size(generate_resized_versions(original, [256], "image/gif"))
+
+    with Image.open(io.BytesIO(previews[256])) as image:
+        assert image.format == "GIF"
+        assert image.size == (256, 171)
+
+
+def test_non_positive_sizes_are_skipped() -> None:
+    original = _encode(Image.new("RGB", (64, 64)), "PNG")
+
+    assert generate_resized_versions(original, [0, -5], "image/png") == []
+
+
+def test_pixel_limit_rejects_large_images() -> None:
+    original = _encode(Image.new("RGB", (200, 200)), "PNG")
+
+    with pytest.raises(ImageTooLargeError):
+        generate_resized_versions(original, [64], "image/png", max_pixels=10_000)
+
+
+def test_variants_are_encoded_next_to_the_original_format() -> None:
+    original = _encode(Image.new("RGBA", (400, 200), (0, 0, 0, 128)), "PNG")
+
+    previews = generate_resized_versions(
+        original, [128, 64], "image/png", variants=["webp"]
+    )
+
+    assert [(preview.size, preview.format) for preview in previews] == [
+        (128, None),
+        (128, "webp"),
+        (64, None),
+        (64, "webp"),
+    ]
+    assert (previews[3].width, previews[3].height) == (64, 32)
+    with Image.open(io.BytesIO(previews[1].content)) as image:
+        assert image.format == "WEBP"
+        assert image.mode == "RGBA"
+        assert image.size == (128, 64)
+
+
+def test_variant_matching_the_original_format_is_not_duplicated() -> None:
+    original = _encode(Image.new("RGB", (300, 300)), "WEBP")
+
+    previews = generate_resized_versions(
+        original, [128], "image/webp", variants=["webp"]
+    )
+
+    assert [(preview.size, preview.format) for preview in previews] == [(128, None)]
+
+
+@pytest.mark.skipif(not can_encode("avif"), reason="no AVIF encoder installed")
+def test_avif_variant() -> None:
+    original = _encode(Image.new("RGB", (300, 200)), "JPEG")
+
+    previews = generate_resized_versions(
+        original, [100], "image/jpeg", variants=["avif"]
+    )
+
+    assert previews[1].format == "avif"
+    assert _size(previews[1].content) == (100, 67)
+
+
+def test_render_previews_times_each_step() -> None:
+    original = _encode(Image.new("RGB", (800, 600), (10, 120, 200)), "JPEG")
+
+    previews, timings = render_previews(
+        original, [256, 512], "image/jpeg", variants=["webp"]
+    )
+
+    assert len(previews) == 4
+    assert timings.source_format == "JPEG"
+    assert timings.decode >= 0
+    assert set(timings.resize) == {256, 512}
+    assert set(timings.encode) == {
+        (256, "JPEG"),
+        (256, "WEBP"),
+        (512, "JPEG"),
+        (512, "WEBP"),
+    }
@@ -0,0 +1,226 @@
+"""Measure expiry cleanup cost on a large images table in each layout.
+
+Fills a scratch schema per layout with ``--rows`` synthetic images whose
+expiry is spread evenly over ``--days`` days, half of them already expired,
+then reports:
+
+* the first and a mid-range page of the cleanup's ``list_expired`` keyset
+  query (``EXPLAIN ANALYZE`` time and buffers touched);
+* the cost of expiring one whole day, as batched ``DELETE``s for the plain
+  layouts and as a partition detach and drop for the partitioned one.
+
+Layouts: ``heap`` (no expiry index, as before migration 0003), ``indexed``
+(``ix_images_expires_at_id``) and ``partitioned`` (daily partitions, as
+migration 0005 builds). Needs a PostgreSQL database it may create schemas
+in; they are dropped afterwards.
+
+    cd services/storage
+    python -m benchmarks.bench_cleanup_query \\
+        --dsn postgresql://postgres@localhost/bench --rows 10000000
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from datetime import datetime, timedelta, timezone
+
+import asyncpg
+
+from storage import partitions
+
+LAYOUTS = ("heap", "indexed", "partitioned")
+
+_COLUMNS = """
+    id uuid NOT NULL,
+    original_filename varchar(255) NOT NULL,
+    object_name varchar(255) NOT NULL,
+    bucket varchar(128) NOT NULL,
+    content_type varchar(128) NOT NULL,
+    size_bytes integer NOT NULL,
+    content_hash varchar(64),
+    created_at timestamptz NOT NULL,
+    expires_at timestamptz NOT NULL,
+    previews json
+"""
+
+# Same shape as ImageRepository.list_expired.
+_PAGE_SQL = """
+    SELECT * FROM images
+    WHERE expires_at <= $1 AND expires_at >= $2
+      AND (expires_at > $2 OR (expires_at = $2 AND id > $3))
+    ORDER BY expires_at, id
+    LIMIT $4
+"""
+
+
+async def _create(
+    conn: asyncpg.Connection, layout: str, start: datetime, days: int
+) -> None:
+    if layout == "partitioned":
+        await conn.execute(
+            f"CREATE TABLE images ({_COLUMNS}, PRIMARY KEY (id, expires_at)) "
+            "PARTITION BY RANGE (expires_at)"
+        )
+        await conn.execute(partitions.create_default_partition_sql())
+        for day in partitions.days_between(start, start + timedelta(days=days)):
+            await conn.execute(
+                partitions.create_partition_sql(partitions.partition_for(day))
+            )
+    else:
+        await conn.execute(f"CREATE TABLE images ({_COLUMNS}, PRIMARY KEY (id))")
+    await conn.execute("CREATE INDEX ix_images_content_hash ON images (content_hash)")
+    if layout != "heap":
+        await conn.execute(
+            "CREATE INDEX ix_images_expires_at_id ON images (expires_at, id)"
+        )
+
+
+async def _fill(
+    conn: asyncpg.Connection, rows: int, start: datetime, days: int
+) -> None:
+    chunk = 1_000_000
+    for first in range(0, rows, chunk):
+        await conn.execute(
+            """
+            INSERT INTO images
+            SELECT gen_random_uuid(), 'photo.jpg', 'object-' || g || '.jpg',
+                   'images', 'image/jpeg', 100000, NULL,
+                   $1::timestamptz - interval '1 day',
+                   $1::timestamptz + (g::float8 / $4) * $5 * interval '1 day'
+            FROM generate_series($2::bigint, $3::bigint) AS g
+            """,
+            start,
+            first,
+            min(first + chunk, rows) - 1,
+            rows,
+            days,
+        )
+    await conn.execute("VACUUM ANALYZE images")
+
+
+async def _explain(conn: asyncpg.Connection, *args: object) -> dict:
+    plan = await conn.fetchval(
+        f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {_PAGE_SQL}", *args
+    )
+    top = json.loads(plan)[0]
+    node = top["Plan"]
+    return {
+        "execution_ms": round(top["Execution Time"], 3),
+        "shared_buffers": node.get("Shared Hit Blocks", 0)
+        + node.get("Shared Read Blocks", 0),
+        "plan": node["Node Type"],
+    }
+
+
+async def _expire_day(
+    conn: asyncpg.Connection, layout: str, day: datetime, batch: int
+) -> dict:
+    partition = partitions.partition_for(day.date())
+    started = time.perf_counter()
+    if layout == "partitioned":
+        rows = await conn.fetchval(f"SELECT count(*) FROM {partition.name}")
+        await conn.execute(f"ALTER TABLE images DETACH PARTITION {partition.name}")
+        await conn.execute(f"DROP TABLE {partition.name}")
+    else:
+        rows = 0
+        while True:
+            deleted = await conn.fetch(
+                """
+                DELETE FROM images WHERE id IN (
+                    SELECT id FROM images
+                    WHERE expires_at >= $1 AND expires_at < $2
+                    ORDER BY expires_at, id LIMIT $3
+                ) RETURNING 1
+                """,
+                partition.start,
+                partition.end,
+                batch,
+            )
+            rows += len(deleted)
+            if len(deleted) < batch:
+                break
+    return {"rows": rows, "seconds": round(time.perf_counter() - started, 3)}
+
+
+async def _run_layout(dsn: str, layout: str, args: argparse.Namespace) -> dict:
+    schema = f"bench_cleanup_{layout}"
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        await conn.execute(f"CREATE SCHEMA {schema}")
+        await conn.execute(f"SET search_path TO {schema}")
+
+        start = datetime(2030, 1, 1, tzinfo=timezone.utc)
+        now = start + timedelta(days=args.days / 2)
+        await _create(conn, layout, start, args.days)
+        started = time.perf_counter()
+        await _fill(conn, args.rows, start, args.days)
+        fill_seconds = time.perf_counter() - started
+
+        # The mid-range cursor sits a quarter of the way into the table.
+        cursor = await conn.fetchrow(
+            "SELECT expires_at, id FROM images WHERE expires_at >= $1 "
+            "ORDER BY expires_at, id LIMIT 1",
+            start + timedelta(days=args.days / 4),
+        )
+        first_page = await _explain(
+            conn, now, start - timedelta(days=1), cursor["id"], args.batch
+        )
+        mid_page = await _explain(
+            conn, now, cursor["expires_at"], cursor["id"], args.batch
+        )
+        size = await conn.fetchval(
+            "SELECT sum(pg_total_relation_size(c.oid))::bigint FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = $1 AND c.relkind = 'r'",
+            schema,
+        )
+        expire = await _expire_day(
+            conn, layout, start + timedelta(days=1), args.batch
+        )
+    finally:
+        if not args.keep:
+            await conn.execute(f"DROP SCHEMA IF EXISTS {schema} CASCADE")
+        await conn.close()
+
+    return {
+        "layout": layout,
+        "fill_s": round(fill_seconds, 1),
+        "table_mib": round((size or 0) / 1024 / 1024, 1),
+        "first_page": first_page,
+        "mid_page": mid_page,
+        "expire_one_day": expire,
+    }
+
+
+async def _main(args: argparse.Namespace) -> list[dict]:
+    return [await _run_layout(args.dsn, layout, args) for layout in args.layouts]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--dsn", required=True, help="asyncpg connection string")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--days", type=int, default=30)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--layouts", nargs="+", choices=LAYOUTS, default=LAYOUTS)
+    parser.add_argument("--keep", action="store_true", help="keep the schemas")
+    args = parser.parse_args()
+
+    results = asyncio.run(_main(args))
+    print(
+        json.dumps(
+            {
+                "rows": args.rows,
+                "days": args.days,
+                "batch": args.batch,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Compare the threaded MinIO client with the asyncio S3 client.
+
+Starts the fake S3 stand-in in a subprocess, uploads one object and then
+streams it with N concurrent downloads through ``stream_image`` for each
+backend, using Starlette's default threadpool as the service does.
+
+    cd services/storage
+    python -m benchmarks.bench_s3_clients --concurrency 200 --object-mib 4
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _configure_env(port: int) -> None:
+    os.environ.setdefault("STORAGE_DATABASE_URL", "sqlite+aiosqlite://")
+    os.environ["STORAGE_MINIO_ENDPOINT"] = f"127.0.0.1:{port}"
+    os.environ.setdefault("STORAGE_MINIO_ACCESS_KEY", "bench")
+    os.environ.setdefault("STORAGE_MINIO_SECRET_KEY", "bench-secret")
+
+
+def _wait_for_port(port: int, timeout: float = 10.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError("fake S3 did not start")
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+async def _run_backend(backend: str, args: argparse.Namespace) -> dict:
+    from storage.clients import minio_client
+
+    minio_client.settings.object_storage_client = backend
+    await minio_client.init_object_storage()
+    try:
+        await minio_client.ensure_bucket()
+        payload = os.urandom(args.object_mib * 1024 * 1024)
+        await minio_client.upload_image("bench.bin", io.BytesIO(payload), "image/png")
+
+        async def download() -> float:
+            started = time.perf_counter()
+            stream = await minio_client.stream_image(
+                minio_client.settings.minio_bucket,
+                "bench.bin",
+                chunk_size=args.chunk_kib * 1024,
+            )
+            received = 0
+            async for chunk in stream:
+                received += len(chunk)
+            assert received == len(payload)
+            return time.perf_counter() - started
+
+        await download()
+        latencies: list[float] = []
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            latencies += await asyncio.gather(
+                *(download() for _ in range(args.concurrency))
+            )
+        elapsed = time.perf_counter() - started
+    finally:
+        await minio_client.close_object_storage()
+
+    transferred = len(latencies) * args.object_mib
+    return {
+        "backend": backend,
+        "downloads": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_mib_s": round(transferred / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 1),
+        "max_ms": round(max(latencies) * 1000, 1),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--object-mib", type=int, default=4)
+    parser.add_argument("--chunk-kib", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=1.0)
+    parser.add_argument(
+        "--backends", nargs="+", default=["threaded", "async"]
+    )
+    args = parser.parse_args()
+
+    port = _free_port()
+    _configure_env(port)
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.fake_s3",
+            "--port",
+            str(port),
+            "--latency-ms",
+            str(args.latency_ms),
+        ],
+        cwd=ROOT,
+    )
+    try:
+        _wait_for_port(port)
+        # The service itself and the code it shares with the other services.
+        sys.path[:0] = [str(ROOT), str(ROOT.parent / "common")]
+        results = [asyncio.run(_run_backend(name, args)) for name in args.backends]
+    finally:
+        server.terminate()
+        server.wait()
+
+    print(
+        json.dumps(
+            {
+                "concurrency": args.concurrency,
+                "rounds": args.rounds,
+                "object_mib": args.object_mib,
+                "chunk_kib": args.chunk_kib,
+                "results": results,
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
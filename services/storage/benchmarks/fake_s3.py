@@ -0,0 +1,254 @@
+"""In-memory S3 stand-in for benchmarks.
+
+Implements the subset of the S3 API the storage service uses (buckets,
+single and multipart PUT, ranged GET, HEAD, DELETE, ListObjectsV2 and
+multi-object delete). Signatures are verified only when ``credentials`` are
+given. An optional per-request latency approximates a networked MinIO.
+
+    python -m benchmarks.fake_s3 --port 9100 --latency-ms 2
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import itertools
+import re
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from minio.credentials import Credentials
+from minio.signer import sign_v4_s3
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+_NS = "http://s3.amazonaws.com/doc/2006-03-01/"
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+_STREAM_CHUNK = 64 * 1024
+_AUTHORIZATION = re.compile(
+    r"AWS4-HMAC-SHA256 Credential=([^/]+)/\d{8}/([^/]+)/s3/aws4_request, "
+    r"SignedHeaders=([^,]+), Signature=[0-9a-f]{64}"
+)
+
+
+class FakeS3:
+    def __init__(
+        self, latency: float = 0.0, credentials: tuple[str, str] | None = None
+    ) -> None:
+        self.latency = latency
+        self.credentials = credentials
+        self.buckets: dict[str, dict[str, tuple[bytes, str]]] = {}
+        self.uploads: dict[str, tuple[str, dict[int, bytes]]] = {}
+        self._upload_ids = itertools.count(1)
+
+    def app(self) -> Starlette:
+        return Starlette(
+            routes=[
+                Route(
+                    "/{bucket}",
+                    self.bucket,
+                    methods=["GET", "HEAD", "PUT", "POST"],
+                ),
+                Route(
+                    "/{bucket}/{key:path}",
+                    self.object,
+                    methods=["GET", "HEAD", "PUT", "POST", "DELETE"],
+                ),
+            ]
+        )
+
+    @staticmethod
+    def _error(status: int, code: str, method: str) -> Response:
+        if method == "HEAD":
+            return Response(status_code=status)
+        body = f"<Error><Code>{code}</Code><Message>{code}</Message></Error>"
+        return Response(body, status_code=status, media_type="application/xml")
+
+    async def _check_signature(self, request: Request) -> Response | None:
+        """An error response unless the request is signed with ``credentials``."""
+        if self.credentials is None:
+            return None
+        authorization = request.headers.get("authorization", "")
+        match = _AUTHORIZATION.fullmatch(authorization)
+        if match is None or match.group(1) != self.credentials[0]:
+            return self._error(403, "AccessDenied", request.method)
+        content_sha256 = request.headers.get("x-amz-content-sha256", "")
+        if content_sha256 != "UNSIGNED-PAYLOAD" and not hmac.compare_digest(
+            content_sha256, hashlib.sha256(await request.body()).hexdigest()
+        ):
+            return self._error(400, "XAmzContentSHA256Mismatch", request.method)
+        # Sign what arrived, exactly as it was encoded on the wire.
+        target = request.scope["raw_path"].decode("ascii")
+        if request.scope["query_string"]:
+            target += "?" + request.scope["query_string"].decode("ascii")
+        expected = sign_v4_s3(
+            method=request.method,
+            url=urlsplit(f"http://{request.headers['host']}{target}"),
+            region=match.group(2),
+            headers={
+                name: request.headers.get(name, "")
+                for name in match.group(3).split(";")
+            },
+            credentials=Credentials(*self.credentials),
+            content_sha256=content_sha256,
+            date=datetime.strptime(
+                request.headers.get("x-amz-date", ""), "%Y%m%dT%H%M%SZ"
+            ).replace(tzinfo=timezone.utc),
+        )["Authorization"]
+        if not hmac.compare_digest(expected, authorization):
+            return self._error(403, "SignatureDoesNotMatch", request.method)
+        return None
+
+    @staticmethod
+    def _xml(body: str) -> Response:
+        return Response(
+            '<?xml version="1.0" encoding="UTF-8"?>' + body,
+            media_type="application/xml",
+        )
+
+    async def bucket(self, request: Request) -> Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        error = await self._check_signature(request)
+        if error is not None:
+            return error
+        name = request.path_params["bucket"]
+        params = request.query_params
+        if request.method == "PUT":
+            self.buckets.setdefault(name, {})
+            return Response()
+        if name not in self.buckets:
+            return self._error(404, "NoSuchBucket", request.method)
+        objects = self.buckets[name]
+        if request.method == "HEAD":
+            return Response()
+        if request.method == "POST" and "delete" in params:
+            root = ElementTree.fromstring(await request.body())
+            deleted = []
+            for key in root.iter():
+                if key.tag.endswith("Key") and key.text:
+                    objects.pop(key.text, None)
+                    deleted.append(f"<Deleted><Key>{escape(key.text)}</Key></Deleted>")
+            return self._xml(
+                f'<DeleteResult xmlns="{_NS}">{"".join(deleted)}</DeleteResult>'
+            )
+        prefix = params.get("prefix", "")
+        keys = sorted(key for key in objects if key.startswith(prefix))
+        contents = "".join(
+            f"<Contents><Key>{escape(key)}</Key><Size>{len(objects[key][0])}</Size>"
+            f"<ETag>&quot;{hashlib.md5(objects[key][0]).hexdigest()}&quot;</ETag>"
+            "<LastModified>2024-01-01T00:00:00.000Z</LastModified></Contents>"
+            for key in keys
+        )
+        return self._xml(
+            f'<ListBucketResult xmlns="{_NS}"><Name>{name}</Name>'
+            f"<Prefix>{prefix}</Prefix><KeyCount>{len(keys)}</KeyCount>"
+            f"<IsTruncated>false</IsTruncated>{contents}</ListBucketResult>"
+        )
+
+    async def object(self, request: Request) -> Response:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        error = await self._check_signature(request)
+        if error is not None:
+            return error
+        bucket = request.path_params["bucket"]
+        key = request.path_params["key"]
+        params = request.query_params
+        if bucket not in self.buckets:
+            return self._error(404, "NoSuchBucket", request.method)
+        objects = self.buckets[bucket]
+
+        if request.method == "POST" and "uploads" in params:
+            upload_id = str(next(self._upload_ids))
+            self.uploads[upload_id] = (
+                request.headers.get("content-type", "application/octet-stream"),
+                {},
+            )
+            return self._xml(
+                f'<InitiateMultipartUploadResult xmlns="{_NS}"><Bucket>{bucket}'
+                f"</Bucket><Key>{key}</Key><UploadId>{upload_id}</UploadId>"
+                "</InitiateMultipartUploadResult>"
+            )
+        if "uploadId" in params:
+            upload_id = params["uploadId"]
+            if upload_id not in self.uploads:
+                return self._error(404, "NoSuchUpload", request.method)
+            if request.method == "PUT":
+                part = await request.body()
+                self.uploads[upload_id][1][int(params["partNumber"])] = part
+                etag = hashlib.md5(part).hexdigest()
+                return Response(headers={"ETag": f'"{etag}"'})
+            content_type, parts = self.uploads.pop(upload_id)
+            if request.method == "POST":
+                body = b"".join(parts[number] for number in sorted(parts))
+                objects[key] = (body, content_type)
+                return self._xml(
+                    f'<CompleteMultipartUploadResult xmlns="{_NS}"><Key>{key}</Key>'
+                    f'<ETag>"{hashlib.md5(body).hexdigest()}-{len(parts)}"</ETag>'
+                    "</CompleteMultipartUploadResult>"
+                )
+            return Response(status_code=204)
+
+        if request.method == "PUT":
+            body = await request.body()
+            objects[key] = (
+                body,
+                request.headers.get("content-type", "application/octet-stream"),
+            )
+            return Response(headers={"ETag": f'"{hashlib.md5(body).hexdigest()}"'})
+        if request.method == "DELETE":
+            objects.pop(key, None)
+            return Response(status_code=204)
+
+        if key not in objects:
+            return self._error(404, "NoSuchKey", request.method)
+        body, content_type = objects[key]
+        headers = {
+            "ETag": f'"{hashlib.md5(body).hexdigest()}"',
+            "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT",
+            "Accept-Ranges": "bytes",
+        }
+        status = 200
+        match = _RANGE.fullmatch(request.headers.get("range", ""))
+        if match:
+            first, last = match.groups()
+            start = int(first) if first else len(body) - int(last)
+            end = int(last) if first and last else len(body) - 1
+            end = min(end, len(body) - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+            body = body[start : end + 1]
+            status = 206
+        headers["Content-Length"] = str(len(body))
+        if request.method == "HEAD":
+            return Response(
+                status_code=status, headers=headers, media_type=content_type
+            )
+
+        async def stream():
+            for offset in range(0, len(body), _STREAM_CHUNK):
+                yield body[offset : offset + _STREAM_CHUNK]
+
+        return StreamingResponse(
+            stream(), status_code=status, headers=headers, media_type=content_type
+        )
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    args = parser.parse_args()
+    fake = FakeS3(latency=args.latency_ms / 1000)
+    uvicorn.run(fake.app(), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
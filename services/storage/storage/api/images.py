@@ -1,28 +1,97 @@
+import hashlib
+import logging
+import secrets
 from datetime import datetime, timedelta, timezone
-from typing import Annotated
+from typing import Annotated, Any, AsyncIterator, BinaryIO, Literal
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
-from fastapi.responses import StreamingResponse
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.responses import RedirectResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 
 from minio.error import S3Error
 
+from common.conditional import (
+    if_range_matches,
+    is_not_modified,
+    validator_headers,
+)
+from common.imaging import VARIANT_FORMATS, can_encode
+from common.singleflight import SingleFlight
+
 from ..clients.minio_client import (
+    ObjectInfo,
     build_object_name,
     build_preview_name,
+    presigned_download_url,
+    read_object,
+    stat_image,
     stream_image,
     upload_image,
+    upload_preview,
 )
-from ..db import get_session
+from ..db import async_session, get_session
 from ..messaging import publish_image_uploaded
 from ..models import Image
+from ..pagination import Cursor, InvalidCursor, decode_cursor, encode_cursor
+from ..previews import PreviewError, preview_candidates, render_preview
+from ..ranges import (
+    RangeNotSatisfiable,
+    content_range,
+    multipart_closing,
+    multipart_length,
+    multipart_part_header,
+    parse_range_header,
+)
 from ..repositories.image_repository import ImageRepository
-from ..schemas import ImageResponse
+from ..schemas import (
+    ImageListResponse,
+    ImageLookupRequest,
+    ImageLookupResponse,
+    ImageResponse,
+)
 from ..settings import get_settings
 
+log = logging.getLogger(__name__)
 router = APIRouter()
 settings = get_settings()
+preview_renders = SingleFlight()
+
+
+def _hash_upload(data: BinaryIO) -> tuple[int, str]:
+    """Size and SHA-256 hex digest of a spooled upload, rewound afterwards."""
+    digest = hashlib.sha256()
+    size = 0
+    while chunk := data.read(settings.upload_part_size):
+        digest.update(chunk)
+        size += len(chunk)
+    data.seek(0)
+    return size, digest.hexdigest()
+
+
+async def _find_shared_object(
+    repo: ImageRepository, content_hash: str, content_type: str
+) -> Image | None:
+    # Only share objects that will outlive the next cleanup pass, so cleanup
+    # cannot remove the object before the new row referencing it is committed.
+    expires_after = datetime.now(timezone.utc) + timedelta(
+        seconds=settings.cleanup_interval_seconds
+    )
+    return await repo.find_by_content_hash(
+        content_hash, settings.minio_bucket, content_type, expires_after
+    )
 
 
 @router.post(
@@ -40,24 +109,37 @@ async def upload_image_endpoint(
             detail=f"Unsupported content type: {file.content_type}",
         )
 
-    contents = await file.read()
-    size_bytes = len(contents)
-    if size_bytes == 0:
+    if not await file.read(1):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Uploaded file is empty",
         )
+    await file.seek(0)
 
     image_id = uuid4()
-    object_name = build_object_name(image_id, file.filename)
+    repo = ImageRepository(session)
+    duplicate_of = None
+    if settings.deduplicate_uploads:
+        # The upload is already spooled locally, so hashing it first lets a
+        # duplicate skip the write to MinIO altogether.
+        size_bytes, content_hash = await run_in_threadpool(_hash_upload, file.file)
+        duplicate_of = await _find_shared_object(
+            repo, content_hash, file.content_type
+        )
 
-    try:
-        await upload_image(object_name, contents, file.content_type)
-    except Exception as exc:
-        raise HTTPException(
-            status_code=status.HTTP_502_BAD_GATEWAY,
-            detail="Failed to store image",
-        ) from exc
+    if duplicate_of is not None:
+        object_name = duplicate_of.object_name
+    else:
+        object_name = build_object_name(image_id, file.filename)
+        try:
+            size_bytes, content_hash = await upload_image(
+                object_name, file.file, file.content_type
+            )
+        except Exception as exc:
+            raise HTTPException(
+                status_code=status.HTTP_502_BAD_GATEWAY,
+                detail="Failed to store image",
+            ) from exc
 
     record = Image(
         id=image_id,
@@ -66,12 +148,14 @@ async def upload_image_endpoint(
         bucket=settings.minio_bucket,
         content_type=file.content_type,
         size_bytes=size_bytes,
+        content_hash=content_hash,
+        # Previews are keyed by object name, so the shared object's are ours.
+        previews=duplicate_of.previews if duplicate_of is not None else None,
         created_at=datetime.now(timezone.utc),
         expires_at=datetime.now(timezone.utc)
         + timedelta(seconds=settings.image_ttl_seconds),
     )
 
-    repo = ImageRepository(session)
     try:
         saved = await repo.add(record)
     except Exception as exc:
@@ -81,6 +165,11 @@ async def upload_image_endpoint(
             detail="Failed to save image metadata",
         ) from exc
 
+    if duplicate_of is not None:
+        # Previews are keyed by object name, so the shared object already
+        # has (or is about to get) its preview set.
+        return ImageResponse.model_validate(saved)
+
     await publish_image_uploaded(
         {
             "id": str(saved.id),
@@ -97,6 +186,70 @@ async def upload_image_endpoint(
     return ImageResponse.model_validate(saved)
 
 
+def _as_utc(value: datetime | None) -> datetime | None:
+    # Query datetimes without an offset are taken to be UTC, like stored ones.
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value
+
+
+@router.get("/images", response_model=ImageListResponse)
+async def list_images(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    limit: Annotated[int | None, Query(ge=1)] = None,
+    cursor: str | None = None,
+    order: Literal["asc", "desc"] = "desc",
+    content_type: str | None = None,
+    expires_after: datetime | None = None,
+    expires_before: datetime | None = None,
+) -> ImageListResponse:
+    """List unexpired images by upload time, a page at a time.
+
+    Pages are fetched by keyset on ``(created_at, id)``, so each costs the
+    same however deep into the listing it is.
+    """
+    limit = limit or settings.list_default_limit
+    if limit > settings.list_max_limit:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"At most {settings.list_max_limit} images per page",
+        )
+    descending = order == "desc"
+    after = None
+    if cursor is not None:
+        try:
+            position = decode_cursor(cursor)
+        except InvalidCursor as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST, detail=str(exc)
+            ) from exc
+        if position.descending != descending:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor belongs to a listing in the other order",
+            )
+        after = (position.created_at, position.id)
+
+    # One extra row tells whether another page follows.
+    records = await ImageRepository(session).list_page(
+        limit + 1,
+        after,
+        descending=descending,
+        content_type=content_type,
+        expires_after=_as_utc(expires_after),
+        expires_before=_as_utc(expires_before),
+    )
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        last = records[-1]
+        next_cursor = encode_cursor(Cursor(last.created_at, last.id, descending))
+    return ImageListResponse(
+        images=[ImageResponse.model_validate(record) for record in records],
+        next_cursor=next_cursor,
+    )
+
+
 @router.get("/images/{image_id}", response_model=ImageResponse)
 async def get_image(
     image_id: UUID, session: Annotated[AsyncSession, Depends(get_session)]
@@ -110,10 +263,164 @@ async def get_image(
     return ImageResponse.model_validate(record)
 
 
-@router.get("/images/{image_id}/file")
+@router.post("/images/lookup", response_model=ImageLookupResponse)
+async def lookup_images(
+    body: ImageLookupRequest,
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> ImageLookupResponse:
+    image_ids = list(dict.fromkeys(body.ids))
+    found = await ImageRepository(session).get_many(image_ids)
+    return ImageLookupResponse(
+        images=[
+            ImageResponse.model_validate(found[image_id])
+            for image_id in image_ids
+            if image_id in found
+        ],
+        missing=[image_id for image_id in image_ids if image_id not in found],
+    )
+
+
+async def _multipart_stream(
+    bucket: str,
+    object_name: str,
+    ranges: list[tuple[int, int]],
+    boundary: str,
+    content_type: str,
+    size: int,
+) -> AsyncIterator[bytes]:
+    for start, end in ranges:
+        yield multipart_part_header(boundary, content_type, start, end, size)
+        stream = await stream_image(
+            bucket, object_name, offset=start, length=end - start + 1
+        )
+        try:
+            async for chunk in stream:
+                yield chunk
+        finally:
+            await stream.aclose()
+        yield b"\r\n"
+    yield multipart_closing(boundary)
+
+
+def _etag(
+    record: Image, size: int | None = None, variant: str | None = None
+) -> str:
+    # Strong validator: the content hash identifies the original's bytes and
+    # previews are derived deterministically from it.
+    parts = [record.content_hash or record.id.hex]
+    if size is not None:
+        parts.append(str(size))
+    if variant:
+        parts.append(variant)
+    return '"' + "-".join(parts) + '"'
+
+
+def _not_modified(request: Request, record: Image, etag: str) -> bool:
+    return is_not_modified(
+        request.headers.get("if-none-match"),
+        request.headers.get("if-modified-since"),
+        etag,
+        record.created_at,
+    )
+
+
+def _redirect_response(
+    bucket: str,
+    object_name: str,
+    content_disposition: str,
+    headers: dict[str, str] | None = None,
+) -> Response:
+    url, expires_at = presigned_download_url(
+        bucket, object_name, content_disposition
+    )
+    remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    max_age = max(int(remaining) - settings.presigned_url_refresh_seconds, 0)
+    return RedirectResponse(
+        url,
+        status_code=status.HTTP_307_TEMPORARY_REDIRECT,
+        headers={
+            "Cache-Control": f"private, max-age={max_age}",
+            **(headers or {}),
+        },
+    )
+
+
+async def _object_response(
+    request: Request,
+    bucket: str,
+    object_name: str,
+    size: int,
+    media_type: str,
+    headers: dict[str, str],
+    last_modified: datetime,
+) -> Response:
+    headers["Accept-Ranges"] = "bytes"
+
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(size)
+        return Response(media_type=media_type, headers=headers)
+
+    range_header = request.headers.get("range")
+    if not if_range_matches(
+        request.headers.get("if-range"), headers["ETag"], last_modified
+    ):
+        range_header = None
+
+    try:
+        ranges = parse_range_header(range_header, size)
+    except RangeNotSatisfiable as exc:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        ) from exc
+
+    if ranges is None:
+        stream = await stream_image(bucket, object_name)
+        # The object opened, not the metadata read earlier, sets the length.
+        headers["Content-Length"] = str(stream.size)
+        # Closing again once the response is done releases the connection
+        # even if the body was never read, e.g. when the client went away.
+        return StreamingResponse(
+            stream,
+            media_type=media_type,
+            headers=headers,
+            background=BackgroundTask(stream.aclose),
+        )
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        stream = await stream_image(
+            bucket, object_name, offset=start, length=end - start + 1
+        )
+        headers["Content-Range"] = content_range(start, end, size)
+        headers["Content-Length"] = str(stream.size)
+        return StreamingResponse(
+            stream,
+            status_code=status.HTTP_206_PARTIAL_CONTENT,
+            media_type=media_type,
+            headers=headers,
+            background=BackgroundTask(stream.aclose),
+        )
+
+    boundary = secrets.token_hex(16)
+    headers["Content-Length"] = str(
+        multipart_length(ranges, boundary, media_type, size)
+    )
+    return StreamingResponse(
+        _multipart_stream(bucket, object_name, ranges, boundary, media_type, size),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=f"multipart/byteranges; boundary={boundary}",
+        headers=headers,
+    )
+
+
+@router.api_route("/images/{image_id}/file", methods=["GET", "HEAD"])
 async def download_image(
-    image_id: UUID, session: Annotated[AsyncSession, Depends(get_session)]
-) -> StreamingResponse:
+    image_id: UUID,
+    request: Request,
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> Response:
     repo = ImageRepository(session)
     record = await repo.get(image_id)
     if record is None:
@@ -121,21 +428,158 @@ async def download_image(
             status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
         )
 
-    stream = await stream_image(record.bucket, record.object_name)
+    etag = _etag(record)
+    validators = validator_headers(etag, record.created_at, record.expires_at)
+    if _not_modified(request, record, etag):
+        return Response(
+            status_code=status.HTTP_304_NOT_MODIFIED, headers=validators
+        )
 
-    headers = {
-        "Content-Disposition": f'inline; filename="{record.original_filename or record.id}"'
-    }
-    if record.size_bytes:
-        headers["Content-Length"] = str(record.size_bytes)
+    disposition = f'inline; filename="{record.original_filename or record.id}"'
+    if settings.download_mode == "redirect":
+        return _redirect_response(record.bucket, record.object_name, disposition)
+
+    headers = {"Content-Disposition": disposition, **validators}
+
+    return await _object_response(
+        request,
+        record.bucket,
+        record.object_name,
+        record.size_bytes,
+        record.content_type,
+        headers,
+        record.created_at,
+    )
+
+
+def _preview_type(record: Image, variant: str | None) -> str:
+    if variant:
+        return VARIANT_FORMATS[variant][1]
+    return record.content_type or "application/octet-stream"
+
+
+def _manifest_entry(
+    record: Image, size: int, variant: str | None
+) -> dict[str, Any] | None:
+    for entry in record.previews or []:
+        if entry["size"] == size and entry.get("format") == variant:
+            return entry
+    return None
+
+
+async def _record_previews(record: Image, entries: list[dict[str, Any]]) -> None:
+    try:
+        async with async_session() as session:
+            await ImageRepository(session).add_previews(
+                record.bucket, record.object_name, entries
+            )
+    except Exception:
+        # The manifest is an optimisation; the preview itself is stored.
+        log.exception("Failed to record previews of %s", record.object_name)
+
+
+async def _render_preview(
+    record: Image, size: int, preview_name: str, variant: str | None
+) -> ObjectInfo:
+    original = await read_object(record.bucket, record.object_name)
+    rendered = await run_in_threadpool(
+        render_preview,
+        original,
+        size,
+        record.content_type,
+        settings.preview_max_image_pixels,
+        variant,
+    )
+    content_type = _preview_type(record, variant)
+    await upload_preview(preview_name, rendered.content, content_type)
+    log.info(
+        "Rendered preview %s on demand (%d bytes)",
+        preview_name,
+        len(rendered.content),
+    )
+    await _record_previews(
+        record,
+        [
+            {
+                "size": size,
+                "format": variant,
+                "object_name": preview_name,
+                "content_type": content_type,
+                "bytes": len(rendered.content),
+                "width": rendered.width,
+                "height": rendered.height,
+            }
+        ],
+    )
+    return ObjectInfo(size=len(rendered.content), etag="", content_type=content_type)
+
+
+async def _find_or_render_preview(
+    record: Image, size: int, candidates: list[str | None]
+) -> tuple[str, str | None, ObjectInfo]:
+    """Name, variant and info of the best stored preview among ``candidates``.
+
+    Once the preview worker has reported an image's previews, the manifest
+    answers which ones exist without asking MinIO.
+    """
+    renderable = (
+        settings.render_previews_on_demand
+        and settings.is_preview_size_allowed(size)
+    )
+    if renderable:
+        # Render the preferred encoding when it is missing rather than fall
+        # back, which also backfills variants for images uploaded earlier.
+        candidates = [next(v for v in candidates if v is None or can_encode(v))]
+
+    for variant in candidates:
+        preview_name = build_preview_name(record.object_name, size, variant)
+        if record.previews is not None:
+            entry = _manifest_entry(record, size, variant)
+            if entry is not None:
+                info = ObjectInfo(
+                    size=entry["bytes"],
+                    etag="",
+                    content_type=entry["content_type"],
+                )
+                return entry["object_name"], variant, info
+            if not renderable:
+                continue
+        try:
+            info = await stat_image(settings.preview_bucket, preview_name)
+        except S3Error as exc:
+            if exc.code != "NoSuchKey":
+                raise
+        else:
+            return preview_name, variant, info
 
-    return StreamingResponse(stream, media_type=record.content_type, headers=headers)
+    if not renderable:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Preview not found"
+        )
+
+    # Previews are keyed by object name, so deduplicated images share a render.
+    variant = candidates[0]
+    preview_name = build_preview_name(record.object_name, size, variant)
+    try:
+        info = await preview_renders.do(
+            (settings.preview_bucket, preview_name),
+            lambda: _render_preview(record, size, preview_name, variant),
+        )
+    except PreviewError as exc:
+        log.warning("Cannot render preview %s: %s", preview_name, exc)
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Preview not found"
+        ) from exc
+    return preview_name, variant, info
 
 
-@router.get("/images/{image_id}/preview/{size}")
+@router.api_route("/images/{image_id}/preview/{size}", methods=["GET", "HEAD"])
 async def download_preview(
-    image_id: UUID, size: int, session: Annotated[AsyncSession, Depends(get_session)]
-) -> StreamingResponse:
+    image_id: UUID,
+    size: int,
+    request: Request,
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> Response:
     repo = ImageRepository(session)
     record = await repo.get(image_id)
     if record is None:
@@ -143,24 +587,65 @@ async def download_preview(
             status_code=status.HTTP_404_NOT_FOUND, detail="Image not found"
         )
 
-    preview_name = build_preview_name(record.object_name, size)
+    candidates = preview_candidates(
+        request.headers.get("accept"), settings.preview_variant_formats
+    )
+    # The representation depends on Accept whenever variants exist at all.
+    vary = {"Vary": "Accept"} if settings.preview_variant_formats else {}
+
+    # Every candidate is acceptable to the client, so a cached copy of any
+    # of them is still good.
+    for variant in candidates:
+        etag = _etag(record, size, variant)
+        if _not_modified(request, record, etag):
+            return Response(
+                status_code=status.HTTP_304_NOT_MODIFIED,
+                headers={
+                    **validator_headers(etag, record.created_at, record.expires_at),
+                    **vary,
+                },
+            )
+
+    redirect = settings.download_mode == "redirect"
+    if redirect and not settings.render_previews_on_demand and len(candidates) == 1:
+        # No stat here: MinIO answers 404 itself if the preview is missing.
+        preview_name = build_preview_name(record.object_name, size)
+        return _redirect_response(
+            settings.preview_bucket,
+            preview_name,
+            f'inline; filename="{preview_name}"',
+            vary,
+        )
 
     try:
-        stream = await stream_image(settings.preview_bucket, preview_name)
+        preview_name, variant, info = await _find_or_render_preview(
+            record, size, candidates
+        )
     except S3Error as exc:
-        if exc.code == "NoSuchKey":
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND, detail="Preview not found"
-            ) from exc
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail="Failed to fetch preview from storage",
         ) from exc
 
-    headers = {"Content-Disposition": f'inline; filename="{preview_name}"'}
+    disposition = f'inline; filename="{preview_name}"'
+    if redirect:
+        return _redirect_response(
+            settings.preview_bucket, preview_name, disposition, vary
+        )
 
-    return StreamingResponse(
-        stream,
-        media_type=record.content_type or "application/octet-stream",
-        headers=headers,
+    etag = _etag(record, size, variant)
+    headers = {
+        "Content-Disposition": disposition,
+        **validator_headers(etag, record.created_at, record.expires_at),
+        **vary,
+    }
+
+    return await _object_response(
+        request,
+        settings.preview_bucket,
+        preview_name,
+        info.size,
+        _preview_type(record, variant),
+        headers,
+        record.created_at,
     )
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+from .. import messaging
+from ..clients.minio_client import presigned_url_cache
+from ..repositories.image_repository import image_cache
+from .images import preview_renders
+
+router = APIRouter()
+
+
+@router.get("/stats")
+async def get_stats() -> dict:
+    return {
+        "metadata_cache": image_cache.stats(),
+        "presigned_url_cache": presigned_url_cache.stats(),
+        "preview_renders": preview_renders.stats(),
+        "event_publisher": (
+            messaging.event_publisher.stats()
+            if messaging.event_publisher is not None
+            else None
+        ),
+    }
+
+
+@router.get("/metrics", include_in_schema=False)
+async def get_metrics() -> Response:
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
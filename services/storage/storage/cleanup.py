@@ -1,9 +1,15 @@
 import asyncio
 import logging
-from datetime import datetime, timezone
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
 
-from .clients.minio_client import delete_object, delete_previews
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import partitions
+from .clients.minio_client import list_previews, remove_objects
 from .db import async_session
+from .metrics import CLEANUP_BATCH_SECONDS
 from .models import Image
 from .repositories.image_repository import ImageRepository
 from .settings import get_settings
@@ -14,42 +20,276 @@ settings = get_settings()
 _cleanup_task: asyncio.Task | None = None
 
 
-async def cleanup_expired_once() -> None:
-    now = datetime.now(timezone.utc)
-    async with async_session() as session:
-        repo = ImageRepository(session)
-        expired = await repo.list_expired(now)
+ObjectKey = tuple[str, str]
 
-        for image in expired:
-            await _delete_image(repo, image)
 
+def _objects_to_remove(
+    rows_by_object: dict[ObjectKey, list[Image]], references: dict[ObjectKey, int]
+) -> list[ObjectKey]:
+    """Objects whose every referencing row is among the expiring ones.
 
-async def _delete_image(repo: ImageRepository, image: Image) -> None:
-    try:
-        await delete_object(image.bucket, image.object_name)
-    except Exception:
-        log.warning(
-            "Failed to delete object %s/%s; keeping metadata for retry",
-            image.bucket,
-            image.object_name,
-        )
-        return
+    Deduplicated uploads share an object, which must outlive its last row.
+    """
+    return [
+        key
+        for key, rows in rows_by_object.items()
+        if references.get(key, 0) <= len(rows)
+    ]
+
+
+def _manifest_previews(rows: list[Image]) -> list[str] | None:
+    """Preview names recorded for an object, or None if any row lacks them.
+
+    A manifest holding only on-demand renders says nothing of the worker's
+    previews, so only one the worker has reported to is trusted.
+    """
+    if not all(
+        any(entry.get("complete") for entry in image.previews or [])
+        for image in rows
+    ):
+        return None
+    return sorted(
+        {entry["object_name"] for image in rows for entry in image.previews}
+    )
+
+
+async def _list_previews(
+    keys: list[ObjectKey],
+) -> tuple[dict[str, ObjectKey], set[ObjectKey]]:
+    slots = asyncio.Semaphore(settings.cleanup_concurrency)
+
+    async def list_one(key: ObjectKey) -> tuple[ObjectKey, list[str] | None]:
+        async with slots:
+            try:
+                return key, await list_previews(key[1])
+            except Exception as exc:
+                log.warning("Failed to list previews for %s: %s", key[1], exc)
+                return key, None
+
+    owners: dict[str, ObjectKey] = {}
+    failed: set[ObjectKey] = set()
+    for key, names in await asyncio.gather(*(list_one(key) for key in keys)):
+        if names is None:
+            failed.add(key)
+        else:
+            owners.update((name, key) for name in names)
+    return owners, failed
 
+
+async def _remove(bucket: str, owners: dict[str, ObjectKey]) -> set[ObjectKey]:
+    """Bulk-delete ``owners``' names; returns the keys left incomplete."""
     try:
-        await delete_previews(image.object_name)
-    except Exception:
+        errors = await remove_objects(bucket, list(owners))
+    except Exception as exc:
+        log.warning("Bulk delete in %s failed: %s", bucket, exc)
+        return set(owners.values())
+    return {owners[name] for name in errors if name in owners}
+
+
+async def _remove_objects(
+    keys: list[ObjectKey], known_previews: dict[ObjectKey, list[str]]
+) -> set[ObjectKey]:
+    """Delete originals and their previews; returns the keys that failed.
+
+    Previews of keys missing from ``known_previews`` are found by listing.
+    """
+    preview_owners, failed = await _list_previews(
+        [key for key in keys if key not in known_previews]
+    )
+    for key, names in known_previews.items():
+        preview_owners.update((name, key) for name in names)
+
+    originals: dict[str, dict[str, ObjectKey]] = defaultdict(dict)
+    for key in keys:
+        originals[key[0]][key[1]] = key
+    for bucket, owners in originals.items():
+        failed |= await _remove(bucket, owners)
+
+    failed |= await _remove(settings.preview_bucket, preview_owners)
+    return failed
+
+
+def _group_by_object(batch: list[Image]) -> dict[ObjectKey, list[Image]]:
+    rows_by_object: dict[ObjectKey, list[Image]] = defaultdict(list)
+    for image in batch:
+        rows_by_object[(image.bucket, image.object_name)].append(image)
+    return rows_by_object
+
+
+async def _count_references(
+    repo: ImageRepository,
+    rows_by_object: dict[ObjectKey, list[Image]],
+    expiring_from: datetime | None = None,
+) -> dict[ObjectKey, int]:
+    references: dict[ObjectKey, int] = {}
+    for bucket in {bucket for bucket, _ in rows_by_object}:
+        names = [name for key_bucket, name in rows_by_object if key_bucket == bucket]
+        counts = await repo.count_references_many(bucket, names, expiring_from)
+        references.update(((bucket, name), count) for name, count in counts.items())
+    return references
+
+
+def _known_previews(
+    rows_by_object: dict[ObjectKey, list[Image]], keys: list[ObjectKey]
+) -> dict[ObjectKey, list[str]]:
+    known = {}
+    for key in keys:
+        names = _manifest_previews(rows_by_object[key])
+        if names is not None:
+            known[key] = names
+    return known
+
+
+async def _delete_batch(repo: ImageRepository, batch: list[Image]) -> int:
+    rows_by_object = _group_by_object(batch)
+    references = await _count_references(repo, rows_by_object)
+    to_remove = _objects_to_remove(rows_by_object, references)
+    failed = await _remove_objects(
+        to_remove, _known_previews(rows_by_object, to_remove)
+    )
+    for bucket, name in failed:
         log.warning(
-            "Failed to delete previews for %s; keeping metadata for retry",
-            image.object_name,
+            "Failed to delete object %s/%s; keeping metadata for retry", bucket, name
         )
-        return
 
+    image_ids = [
+        image.id
+        for key, rows in rows_by_object.items()
+        if key not in failed
+        for image in rows
+    ]
+    if not image_ids:
+        return 0
     try:
-        await repo.delete(image)
-        log.info("Expired image %s deleted", image.id)
+        await repo.delete_many(image_ids)
     except Exception as exc:
         await repo.session.rollback()
-        log.error("Failed to delete image metadata %s: %s", image.id, exc)
+        log.error("Failed to delete metadata for %d images: %s", len(image_ids), exc)
+        return 0
+    return len(image_ids)
+
+
+async def _clear_partition(
+    repo: ImageRepository, partition: partitions.Partition, now: datetime
+) -> int | None:
+    """Remove the objects of a partition's rows, leaving the rows in place.
+
+    Returns the number of rows, or None if some objects could not be removed.
+    """
+    rows = 0
+    complete = True
+    after = None
+    while True:
+        started = time.perf_counter()
+        batch = await repo.list_expired(
+            now, settings.cleanup_batch_size, after, partition.name
+        )
+        if not batch:
+            break
+        after = (batch[-1].expires_at, batch[-1].id)
+        rows += len(batch)
+        rows_by_object = _group_by_object(batch)
+        # Every row in the partition goes with it, so only rows expiring
+        # after it can keep a shared object alive.
+        references = await _count_references(repo, rows_by_object, partition.end)
+        to_remove = [key for key in rows_by_object if not references.get(key)]
+        failed = await _remove_objects(
+            to_remove, _known_previews(rows_by_object, to_remove)
+        )
+        CLEANUP_BATCH_SECONDS.labels("partition").observe(
+            time.perf_counter() - started
+        )
+        for bucket, name in failed:
+            log.warning("Failed to delete object %s/%s", bucket, name)
+            complete = False
+        repo.session.expunge_all()
+        if len(batch) < settings.cleanup_batch_size:
+            break
+    return rows if complete else None
+
+
+async def _drop_expired_partitions(
+    session: AsyncSession, now: datetime, deadline: float
+) -> int:
+    """Drop the partitions whose whole day has expired; returns rows dropped."""
+    repo = ImageRepository(session)
+    dropped = 0
+    for partition in await partitions.list_partitions(session):
+        if partition.end > now or time.monotonic() >= deadline:
+            break
+        rows = await _clear_partition(repo, partition, now)
+        if rows is None:
+            log.warning("Keeping partition %s for retry", partition.name)
+            continue
+        with CLEANUP_BATCH_SECONDS.labels("drop_partition").time():
+            await partitions.drop_partition(session, partition)
+        log.info("Dropped partition %s (%d images)", partition.name, rows)
+        dropped += rows
+    return dropped
+
+
+async def _ensure_partitions(session: AsyncSession, now: datetime) -> None:
+    horizon = now + timedelta(
+        seconds=settings.image_ttl_seconds, days=settings.partition_premake_days
+    )
+    await partitions.ensure_partitions(
+        session, partitions.days_between(now, horizon)
+    )
+
+
+async def prepare_partitions() -> None:
+    """Create the partitions new uploads will need, if images is partitioned."""
+    if not settings.partition_images_by_expiry:
+        return
+    async with async_session() as session:
+        if await partitions.is_partitioned(session):
+            await _ensure_partitions(session, datetime.now(timezone.utc))
+
+
+async def cleanup_expired_once() -> int:
+    """Delete expired images a page at a time.
+
+    Stops when none are left or the run's time budget is spent, and returns
+    the number of images deleted. When images is partitioned, whole expired
+    days are dropped instead and only the default partition is paged.
+    """
+    now = datetime.now(timezone.utc)
+    deadline = time.monotonic() + settings.cleanup_time_budget_seconds
+    deleted = 0
+    after = None
+    partition = None
+    async with async_session() as session:
+        partitioned = settings.partition_images_by_expiry
+        if partitioned and await partitions.is_partitioned(session):
+            await _ensure_partitions(session, now)
+            deleted += await _drop_expired_partitions(session, now, deadline)
+            partition = partitions.DEFAULT_PARTITION
+
+        repo = ImageRepository(session)
+        while True:
+            started = time.perf_counter()
+            batch = await repo.list_expired(
+                now, settings.cleanup_batch_size, after, partition
+            )
+            if not batch:
+                break
+            # Rows kept for retry are behind the cursor, so they wait for the
+            # next run instead of being fetched again.
+            after = (batch[-1].expires_at, batch[-1].id)
+            deleted += await _delete_batch(repo, batch)
+            CLEANUP_BATCH_SECONDS.labels("rows").observe(
+                time.perf_counter() - started
+            )
+            session.expunge_all()
+            if len(batch) < settings.cleanup_batch_size:
+                break
+            if time.monotonic() >= deadline:
+                log.info("Cleanup time budget spent; resuming next run")
+                break
+
+    if deleted:
+        log.info("Deleted %d expired images", deleted)
+    return deleted
 
 
 async def _cleanup_loop() -> None:
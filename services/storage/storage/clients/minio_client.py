@@ -1,70 +1,287 @@
+import hashlib
 import io
 import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import AsyncIterator
+from typing import AsyncIterator, BinaryIO, Iterator, NamedTuple
 from uuid import UUID
 
 from minio import Minio
+from minio.deleteobjects import DeleteObject
 from minio.error import S3Error
 from starlette.concurrency import run_in_threadpool
 
+from common.tracing import span
+
+from ..cache import MISSING, TTLCache
+from ..metrics import OBJECT_STORAGE_BYTES, OBJECT_STORAGE_SECONDS
 from ..settings import get_settings
+from .s3_async import AsyncS3Client, ObjectStream
 
 log = logging.getLogger(__name__)
 settings = get_settings()
 
+
+@contextmanager
+def _observe(operation: str) -> Iterator[None]:
+    with span(f"minio.{operation}"), OBJECT_STORAGE_SECONDS.labels(operation).time():
+        yield
+
+
+class ObjectInfo(NamedTuple):
+    size: int
+    etag: str
+    content_type: str | None
+
+
 minio_client = Minio(
     settings.minio_endpoint,
     access_key=settings.minio_access_key,
     secret_key=settings.minio_secret_key,
     secure=settings.minio_secure,
+    region=settings.minio_region,
 )
 
+# Signs download URLs for the host browsers use. The region is fixed, so
+# presigning is a local computation and never calls MinIO.
+presign_client = Minio(
+    settings.minio_public_endpoint or settings.minio_endpoint,
+    access_key=settings.minio_access_key,
+    secret_key=settings.minio_secret_key,
+    secure=(
+        settings.minio_secure
+        if settings.minio_public_secure is None
+        else settings.minio_public_secure
+    ),
+    region=settings.minio_region,
+)
+presigned_url_cache = TTLCache(settings.presigned_url_cache_size)
 
-async def ensure_bucket() -> None:
-    exists = await run_in_threadpool(
-        minio_client.bucket_exists, settings.minio_bucket
-    )
+# Set by init_object_storage() when the asyncio client is selected; the
+# threaded minio_client is used otherwise.
+async_client: AsyncS3Client | None = None
+
+
+async def init_object_storage() -> None:
+    global async_client
+    if settings.object_storage_client == "async" and async_client is None:
+        async_client = AsyncS3Client(
+            settings.minio_endpoint,
+            settings.minio_access_key,
+            settings.minio_secret_key,
+            secure=settings.minio_secure,
+            region=settings.minio_region,
+            max_connections=settings.object_storage_max_connections,
+            timeout=settings.object_storage_timeout_seconds,
+        )
+
+
+async def close_object_storage() -> None:
+    global async_client
+    if async_client is not None:
+        await async_client.aclose()
+        async_client = None
+
+
+async def _ensure_bucket(bucket: str) -> None:
+    if async_client is not None:
+        if not await async_client.bucket_exists(bucket):
+            await async_client.make_bucket(bucket)
+        return
+    exists = await run_in_threadpool(minio_client.bucket_exists, bucket)
     if not exists:
-        await run_in_threadpool(minio_client.make_bucket, settings.minio_bucket)
+        await run_in_threadpool(minio_client.make_bucket, bucket)
+
+
+async def ensure_bucket() -> None:
+    await _ensure_bucket(settings.minio_bucket)
+    if settings.render_previews_on_demand:
+        # Normally created by the preview worker, but storage writes to it too.
+        await _ensure_bucket(settings.preview_bucket)
+
+
+class _HashingReader:
+    """File-like wrapper that counts and hashes bytes as MinIO pulls them."""
+
+    def __init__(self, stream: BinaryIO) -> None:
+        self._stream = stream
+        self._digest = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self._stream.read(size)
+        self._digest.update(chunk)
+        self.size += len(chunk)
+        return chunk
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
 
 
 async def upload_image(
-    object_name: str, content: bytes, content_type: str
-) -> None:
+    object_name: str, data: BinaryIO, content_type: str
+) -> tuple[int, str]:
+    """Stream ``data`` into MinIO part by part.
+
+    Returns the number of bytes written and their SHA-256 hex digest.
+    """
+    reader = _HashingReader(data)
     try:
-        await run_in_threadpool(
-            minio_client.put_object,
-            settings.minio_bucket,
-            object_name,
-            io.BytesIO(content),
-            len(content),
-            content_type=content_type,
-        )
+        with _observe("upload_image"):
+            if async_client is not None:
+                await async_client.put_object(
+                    settings.minio_bucket,
+                    object_name,
+                    reader,
+                    content_type,
+                    settings.upload_part_size,
+                )
+            else:
+                await run_in_threadpool(
+                    minio_client.put_object,
+                    settings.minio_bucket,
+                    object_name,
+                    reader,
+                    -1,
+                    content_type=content_type,
+                    part_size=settings.upload_part_size,
+                    num_parallel_uploads=1,
+                )
     except Exception as exc:
         log.error("Failed to upload to MinIO: %s", exc)
         raise
+    finally:
+        OBJECT_STORAGE_BYTES.labels("upload_image").inc(reader.size)
+    return reader.size, reader.hexdigest()
+
+
+async def upload_preview(
+    object_name: str, content: bytes, content_type: str
+) -> None:
+    """Store a preview, replacing any stored under ``object_name``.
+
+    The preview worker may store the same preview meanwhile. Both encode it
+    the same way, so whichever write lands last is harmless.
+    """
+    with _observe("upload_preview"):
+        if async_client is not None:
+            await async_client.put_object(
+                settings.preview_bucket,
+                object_name,
+                io.BytesIO(content),
+                content_type,
+                settings.upload_part_size,
+            )
+        else:
+            await run_in_threadpool(
+                minio_client.put_object,
+                settings.preview_bucket,
+                object_name,
+                io.BytesIO(content),
+                len(content),
+                content_type=content_type,
+            )
+    OBJECT_STORAGE_BYTES.labels("upload_preview").inc(len(content))
+
+
+async def read_object(bucket: str, object_name: str) -> bytes:
+    stream = await stream_image(bucket, object_name)
+    try:
+        return b"".join([chunk async for chunk in stream])
+    finally:
+        await stream.aclose()
 
 
 async def stream_image(
-    bucket: str, object_name: str, chunk_size: int = 1024 * 1024
-) -> AsyncIterator[bytes]:
-    response = await run_in_threadpool(
-        minio_client.get_object, bucket, object_name
-    )
+    bucket: str,
+    object_name: str,
+    chunk_size: int | None = None,
+    offset: int = 0,
+    length: int = 0,
+) -> ObjectStream:
+    """Open an object (or the range ``offset``/``length`` of it) for reading.
+
+    The caller must ``aclose`` the stream unless it reads it to the end.
+    """
+    chunk_size = chunk_size or settings.object_storage_chunk_size
+    with _observe("stream_image"):
+        if async_client is not None:
+            stream = await async_client.get_object(
+                bucket, object_name, offset, length, chunk_size
+            )
+        else:
+            response = await run_in_threadpool(
+                minio_client.get_object, bucket, object_name, offset, length
+            )
 
-    async def generator() -> AsyncIterator[bytes]:
+            async def release() -> None:
+                response.close()
+                response.release_conn()
+
+            stream = ObjectStream(
+                _read_chunks(response, chunk_size),
+                int(response.headers.get("content-length", 0)),
+                release,
+            )
+    return _counted(stream, "stream_image")
+
+
+async def _read_chunks(response, chunk_size: int) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await run_in_threadpool(response.read, chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def _counted(stream: ObjectStream, operation: str) -> ObjectStream:
+    async def release() -> None:
         try:
-            while True:
-                chunk = await run_in_threadpool(response.read, chunk_size)
-                if not chunk:
-                    break
-                yield chunk
+            await stream.aclose()
         finally:
-            response.close()
-            response.release_conn()
+            # Counted once the stream ends, not per chunk.
+            OBJECT_STORAGE_BYTES.labels(operation).inc(stream.bytes_read)
+
+    return ObjectStream(stream, stream.size, release)
+
 
-    return generator()
+async def stat_image(bucket: str, object_name: str) -> ObjectInfo:
+    with _observe("stat_image"):
+        if async_client is not None:
+            headers = await async_client.stat_object(bucket, object_name)
+            return ObjectInfo(
+                size=int(headers.get("content-length", 0)),
+                etag=headers.get("etag", "").strip('"'),
+                content_type=headers.get("content-type"),
+            )
+        stat = await run_in_threadpool(minio_client.stat_object, bucket, object_name)
+    return ObjectInfo(
+        size=stat.size or 0, etag=stat.etag or "", content_type=stat.content_type
+    )
+
+
+def presigned_download_url(
+    bucket: str, object_name: str, content_disposition: str
+) -> tuple[str, datetime]:
+    """Presigned GET URL for the object and the moment it stops working."""
+    key = (bucket, object_name, content_disposition)
+    cached = presigned_url_cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    ttl = settings.presigned_url_ttl_seconds
+    url = presign_client.presigned_get_object(
+        bucket,
+        object_name,
+        expires=timedelta(seconds=ttl),
+        response_headers={"response-content-disposition": content_disposition},
+    )
+    cached = (url, datetime.now(timezone.utc) + timedelta(seconds=ttl))
+    # Stop handing the URL out shortly before it expires, so clients never
+    # follow a redirect to a signature that has already lapsed.
+    presigned_url_cache.set(key, cached, ttl - settings.presigned_url_refresh_seconds)
+    return cached
 
 
 def build_object_name(image_id: UUID, filename: str | None) -> str:
@@ -72,16 +289,24 @@ def build_object_name(image_id: UUID, filename: str | None) -> str:
     return f"{image_id}{suffix}"
 
 
-def build_preview_name(object_name: str, size: int) -> str:
+def build_preview_name(
+    object_name: str, size: int, variant: str | None = None
+) -> str:
     path = Path(object_name)
-    suffix = path.suffix or ""
+    suffix = f".{variant}" if variant else path.suffix or ""
     stem = path.stem or "image"
     return f"{stem}_{size}{suffix}"
 
 
 async def delete_object(bucket: str, object_name: str) -> None:
     try:
-        await run_in_threadpool(minio_client.remove_object, bucket, object_name)
+        with _observe("delete_object"):
+            if async_client is not None:
+                await async_client.remove_object(bucket, object_name)
+            else:
+                await run_in_threadpool(
+                    minio_client.remove_object, bucket, object_name
+                )
     except S3Error as exc:
         if exc.code == "NoSuchKey":
             log.info("Object %s/%s already removed", bucket, object_name)
@@ -93,21 +318,38 @@ async def delete_object(bucket: str, object_name: str) -> None:
         raise
 
 
-async def delete_previews(object_name: str) -> None:
+async def remove_objects(bucket: str, object_names: list[str]) -> list[str]:
+    """Delete objects in bulk; returns the names that could not be deleted."""
+    if not object_names:
+        return []
+
+    def remove() -> list[str]:
+        errors = minio_client.remove_objects(
+            bucket, [DeleteObject(name) for name in object_names]
+        )
+        return [error.name or "" for error in errors if error.code != "NoSuchKey"]
+
+    with _observe("delete_objects"):
+        if async_client is not None:
+            return await async_client.remove_objects(bucket, object_names)
+        return await run_in_threadpool(remove)
+
+
+async def list_previews(object_name: str) -> list[str]:
     prefix = f"{Path(object_name).stem}_"
     try:
-        objects = await run_in_threadpool(
-            lambda: list(
-                minio_client.list_objects(
-                    settings.preview_bucket, prefix=prefix, recursive=False
+        with _observe("list_previews"):
+            if async_client is not None:
+                return await async_client.list_objects(
+                    settings.preview_bucket, prefix
                 )
-            )
-        )
-        for obj in objects:
-            await run_in_threadpool(
-                minio_client.remove_object,
-                settings.preview_bucket,
-                obj.object_name,
+            return await run_in_threadpool(
+                lambda: [
+                    obj.object_name
+                    for obj in minio_client.list_objects(
+                        settings.preview_bucket, prefix=prefix, recursive=False
+                    )
+                ]
             )
     except S3Error as exc:
         if exc.code == "NoSuchBucket":
@@ -115,12 +357,5 @@ async def delete_previews(object_name: str) -> None:
                 "Preview bucket %s missing; skipping preview cleanup",
                 settings.preview_bucket,
             )
-            return
-        if exc.code == "NoSuchKey":
-            log.info("Previews for %s already removed", object_name)
-            return
-        log.error("Failed to remove previews for %s: %s", object_name, exc)
-        raise
-    except Exception as exc:
-        log.error("Failed to remove previews for %s: %s", object_name, exc)
+            return []
         raise
@@ -0,0 +1,417 @@
+import base64
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Mapping
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+import aiohttp
+from minio.credentials import Credentials
+from minio.error import S3Error
+from minio.signer import sign_v4_s3
+from minio.time import to_amz_date
+from starlette.concurrency import run_in_threadpool
+from yarl import URL
+
+log = logging.getLogger(__name__)
+
+_EMPTY_SHA256 = hashlib.sha256(b"").hexdigest()
+_S3_NAMESPACE = "{http://s3.amazonaws.com/doc/2006-03-01/}"
+# DeleteObjects accepts at most this many keys per request.
+_MAX_DELETE_KEYS = 1000
+# Larger request bodies (upload parts) are hashed in the threadpool.
+_INLINE_HASH_BYTES = 64 * 1024
+
+
+def _find_text(element: ElementTree.Element, name: str) -> str | None:
+    found = element.find(f"{_S3_NAMESPACE}{name}")
+    if found is None:
+        found = element.find(name)
+    return found.text if found is not None else None
+
+
+def _read_part(data: BinaryIO, size: int) -> bytes:
+    parts = []
+    while size > 0:
+        chunk = data.read(size)
+        if not chunk:
+            break
+        parts.append(chunk)
+        size -= len(chunk)
+    return b"".join(parts)
+
+
+def _sha256(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+def _s3_error(
+    status: int,
+    reason: str | None,
+    headers: Mapping[str, str],
+    body: bytes,
+    bucket: str,
+    object_name: str,
+) -> S3Error:
+    code = message = resource = request_id = host_id = None
+    if body:
+        try:
+            root = ElementTree.fromstring(body)
+        except ElementTree.ParseError:
+            message = body.decode("utf-8", "replace")
+        else:
+            code = _find_text(root, "Code")
+            message = _find_text(root, "Message")
+            resource = _find_text(root, "Resource")
+            request_id = _find_text(root, "RequestId")
+            host_id = _find_text(root, "HostId")
+    if code is None and status == 404:
+        # HEAD responses carry no error document.
+        code = "NoSuchKey" if object_name else "NoSuchBucket"
+    return S3Error(
+        response=None,
+        code=code or f"HTTP{status}",
+        message=message or reason,
+        resource=resource or f"/{bucket}/{object_name}",
+        request_id=request_id or headers.get("x-amz-request-id"),
+        host_id=host_id,
+        bucket_name=bucket,
+        object_name=object_name or None,
+    )
+
+
+class ObjectStream:
+    """The body of an opened object.
+
+    ``size`` is the length of this response's body, as sent, rather than
+    the object's length at some earlier stat. ``aclose`` releases the
+    connection whether or not the body was read; it also runs by itself
+    once the body is exhausted.
+    """
+
+    def __init__(
+        self,
+        chunks: AsyncIterator[bytes],
+        size: int,
+        release: Callable[[], Awaitable[None]],
+    ) -> None:
+        self.size = size
+        self.bytes_read = 0
+        self._chunks = chunks
+        self._release: Callable[[], Awaitable[None]] | None = release
+
+    def __aiter__(self) -> AsyncIterator[bytes]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in self._chunks:
+                self.bytes_read += len(chunk)
+                yield chunk
+        finally:
+            await self.aclose()
+
+    async def aclose(self) -> None:
+        if self._release is not None:
+            release, self._release = self._release, None
+            await release()
+
+
+class AsyncS3Client:
+    """Minimal asyncio S3 client for the operations the storage service uses.
+
+    Requests go through a pooled ``aiohttp`` session and are signed with
+    MinIO's SigV4 implementation, so bodies stream without holding a worker
+    thread per chunk. Errors are raised as ``minio.error.S3Error`` to stay
+    interchangeable with the threaded client. Create it inside a running
+    event loop.
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        access_key: str,
+        secret_key: str,
+        secure: bool = False,
+        region: str = "us-east-1",
+        max_connections: int = 100,
+        timeout: float | None = 30.0,
+    ) -> None:
+        scheme = "https" if secure else "http"
+        self._base_url = f"{scheme}://{endpoint}"
+        self._secure = secure
+        self._region = region
+        self._credentials = Credentials(access_key, secret_key)
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=max_connections),
+            timeout=aiohttp.ClientTimeout(
+                total=None, sock_connect=timeout, sock_read=timeout
+            ),
+            auto_decompress=False,
+        )
+
+    async def aclose(self) -> None:
+        await self._session.close()
+
+    def _url(
+        self,
+        bucket: str,
+        object_name: str = "",
+        query: dict[str, str] | None = None,
+    ) -> str:
+        path = f"/{bucket}"
+        if object_name:
+            path += "/" + quote(object_name, safe="/-_.~")
+        if query:
+            path += "?" + "&".join(
+                f"{quote(key, safe='-_.~')}={quote(value, safe='-_.~')}"
+                for key, value in sorted(query.items())
+            )
+        return self._base_url + path
+
+    def _signed_headers(
+        self,
+        method: str,
+        url: str,
+        headers: dict[str, str] | None,
+        content_sha256: str,
+    ) -> dict[str, str]:
+        signed = dict(headers or {})
+        split = urlsplit(url)
+        date = datetime.now(timezone.utc)
+        signed["Host"] = split.netloc
+        signed["x-amz-date"] = to_amz_date(date)
+        signed["x-amz-content-sha256"] = content_sha256
+        return sign_v4_s3(
+            method=method,
+            url=split,
+            region=self._region,
+            headers=signed,
+            credentials=self._credentials,
+            content_sha256=content_sha256,
+            date=date,
+        )
+
+    async def _payload_hash(self, body: bytes) -> str:
+        if self._secure:
+            return "UNSIGNED-PAYLOAD"
+        if not body:
+            return _EMPTY_SHA256
+        if len(body) < _INLINE_HASH_BYTES:
+            return _sha256(body)
+        return await run_in_threadpool(_sha256, body)
+
+    async def _request(
+        self,
+        method: str,
+        bucket: str,
+        object_name: str = "",
+        query: dict[str, str] | None = None,
+        headers: dict[str, str] | None = None,
+        body: bytes = b"",
+        stream: bool = False,
+    ) -> aiohttp.ClientResponse:
+        url = self._url(bucket, object_name, query)
+        content_sha256 = await self._payload_hash(body)
+        response = await self._session.request(
+            method,
+            URL(url, encoded=True),
+            headers=self._signed_headers(method, url, headers, content_sha256),
+            data=body or None,
+        )
+        if response.status >= 300:
+            await self._raise_error(response, bucket, object_name)
+        if not stream:
+            # Reading the whole body hands the connection back to the pool.
+            await response.read()
+        return response
+
+    async def _raise_error(
+        self, response: aiohttp.ClientResponse, bucket: str, object_name: str
+    ) -> None:
+        body = await response.read()
+        response.release()
+        raise _s3_error(
+            response.status,
+            response.reason,
+            response.headers,
+            body,
+            bucket,
+            object_name,
+        )
+
+    async def bucket_exists(self, bucket: str) -> bool:
+        try:
+            await self._request("HEAD", bucket)
+        except S3Error as exc:
+            if exc.code == "NoSuchBucket":
+                return False
+            raise
+        return True
+
+    async def make_bucket(self, bucket: str) -> None:
+        await self._request("PUT", bucket)
+
+    async def stat_object(
+        self, bucket: str, object_name: str
+    ) -> Mapping[str, str]:
+        response = await self._request("HEAD", bucket, object_name)
+        return response.headers
+
+    async def get_object(
+        self,
+        bucket: str,
+        object_name: str,
+        offset: int = 0,
+        length: int = 0,
+        chunk_size: int = 1024 * 1024,
+    ) -> ObjectStream:
+        headers = {}
+        if length:
+            headers["Range"] = f"bytes={offset}-{offset + length - 1}"
+        elif offset:
+            headers["Range"] = f"bytes={offset}-"
+        response = await self._request(
+            "GET", bucket, object_name, headers=headers, stream=True
+        )
+
+        async def release() -> None:
+            response.release()
+
+        return ObjectStream(
+            response.content.iter_chunked(chunk_size),
+            response.content_length or 0,
+            release,
+        )
+
+    async def put_object(
+        self,
+        bucket: str,
+        object_name: str,
+        data: BinaryIO,
+        content_type: str,
+        part_size: int,
+    ) -> None:
+        """Upload ``data`` of unknown length, one ``part_size`` part at a time."""
+        headers = {"Content-Type": content_type}
+        part = await run_in_threadpool(_read_part, data, part_size)
+        if len(part) < part_size:
+            await self._request("PUT", bucket, object_name, headers=headers, body=part)
+            return
+
+        response = await self._request(
+            "POST", bucket, object_name, query={"uploads": ""}, headers=headers
+        )
+        upload_id = _find_text(
+            ElementTree.fromstring(await response.read()), "UploadId"
+        )
+        if not upload_id:
+            raise S3Error(
+                response=None,
+                code="InvalidResponse",
+                message="Missing UploadId",
+                resource=f"/{bucket}/{object_name}",
+                request_id=None,
+                host_id=None,
+            )
+
+        etags: list[str] = []
+        try:
+            while part:
+                response = await self._request(
+                    "PUT",
+                    bucket,
+                    object_name,
+                    query={
+                        "partNumber": str(len(etags) + 1),
+                        "uploadId": upload_id,
+                    },
+                    body=part,
+                )
+                etags.append(response.headers.get("etag", ""))
+                part = await run_in_threadpool(_read_part, data, part_size)
+
+            manifest = "".join(
+                f"<Part><PartNumber>{number}</PartNumber><ETag>{etag}</ETag></Part>"
+                for number, etag in enumerate(etags, start=1)
+            )
+            response = await self._request(
+                "POST",
+                bucket,
+                object_name,
+                query={"uploadId": upload_id},
+                headers={"Content-Type": "application/xml"},
+                body=(
+                    f"<CompleteMultipartUpload>{manifest}</CompleteMultipartUpload>"
+                ).encode("utf-8"),
+            )
+            # Completion can fail after the 200 status has been sent, in
+            # which case the body is an error document.
+            body = await response.read()
+            if ElementTree.fromstring(body).tag.endswith("Error"):
+                raise _s3_error(
+                    response.status,
+                    response.reason,
+                    response.headers,
+                    body,
+                    bucket,
+                    object_name,
+                )
+        except BaseException:
+            try:
+                await self._request(
+                    "DELETE", bucket, object_name, query={"uploadId": upload_id}
+                )
+            except Exception:
+                log.warning("Failed to abort multipart upload %s", upload_id)
+            raise
+
+    async def remove_object(self, bucket: str, object_name: str) -> None:
+        await self._request("DELETE", bucket, object_name)
+
+    async def remove_objects(
+        self, bucket: str, object_names: list[str]
+    ) -> list[str]:
+        """Delete objects in bulk; returns the names that could not be deleted."""
+        failed: list[str] = []
+        for start in range(0, len(object_names), _MAX_DELETE_KEYS):
+            keys = "".join(
+                f"<Object><Key>{escape(name)}</Key></Object>"
+                for name in object_names[start : start + _MAX_DELETE_KEYS]
+            )
+            body = f"<Delete><Quiet>true</Quiet>{keys}</Delete>".encode("utf-8")
+            response = await self._request(
+                "POST",
+                bucket,
+                query={"delete": ""},
+                headers={
+                    "Content-Type": "application/xml",
+                    "Content-MD5": base64.b64encode(
+                        hashlib.md5(body).digest()
+                    ).decode("ascii"),
+                },
+                body=body,
+            )
+            root = ElementTree.fromstring(await response.read())
+            for error in [*root.iter(f"{_S3_NAMESPACE}Error"), *root.iter("Error")]:
+                if _find_text(error, "Code") != "NoSuchKey":
+                    failed.append(_find_text(error, "Key") or "")
+        return failed
+
+    async def list_objects(self, bucket: str, prefix: str) -> list[str]:
+        names: list[str] = []
+        query = {"list-type": "2", "prefix": prefix}
+        while True:
+            response = await self._request("GET", bucket, query=query)
+            root = ElementTree.fromstring(await response.read())
+            entries = [*root.iter(f"{_S3_NAMESPACE}Contents"), *root.iter("Contents")]
+            for contents in entries:
+                key = _find_text(contents, "Key")
+                if key:
+                    names.append(key)
+            token = _find_text(root, "NextContinuationToken")
+            if _find_text(root, "IsTruncated") != "true" or not token:
+                return names
+            query = {**query, "continuation-token": token}
@@ -1,8 +1,17 @@
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import Connection, text
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 
 from .settings import get_settings
 
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+# Arbitrary key for the advisory lock replicas take while migrating.
+_MIGRATION_LOCK_KEY = 7_304_116
+
 
 class Base(DeclarativeBase):
     pass
@@ -18,6 +27,23 @@ async def get_session() -> AsyncSession:
         yield session
 
 
-async def init_models() -> None:
+def _upgrade(connection: Connection) -> None:
+    if connection.dialect.name == "postgresql":
+        # Replicas starting together migrate one at a time; the rest find
+        # nothing left to do.
+        connection.execute(
+            text("SELECT pg_advisory_xact_lock(:key)"), {"key": _MIGRATION_LOCK_KEY}
+        )
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    config.attributes["connection"] = connection
+    # Read by migration 0005, which must not depend on the environment itself.
+    config.attributes["partition_images_by_expiry"] = (
+        settings.partition_images_by_expiry
+    )
+    command.upgrade(config, "head")
+
+
+async def run_migrations() -> None:
     async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_upgrade)
@@ -2,28 +2,59 @@ import logging
 
 from fastapi import FastAPI
 
+from common.metrics import MetricsMiddleware
+from common.tracing import TracingMiddleware, init_tracing, shutdown_tracing
+
 from .api.images import router as images_router
-from .cleanup import start_cleanup_task, stop_cleanup_task
-from .clients.minio_client import ensure_bucket
-from .db import engine, init_models
-from .messaging import close_rabbit, init_rabbit
+from .api.stats import router as stats_router
+from .cleanup import prepare_partitions, start_cleanup_task, stop_cleanup_task
+from .clients.minio_client import (
+    close_object_storage,
+    ensure_bucket,
+    init_object_storage,
+)
+from .db import engine, run_migrations
+from .messaging import (
+    close_rabbit,
+    init_rabbit,
+    start_event_publisher,
+    start_preview_consumer,
+    stop_event_publisher,
+    stop_preview_consumer,
+)
+from .metrics import REQUEST_SECONDS
+from .preview_events import handle_preview_generated
+from .settings import get_settings
 
 log = logging.getLogger("storage")
+settings = get_settings()
 
 app = FastAPI(title="Storage Service")
+app.add_middleware(MetricsMiddleware, histogram=REQUEST_SECONDS)
+app.add_middleware(TracingMiddleware)
 app.include_router(images_router)
+app.include_router(stats_router)
 
 
 @app.on_event("startup")
 async def on_startup() -> None:
-    await init_models()
+    init_tracing("storage", settings)
+    await run_migrations()
+    await prepare_partitions()
+    await init_object_storage()
     await ensure_bucket()
     await init_rabbit()
+    await start_event_publisher()
+    await start_preview_consumer(handle_preview_generated)
     await start_cleanup_task()
 
 
 @app.on_event("shutdown")
 async def on_shutdown() -> None:
     await stop_cleanup_task()
+    await stop_preview_consumer()
+    await stop_event_publisher()
     await close_rabbit()
+    await close_object_storage()
     await engine.dispose()
+    shutdown_tracing()
@@ -1,31 +1,53 @@
+import asyncio
 import json
 import logging
-from typing import Any
+from json import JSONDecodeError
+from typing import Any, Awaitable, Callable
 
+from common.tracing import inject, span
+
+from . import outbox
+from .publisher import Event, EventPublisher
 from .settings import get_settings
 
 log = logging.getLogger(__name__)
 settings = get_settings()
 
 try:
-    from aio_pika import Message, RobustChannel, RobustConnection, connect_robust
+    from aio_pika import (
+        DeliveryMode,
+        Message,
+        RobustChannel,
+        RobustConnection,
+        connect_robust,
+    )
 except Exception:  # pragma: no cover - optional at import time
-    Message = None
+    DeliveryMode = Message = None
     RobustChannel = RobustConnection = None
     connect_robust = None
 
+IMAGE_UPLOADED_QUEUE = "image.uploaded"
 
 rabbit_connection: RobustConnection | None = None
 rabbit_channel: RobustChannel | None = None
+publish_channel: RobustChannel | None = None
+event_publisher: EventPublisher | None = None
+_preview_consumer: tuple[Any, str] | None = None
 
 
 async def init_rabbit() -> None:
-    global rabbit_channel, rabbit_connection
+    global publish_channel, rabbit_channel, rabbit_connection
     if connect_robust is None:
         log.warning("aio-pika not available; skipping rabbitmq connection")
         return
     rabbit_connection = await connect_robust(settings.rabbitmq_url)
     rabbit_channel = await rabbit_connection.channel()
+    # Publishes on their own channel, with confirms, so an outstanding batch
+    # does not hold up consumer acks.
+    publish_channel = await rabbit_connection.channel(publisher_confirms=True)
+    # Declared here too (as the preview worker does) so uploads made before
+    # the worker first runs are kept.
+    await publish_channel.declare_queue(IMAGE_UPLOADED_QUEUE, durable=True)
 
 
 async def close_rabbit() -> None:
@@ -33,15 +55,114 @@ async def close_rabbit() -> None:
         await rabbit_connection.close()
 
 
+async def _send_events(events: list[Event]) -> list[Event]:
+    if publish_channel is None:
+        raise RuntimeError("RabbitMQ channel not initialized")
+    # Published concurrently, so the batch waits for its confirms together.
+    with span("rabbitmq.publish_batch", kind="producer", events=len(events)):
+        results = await asyncio.gather(
+            *(
+                publish_channel.default_exchange.publish(
+                    Message(
+                        body=json.dumps(event.payload).encode("utf-8"),
+                        content_type="application/json",
+                        delivery_mode=DeliveryMode.PERSISTENT,
+                        headers=event.headers,
+                    ),
+                    routing_key=event.routing_key,
+                )
+                for event in events
+            ),
+            return_exceptions=True,
+        )
+    return [
+        event
+        for event, result in zip(events, results)
+        if isinstance(result, BaseException)
+    ]
+
+
+async def start_event_publisher() -> None:
+    global event_publisher
+    if publish_channel is None:
+        log.warning("RabbitMQ channel not initialized; events will not be published")
+        return
+    use_outbox = settings.event_overflow == "outbox"
+    event_publisher = EventPublisher(
+        _send_events,
+        max_queue=settings.event_queue_size,
+        batch_size=settings.event_batch_size,
+        retry_initial=settings.event_retry_initial_seconds,
+        retry_max=settings.event_retry_max_seconds,
+        max_attempts=settings.event_max_attempts,
+        enqueue_timeout=settings.event_enqueue_timeout_seconds,
+        spill=outbox.add_events if use_outbox else None,
+        relay=(
+            (lambda: outbox.relay_events(_send_events, settings.event_batch_size))
+            if use_outbox
+            else None
+        ),
+        relay_interval=settings.event_outbox_poll_seconds,
+    )
+    event_publisher.start()
+
+
+async def stop_event_publisher() -> None:
+    global event_publisher
+    if event_publisher is not None:
+        await event_publisher.stop(settings.event_shutdown_timeout_seconds)
+        event_publisher = None
+
+
 async def publish_image_uploaded(payload: dict[str, Any]) -> None:
-    if rabbit_channel is None or Message is None:
-        log.warning("RabbitMQ channel not initialized; skipping publish")
+    """Queue an ``image.uploaded`` event; returns without waiting on RabbitMQ."""
+    if event_publisher is None:
+        log.warning("Event publisher not running; skipping publish")
         return
-    body = json.dumps(payload).encode("utf-8")
-    try:
-        await rabbit_channel.default_exchange.publish(
-            Message(body=body, content_type="application/json"),
-            routing_key="image.uploaded",
-        )
-    except Exception as exc:  # pragma: no cover - side effect with broker
-        log.error("Failed to publish event: %s", exc)
+    # The preview worker continues the trace from this span; time spent in
+    # the queues shows as the gap before its consumer span.
+    with span(f"publish {IMAGE_UPLOADED_QUEUE}", kind="producer"):
+        await event_publisher.publish(IMAGE_UPLOADED_QUEUE, payload, inject())
+
+
+async def start_preview_consumer(handler: Callable[[dict], Awaitable[None]]) -> None:
+    global _preview_consumer
+    if rabbit_channel is None:
+        log.warning("RabbitMQ channel not initialized; not consuming previews")
+        return
+
+    async def on_message(message) -> None:
+        try:
+            payload = json.loads(message.body.decode("utf-8"))
+        except JSONDecodeError:
+            log.error("Discarding preview event with invalid JSON payload")
+            await message.reject(requeue=False)
+            return
+        try:
+            with span(
+                f"process {settings.preview_generated_queue}",
+                parent=message.headers,
+                kind="consumer",
+            ):
+                await handler(payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Retry once, e.g. across a database failover, then give up.
+            log.exception("Failed to record preview event")
+            await message.nack(requeue=not message.redelivered)
+        else:
+            await message.ack()
+
+    queue = await rabbit_channel.declare_queue(
+        settings.preview_generated_queue, durable=True
+    )
+    _preview_consumer = (queue, await queue.consume(on_message))
+
+
+async def stop_preview_consumer() -> None:
+    global _preview_consumer
+    if _preview_consumer is not None:
+        queue, consumer_tag = _preview_consumer
+        _preview_consumer = None
+        await queue.cancel(consumer_tag)
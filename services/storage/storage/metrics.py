@@ -0,0 +1,31 @@
+"""Prometheus metrics for the storage service, served at ``/metrics``."""
+
+from prometheus_client import Counter, Histogram
+
+REQUEST_SECONDS = Histogram(
+    "storage_http_request_duration_seconds",
+    "Time from receiving a request to sending its response headers.",
+    ["method", "route", "status"],
+)
+OBJECT_STORAGE_SECONDS = Histogram(
+    "storage_object_storage_duration_seconds",
+    "Duration of MinIO calls; for streamed reads, until the stream opens.",
+    ["operation"],
+)
+OBJECT_STORAGE_BYTES = Counter(
+    "storage_object_storage_bytes",
+    "Bytes written to or read from MinIO.",
+    ["operation"],
+)
+DB_QUERY_SECONDS = Histogram(
+    "storage_db_query_duration_seconds",
+    "Duration of ImageRepository queries, including commits.",
+    ["query"],
+)
+CLEANUP_BATCH_SECONDS = Histogram(
+    "storage_cleanup_batch_duration_seconds",
+    "Duration of one expiry cleanup batch.",
+    ["kind"],
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120),
+)
+
@@ -0,0 +1,38 @@
+"""Create the images table.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+
+Databases set up before migrations existed already have the table, created
+by ``create_all``; this and the following revisions skip what is there.
+"""
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if sa.inspect(op.get_bind()).has_table("images"):
+        return
+    op.create_table(
+        "images",
+        sa.Column("id", postgresql.UUID(as_uuid=True), primary_key=True),
+        sa.Column("original_filename", sa.String(255), nullable=False),
+        sa.Column("object_name", sa.String(255), nullable=False),
+        sa.Column("bucket", sa.String(128), nullable=False),
+        sa.Column("content_type", sa.String(128), nullable=False),
+        sa.Column("size_bytes", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("images")
@@ -0,0 +1,31 @@
+"""Add images.content_hash for upload deduplication.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("images")}
+    if "content_hash" not in columns:
+        op.add_column(
+            "images", sa.Column("content_hash", sa.String(64), nullable=True)
+        )
+    op.create_index(
+        "ix_images_content_hash", "images", ["content_hash"], if_not_exists=True
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_images_content_hash", table_name="images")
+    op.drop_column("images", "content_hash")
@@ -0,0 +1,26 @@
+"""Index images by (expires_at, id) for the expiry cleanup.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_images_expires_at_id",
+        "images",
+        ["expires_at", "id"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_images_expires_at_id", table_name="images")
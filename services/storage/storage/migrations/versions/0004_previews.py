@@ -0,0 +1,25 @@
+"""Add the images.previews manifest.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    columns = {column["name"] for column in inspector.get_columns("images")}
+    if "previews" not in columns:
+        op.add_column("images", sa.Column("previews", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("images", "previews")
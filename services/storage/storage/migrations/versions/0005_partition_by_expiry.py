@@ -0,0 +1,124 @@
+"""Range-partition images by expiry day, if asked to.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18
+
+Only applies to PostgreSQL, and only when the migration run asks for it:
+the service passes STORAGE_PARTITION_IMAGES_BY_EXPIRY in the Alembic
+config, and from the CLI pass ``-x partition_images_by_expiry=true``. The
+table is rebuilt and its rows copied, so expect it to take a while on large
+tables. Partitions are created for the days existing rows expire on; the
+service creates those for new uploads at startup.
+
+To switch layouts later, downgrade to 0004 and upgrade to head asking for
+the other layout. That passes through 0007, which drops event_outbox, so
+drain the outbox first: stop the gateway so no uploads arrive, keep the
+storage service running until ``SELECT count(*) FROM event_outbox`` is 0,
+then stop it and migrate. 0007 refuses to drop an outbox that still holds
+events.
+"""
+
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+from alembic import context, op
+from sqlalchemy.dialects import postgresql
+
+from storage import partitions
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+_COLUMNS = (
+    "id, original_filename, object_name, bucket, content_type, size_bytes, "
+    "content_hash, created_at, expires_at, previews"
+)
+
+
+def _partitioning_requested() -> bool:
+    requested = context.config.attributes.get("partition_images_by_expiry")
+    if requested is None:
+        option = context.get_x_argument(as_dictionary=True).get(
+            "partition_images_by_expiry", ""
+        )
+        requested = option.lower() in ("1", "true", "yes")
+    return bool(requested)
+
+
+def _is_partitioned() -> bool:
+    result = op.get_bind().execute(sa.text(partitions.IS_PARTITIONED_SQL))
+    return bool(result.scalar())
+
+
+def _set_aside(old_name: str) -> None:
+    """Rename the current table so a new ``images`` can take its names."""
+    op.drop_index("ix_images_content_hash", table_name="images")
+    op.drop_index("ix_images_expires_at_id", table_name="images")
+    op.rename_table("images", old_name)
+    op.execute(
+        f"ALTER TABLE {old_name} RENAME CONSTRAINT images_pkey TO {old_name}_pkey"
+    )
+
+
+def _create_images(primary_key: list[str], **kwargs: object) -> None:
+    op.create_table(
+        "images",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("original_filename", sa.String(255), nullable=False),
+        sa.Column("object_name", sa.String(255), nullable=False),
+        sa.Column("bucket", sa.String(128), nullable=False),
+        sa.Column("content_type", sa.String(128), nullable=False),
+        sa.Column("size_bytes", sa.Integer(), nullable=False),
+        sa.Column("content_hash", sa.String(64), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("expires_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("previews", sa.JSON(), nullable=True),
+        sa.PrimaryKeyConstraint(*primary_key, name="images_pkey"),
+        **kwargs,
+    )
+    op.create_index("ix_images_content_hash", "images", ["content_hash"])
+    op.create_index("ix_images_expires_at_id", "images", ["expires_at", "id"])
+
+
+def _copy_from(old_name: str) -> None:
+    op.execute(
+        f"INSERT INTO images ({_COLUMNS}) SELECT {_COLUMNS} FROM {old_name}"
+    )
+    op.drop_table(old_name)
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or not _partitioning_requested():
+        return
+    if _is_partitioned():
+        return
+
+    _set_aside("images_unpartitioned")
+    # A partitioned table's primary key must include the partition key.
+    _create_images(
+        ["id", "expires_at"], postgresql_partition_by="RANGE (expires_at)"
+    )
+    op.execute(partitions.create_default_partition_sql())
+
+    now = datetime.now(timezone.utc)
+    oldest, newest = bind.execute(
+        sa.text("SELECT min(expires_at), max(expires_at) FROM images_unpartitioned")
+    ).one()
+    first, last = min(oldest or now, now), max(newest or now, now)
+    for day in partitions.days_between(first, last):
+        op.execute(partitions.create_partition_sql(partitions.partition_for(day)))
+    _copy_from("images_unpartitioned")
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    if bind.dialect.name != "postgresql" or not _is_partitioned():
+        return
+
+    _set_aside("images_partitioned")
+    _create_images(["id"])
+    _copy_from("images_partitioned")
@@ -0,0 +1,26 @@
+"""Index images by (created_at, id) for the keyset listing.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "ix_images_created_at_id",
+        "images",
+        ["created_at", "id"],
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_images_created_at_id", table_name="images")
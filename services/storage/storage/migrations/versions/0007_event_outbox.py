@@ -0,0 +1,40 @@
+"""Add the event_outbox table.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "event_outbox",
+        sa.Column(
+            "id",
+            sa.BigInteger().with_variant(sa.Integer(), "sqlite"),
+            primary_key=True,
+        ),
+        sa.Column("routing_key", sa.String(255), nullable=False),
+        sa.Column("payload", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    pending = op.get_bind().execute(
+        sa.text("SELECT count(*) FROM event_outbox")
+    ).scalar_one()
+    if pending:
+        raise RuntimeError(
+            f"event_outbox holds {pending} events not yet relayed; run the "
+            "storage service until it is empty before downgrading"
+        )
+    op.drop_table("event_outbox")
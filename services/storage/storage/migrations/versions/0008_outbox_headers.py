@@ -0,0 +1,22 @@
+"""Keep message headers (trace context) on outbox events.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-18
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("event_outbox", sa.Column("headers", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("event_outbox", "headers")
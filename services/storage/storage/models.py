@@ -1,7 +1,8 @@
 from datetime import datetime, timezone
+from typing import Any
 from uuid import UUID, uuid4
 
-from sqlalchemy import DateTime, Integer, String
+from sqlalchemy import JSON, BigInteger, DateTime, Index, Integer, String
 from sqlalchemy.dialects.postgresql import UUID as pgUUID
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -9,7 +10,14 @@ from .db import Base
 
 
 class Image(Base):
+    # The schema is managed by the migrations in storage/migrations. With
+    # partitioning enabled, the table's primary key is (id, expires_at).
     __tablename__ = "images"
+    # Keyset orders used by the expiry cleanup and by the listing.
+    __table_args__ = (
+        Index("ix_images_expires_at_id", "expires_at", "id"),
+        Index("ix_images_created_at_id", "created_at", "id"),
+    )
 
     id: Mapped[UUID] = mapped_column(
         pgUUID(as_uuid=True), primary_key=True, default=uuid4
@@ -19,7 +27,31 @@ class Image(Base):
     bucket: Mapped[str] = mapped_column(String(128))
     content_type: Mapped[str] = mapped_column(String(128))
     size_bytes: Mapped[int] = mapped_column(Integer)
+    content_hash: Mapped[str | None] = mapped_column(
+        String(64), index=True, nullable=True
+    )
     created_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
     expires_at: Mapped[datetime] = mapped_column(DateTime(timezone=True))
+    # Previews known to exist, as reported by the preview worker and the
+    # on-demand renderer; None until the first report arrives.
+    previews: Mapped[list[dict[str, Any]] | None] = mapped_column(
+        JSON, nullable=True
+    )
+
+
+class OutboxEvent(Base):
+    """An event kept for later when it could not be queued or published."""
+
+    __tablename__ = "event_outbox"
+
+    id: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer, "sqlite"), primary_key=True
+    )
+    routing_key: Mapped[str] = mapped_column(String(255))
+    payload: Mapped[dict[str, Any]] = mapped_column(JSON)
+    headers: Mapped[dict[str, str] | None] = mapped_column(JSON, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
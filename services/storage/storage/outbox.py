@@ -0,0 +1,45 @@
+from sqlalchemy import delete, select
+
+from .db import async_session
+from .models import OutboxEvent
+from .publisher import Event, SendBatch
+
+
+async def add_events(events: list[Event]) -> None:
+    async with async_session() as session:
+        session.add_all(
+            OutboxEvent(
+                routing_key=event.routing_key,
+                payload=event.payload,
+                headers=event.headers,
+            )
+            for event in events
+        )
+        await session.commit()
+
+
+async def relay_events(send: SendBatch, limit: int) -> int:
+    """Publish the oldest outbox events and delete the confirmed ones.
+
+    Rows are locked while they are published, so replicas relay disjoint
+    batches. Returns the number of events published.
+    """
+    async with async_session() as session:
+        result = await session.execute(
+            select(OutboxEvent)
+            .order_by(OutboxEvent.id)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        rows = list(result.scalars().all())
+        if not rows:
+            return 0
+        events = [Event(row.routing_key, row.payload, row.headers) for row in rows]
+        failed = {id(event) for event in await send(events)}
+        sent = [row.id for row, event in zip(rows, events) if id(event) not in failed]
+        if sent:
+            await session.execute(
+                delete(OutboxEvent).where(OutboxEvent.id.in_(sent))
+            )
+        await session.commit()
+        return len(sent)
@@ -0,0 +1,47 @@
+import base64
+import binascii
+import json
+from datetime import datetime, timezone
+from typing import NamedTuple
+from uuid import UUID
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class Cursor(NamedTuple):
+    """Position after the last listed image, in the listing's order."""
+
+    created_at: datetime
+    id: UUID
+    descending: bool
+
+
+def encode_cursor(cursor: Cursor) -> str:
+    created_at = cursor.created_at
+    if created_at.tzinfo is None:
+        # SQLite hands timestamps back without their UTC offset.
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    payload = json.dumps(
+        [created_at.isoformat(), str(cursor.id), cursor.descending],
+        separators=(",", ":"),
+    )
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> Cursor:
+    """Parse a token from ``encode_cursor``; raises ``InvalidCursor``."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, image_id, descending = json.loads(
+            base64.urlsafe_b64decode(padded.encode("ascii"))
+        )
+        cursor = Cursor(
+            datetime.fromisoformat(created_at), UUID(image_id), bool(descending)
+        )
+    except (AttributeError, binascii.Error, TypeError, ValueError) as exc:
+        raise InvalidCursor("Malformed cursor") from exc
+    if cursor.created_at.tzinfo is None:
+        raise InvalidCursor("Malformed cursor")
+    return cursor
@@ -0,0 +1,112 @@
+"""Daily range partitions of the images table by ``expires_at`` (PostgreSQL).
+
+Partitions are named ``images_pYYYYMMDD`` and cover one UTC day each. Rows
+whose day has no partition land in ``images_default``.
+"""
+
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import NamedTuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+log = logging.getLogger(__name__)
+
+TABLE = "images"
+DEFAULT_PARTITION = "images_default"
+_PREFIX = "images_p"
+
+IS_PARTITIONED_SQL = (
+    "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+    "WHERE partrelid = to_regclass('images'))"
+)
+_LIST_SQL = (
+    "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+    "WHERE i.inhparent = to_regclass('images')"
+)
+
+
+class Partition(NamedTuple):
+    name: str
+    start: datetime
+    end: datetime
+
+
+def partition_for(day: date) -> Partition:
+    start = datetime.combine(day, time(), tzinfo=timezone.utc)
+    return Partition(f"{_PREFIX}{day:%Y%m%d}", start, start + timedelta(days=1))
+
+
+def parse_partition(name: str) -> Partition | None:
+    if not name.startswith(_PREFIX):
+        return None
+    try:
+        day = datetime.strptime(name[len(_PREFIX) :], "%Y%m%d").date()
+    except ValueError:
+        return None
+    return partition_for(day)
+
+
+def days_between(first: datetime, last: datetime) -> list[date]:
+    """UTC days from ``first`` through ``last``, inclusive."""
+    start = first.astimezone(timezone.utc).date()
+    end = last.astimezone(timezone.utc).date()
+    return [start + timedelta(days=n) for n in range((end - start).days + 1)]
+
+
+def create_partition_sql(partition: Partition) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition.name} PARTITION OF {TABLE} "
+        f"FOR VALUES FROM ('{partition.start.isoformat()}') "
+        f"TO ('{partition.end.isoformat()}')"
+    )
+
+
+def create_default_partition_sql() -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} "
+        f"PARTITION OF {TABLE} DEFAULT"
+    )
+
+
+async def is_partitioned(session: AsyncSession) -> bool:
+    if session.bind.dialect.name != "postgresql":
+        return False
+    return bool((await session.execute(text(IS_PARTITIONED_SQL))).scalar())
+
+
+async def list_partitions(session: AsyncSession) -> list[Partition]:
+    """Daily partitions, oldest first; the default partition is left out."""
+    names = (await session.execute(text(_LIST_SQL))).scalars().all()
+    return sorted(
+        (p for p in map(parse_partition, names) if p is not None),
+        key=lambda p: p.start,
+    )
+
+
+async def ensure_partitions(session: AsyncSession, days: list[date]) -> None:
+    existing = {p.name for p in await list_partitions(session)}
+    for day in days:
+        partition = partition_for(day)
+        if partition.name in existing:
+            continue
+        try:
+            await session.execute(text(create_partition_sql(partition)))
+            await session.commit()
+        except DBAPIError as exc:
+            # Fails if the default partition already holds rows for that day;
+            # they stay there and are cleaned up row by row.
+            await session.rollback()
+            log.warning("Cannot create partition %s: %s", partition.name, exc)
+        else:
+            log.info("Created partition %s", partition.name)
+
+
+async def drop_partition(session: AsyncSession, partition: Partition) -> None:
+    await session.execute(
+        text(f"ALTER TABLE {TABLE} DETACH PARTITION {partition.name}")
+    )
+    await session.execute(text(f"DROP TABLE {partition.name}"))
+    await session.commit()
@@ -0,0 +1,38 @@
+import logging
+from typing import Any
+
+from .db import async_session
+from .repositories.image_repository import ImageRepository
+
+log = logging.getLogger(__name__)
+
+_ENTRY_FIELDS = ("size", "object_name", "content_type", "bytes", "width", "height")
+
+
+async def handle_preview_generated(payload: dict[str, Any]) -> None:
+    """Record the previews the preview worker stored for an object."""
+    bucket = payload.get("bucket")
+    object_name = payload.get("object_name")
+    entries = payload.get("previews")
+    if not bucket or not object_name or not isinstance(entries, list):
+        log.error("Discarding malformed preview event: %s", payload)
+        return
+    # The worker reports every preview it stored, so its entries mark the
+    # manifest as complete; on-demand renders only ever add one entry.
+    entries = [
+        {
+            "format": entry.get("format"),
+            **{f: entry[f] for f in _ENTRY_FIELDS},
+            "complete": True,
+        }
+        for entry in entries
+        if isinstance(entry, dict) and all(f in entry for f in _ENTRY_FIELDS)
+    ]
+
+    async with async_session() as session:
+        updated = await ImageRepository(session).add_previews(
+            bucket, object_name, entries
+        )
+    if not updated:
+        # The image expired (or was never saved) before its previews were done.
+        log.info("No images left for previews of %s/%s", bucket, object_name)
@@ -0,0 +1,120 @@
+import io
+from typing import Any, NamedTuple
+
+from PIL import Image
+
+from common.imaging import (
+    VARIANT_FORMATS,
+    encode,
+    fit,
+    flatten_palette,
+    resolve_format,
+)
+
+
+class RenderedPreview(NamedTuple):
+    content: bytes
+    width: int
+    height: int
+
+
+class PreviewError(ValueError):
+    """The original cannot be turned into a preview."""
+
+
+class ImageTooLargeError(PreviewError):
+    """The image has more pixels than the configured limit allows."""
+
+
+def _accept_qualities(accept: str) -> dict[str, float]:
+    qualities: dict[str, float] = {}
+    for item in accept.split(","):
+        media_type, *params = item.split(";")
+        quality = 1.0
+        for param in params:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[media_type.strip().lower()] = quality
+    return qualities
+
+
+def preview_candidates(
+    accept: str | None, variants: list[str]
+) -> list[str | None]:
+    """Preview encodings the client accepts, best first, ending with None.
+
+    ``None`` stands for the original's own format, which every client gets
+    as a fallback. Variants must be listed explicitly: browsers that cannot
+    decode WebP or AVIF still send ``*/*``.
+    """
+    qualities = _accept_qualities(accept or "")
+    accepted = [
+        variant
+        for variant in variants
+        if qualities.get(VARIANT_FORMATS[variant][1], 0.0) > 0
+    ]
+    accepted.sort(key=lambda variant: -qualities[VARIANT_FORMATS[variant][1]])
+    return [*accepted, None]
+
+
+def render_preview(
+    image_bytes: bytes,
+    size: int,
+    content_type: str | None,
+    max_pixels: int,
+    variant: str | None = None,
+) -> RenderedPreview:
+    """Encode a preview fitting a ``size`` box, as the preview worker does.
+
+    The preview keeps the original's format unless ``variant`` names one of
+    ``VARIANT_FORMATS``.
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            return _render(image, size, content_type, max_pixels, variant)
+    except PreviewError:
+        raise
+    except (OSError, ValueError, Image.DecompressionBombError) as exc:
+        # Not an image, or a corrupt or truncated one: decoding is lazy, so
+        # this can surface anywhere from open to save.
+        raise PreviewError(str(exc)) from exc
+
+
+def _render(
+    image: Image.Image,
+    size: int,
+    content_type: str | None,
+    max_pixels: int,
+    variant: str | None,
+) -> RenderedPreview:
+    if image.width * image.height > max_pixels:
+        raise ImageTooLargeError(
+            f"Image is {image.width}x{image.height}, over {max_pixels} pixels"
+        )
+    if variant:
+        output_format = VARIANT_FORMATS[variant][0]
+    else:
+        output_format = resolve_format(content_type, image.format)
+    target = fit(image.width, image.height, size)
+    image.draft(None, target)
+    preview = flatten_palette(image)
+    if target != preview.size:
+        preview = preview.resize(
+            target, Image.Resampling.LANCZOS, reducing_gap=3.0
+        )
+    return RenderedPreview(encode(preview, output_format), *preview.size)
+
+
+def merge_manifest(
+    manifest: list[dict[str, Any]] | None, entries: list[dict[str, Any]]
+) -> list[dict[str, Any]]:
+    """``manifest`` with ``entries`` added, one entry per size and format."""
+    merged = {
+        (entry["size"], entry.get("format")): entry
+        for entry in [*(manifest or []), *entries]
+    }
+    return [merged[key] for key in sorted(merged, key=lambda k: (k[0], k[1] or ""))]
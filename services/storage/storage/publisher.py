@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, NamedTuple
+
+log = logging.getLogger(__name__)
+
+
+class Event(NamedTuple):
+    routing_key: str
+    payload: dict[str, Any]
+    # Message headers, e.g. trace context.
+    headers: dict[str, str] | None = None
+
+
+# Sends a batch and returns those of its events the broker did not confirm.
+SendBatch = Callable[[list[Event]], Awaitable[list[Event]]]
+# Stores events durably (the outbox) for a later relay.
+Spill = Callable[[list[Event]], Awaitable[None]]
+# Publishes a batch from the outbox; returns how many rows it handled.
+Relay = Callable[[], Awaitable[int]]
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)]
+
+
+class EventPublisher:
+    """Publishes events in the background from a bounded in-memory queue.
+
+    ``publish`` only enqueues, so callers never wait on the broker while
+    there is room. A background task sends queued events in batches and
+    retries unconfirmed ones with jittered exponential backoff. Once the
+    queue is full, new events are handed to ``spill`` if there is one;
+    otherwise callers wait for room for up to ``enqueue_timeout`` seconds,
+    after which the event is dropped. With ``spill``, a batch that keeps
+    failing is spilled after ``max_attempts`` too, and ``relay`` is polled
+    to publish what was spilled.
+
+    Delivery is not guaranteed: queued events live only in memory, so they
+    are lost if the process dies before they are confirmed or spilled, and
+    a dropped event is gone for good. Events that reach the outbox are
+    delivered at least once, since a relay can repeat a batch that the
+    broker confirmed but the outbox did not yet forget.
+    """
+
+    def __init__(
+        self,
+        send: SendBatch,
+        max_queue: int,
+        batch_size: int,
+        retry_initial: float = 0.5,
+        retry_max: float = 30.0,
+        max_attempts: int = 5,
+        enqueue_timeout: float = 5.0,
+        spill: Spill | None = None,
+        relay: Relay | None = None,
+        relay_interval: float = 5.0,
+    ) -> None:
+        self._send = send
+        self._spill = spill
+        self._relay = relay
+        self._queue: asyncio.Queue[Event] = asyncio.Queue(max_queue)
+        self._batch_size = batch_size
+        self._retry_initial = retry_initial
+        self._retry_max = retry_max
+        self._max_attempts = max_attempts
+        self._enqueue_timeout = enqueue_timeout
+        self._relay_interval = relay_interval
+        self._in_flight: list[Event] = []
+        self._tasks: list[asyncio.Task] = []
+        self._latencies: deque[float] = deque(maxlen=1000)
+        self.published = 0
+        self.batches = 0
+        self.retries = 0
+        self.spilled = 0
+        self.relayed = 0
+        self.blocked = 0
+        self.dropped = 0
+
+    async def publish(
+        self,
+        routing_key: str,
+        payload: dict[str, Any],
+        headers: dict[str, str] | None = None,
+    ) -> None:
+        event = Event(routing_key, payload, headers)
+        try:
+            self._queue.put_nowait(event)
+            return
+        except asyncio.QueueFull:
+            pass
+        if self._spill is not None and await self._spill_events([event]):
+            return
+        self.blocked += 1
+        try:
+            await asyncio.wait_for(self._queue.put(event), self._enqueue_timeout)
+        except TimeoutError:
+            self.dropped += 1
+            log.error("Event queue full; dropped %s event", routing_key)
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks.append(asyncio.create_task(self._run()))
+            if self._relay is not None:
+                self._tasks.append(asyncio.create_task(self._relay_loop()))
+
+    async def stop(self, timeout: float) -> None:
+        """Give queued events up to ``timeout`` seconds to go out, then stop.
+
+        Whatever is left is spilled, or logged as lost without ``spill``.
+        """
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except TimeoutError:
+            pass
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+        leftover = list(self._in_flight)
+        self._in_flight = []
+        while not self._queue.empty():
+            leftover.append(self._queue.get_nowait())
+            self._queue.task_done()
+        if leftover and not (self._spill and await self._spill_events(leftover)):
+            self.dropped += len(leftover)
+            log.error("Lost %d unpublished events on shutdown", len(leftover))
+
+    async def _spill_events(self, events: list[Event]) -> bool:
+        try:
+            await self._spill(events)
+        except Exception:
+            log.exception("Failed to spill %d events to the outbox", len(events))
+            return False
+        self.spilled += len(events)
+        return True
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self._batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self._in_flight = batch
+            try:
+                await self._send_with_retry(batch)
+                self._in_flight = []
+            finally:
+                # On cancellation _in_flight is kept for stop() to spill.
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _send_with_retry(self, batch: list[Event]) -> None:
+        delay = self._retry_initial
+        pending = batch
+        attempt = 0
+        while True:
+            attempt += 1
+            started = time.monotonic()
+            try:
+                failed = await self._send(pending)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                log.warning("Failed to publish %d events: %s", len(pending), exc)
+                failed = pending
+            self._latencies.append(time.monotonic() - started)
+            self.batches += 1
+            self.published += len(pending) - len(failed)
+            if not failed:
+                return
+            pending = failed
+            self._in_flight = pending
+            if (
+                attempt >= self._max_attempts
+                and self._spill is not None
+                and await self._spill_events(pending)
+            ):
+                return
+            self.retries += 1
+            await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+            delay = min(delay * 2, self._retry_max)
+
+    async def _relay_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self._relay_interval)
+            # Leave the outbox alone while live traffic is backing up.
+            while self._queue.qsize() <= self._queue.maxsize // 2:
+                try:
+                    relayed = await self._relay()
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    log.exception("Failed to relay events from the outbox")
+                    break
+                self.relayed += relayed
+                if not relayed:
+                    break
+
+    def stats(self) -> dict[str, Any]:
+        latencies = list(self._latencies)
+        return {
+            "queue_depth": self._queue.qsize(),
+            "queue_size": self._queue.maxsize,
+            "published": self.published,
+            "batches": self.batches,
+            "retries": self.retries,
+            "spilled": self.spilled,
+            "relayed": self.relayed,
+            "blocked": self.blocked,
+            "dropped": self.dropped,
+            "publish_latency_ms": {
+                "p50": round(_percentile(latencies, 50) * 1000, 2),
+                "p99": round(_percentile(latencies, 99) * 1000, 2),
+                "max": round(max(latencies) * 1000, 2),
+            }
+            if latencies
+            else None,
+        }
@@ -0,0 +1,94 @@
+import re
+
+MAX_RANGES = 16
+
+_RANGE_SPEC = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range_header(header: str | None, size: int) -> list[tuple[int, int]] | None:
+    """Parse a ``Range`` header into sorted, merged, inclusive byte ranges.
+
+    Returns ``None`` when the whole representation should be served: no
+    header, a unit other than bytes, malformed syntax or too many ranges
+    (RFC 9110 lets servers ignore such headers). Raises
+    ``RangeNotSatisfiable`` when none of the requested ranges overlap the
+    representation.
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition("=")
+    if unit.strip().lower() != "bytes" or not specs.strip():
+        return None
+
+    parts = specs.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+
+    ranges: list[tuple[int, int]] = []
+    for part in parts:
+        match = _RANGE_SPEC.match(part)
+        if match is None:
+            return None
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None
+            if start >= size:
+                continue
+            ranges.append((start, min(end, size - 1)))
+        elif last:
+            suffix = int(last)
+            if suffix == 0 or size == 0:
+                continue
+            ranges.append((max(size - suffix, 0), size - 1))
+        else:
+            return None
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def content_range(start: int, end: int, size: int) -> str:
+    return f"bytes {start}-{end}/{size}"
+
+
+def multipart_part_header(
+    boundary: str, content_type: str, start: int, end: int, size: int
+) -> bytes:
+    return (
+        f"--{boundary}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Range: {content_range(start, end, size)}\r\n"
+        "\r\n"
+    ).encode("latin-1")
+
+
+def multipart_closing(boundary: str) -> bytes:
+    return f"--{boundary}--\r\n".encode("latin-1")
+
+
+def multipart_length(
+    ranges: list[tuple[int, int]], boundary: str, content_type: str, size: int
+) -> int:
+    """Exact body length of a ``multipart/byteranges`` response."""
+    length = len(multipart_closing(boundary))
+    for start, end in ranges:
+        header = multipart_part_header(boundary, content_type, start, end, size)
+        length += len(header) + (end - start + 1) + len(b"\r\n")
+    return length
@@ -1,32 +1,285 @@
-from datetime import datetime
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Iterator
 from uuid import UUID
 
-from sqlalchemy import select
+from sqlalchemy import Executable, Result, and_, delete, func, or_, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from common.tracing import span
+
+from ..cache import MISSING, TTLCache
+from ..metrics import DB_QUERY_SECONDS
 from ..models import Image
+from ..previews import merge_manifest
+from ..settings import get_settings
+
+settings = get_settings()
+
+# Rows only change through add_previews, which grows the preview manifest,
+# and are deleted only after expires_at. This replica invalidates what it
+# updates, but copies cached by other replicas can miss manifest entries
+# until they expire; readers then look the preview up in MinIO instead.
+# Rows still waiting for the preview worker's report are cached briefly, as
+# that report is the change most likely to follow.
+image_cache = TTLCache(settings.metadata_cache_size)
+
+
+@contextmanager
+def _observe(query_name: str) -> Iterator[None]:
+    with span(f"db.{query_name}"), DB_QUERY_SECONDS.labels(query_name).time():
+        yield
+
+
+def _snapshot(image: Image) -> dict[str, Any]:
+    return {
+        attr.key: getattr(image, attr.key)
+        for attr in Image.__mapper__.column_attrs
+    }
+
+
+def _cache_ttl(image: Image | None) -> float:
+    if image is None:
+        return settings.metadata_cache_negative_ttl_seconds
+    expires_at = image.expires_at
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+    ttl = min(settings.metadata_cache_ttl_seconds, remaining)
+    if not any(entry.get("complete") for entry in image.previews or []):
+        ttl = min(ttl, settings.metadata_cache_pending_previews_ttl_seconds)
+    return ttl
 
 
 class ImageRepository:
     def __init__(self, session: AsyncSession) -> None:
         self.session = session
 
+    async def _execute(self, query_name: str, statement: Executable) -> Result:
+        with _observe(query_name):
+            return await self.session.execute(statement)
+
     async def add(self, image: Image) -> Image:
         self.session.add(image)
-        await self.session.commit()
-        await self.session.refresh(image)
+        with _observe("add"):
+            await self.session.commit()
+            await self.session.refresh(image)
+        image_cache.invalidate(image.id)
         return image
 
     async def get(self, image_id: UUID) -> Image | None:
-        result = await self.session.execute(select(Image).where(Image.id == image_id))
+        """Fetch an image, serving hot and unknown ids from ``image_cache``.
+
+        Cache hits return a detached copy that must not be modified or
+        deleted through the session.
+        """
+        cached = image_cache.get(image_id)
+        if cached is not MISSING:
+            return Image(**cached) if cached is not None else None
+
+        # Expired rows can outlive expires_at until cleanup (up to a day
+        # with partitioning), so they are filtered out here.
+        result = await self._execute(
+            "get",
+            select(Image).where(
+                Image.id == image_id, Image.expires_at > datetime.now(timezone.utc)
+            ),
+        )
+        image = result.scalar_one_or_none()
+        image_cache.set(
+            image_id,
+            _snapshot(image) if image is not None else None,
+            _cache_ttl(image),
+        )
+        return image
+
+    async def get_many(self, image_ids: list[UUID]) -> dict[UUID, Image]:
+        """Fetch several images at once, keyed by id; unknown ids are left out.
+
+        Like ``get``, ids in ``image_cache`` are served from it, and the rest
+        are loaded with a single query.
+        """
+        found: dict[UUID, Image] = {}
+        uncached: list[UUID] = []
+        for image_id in image_ids:
+            cached = image_cache.get(image_id)
+            if cached is MISSING:
+                uncached.append(image_id)
+            elif cached is not None:
+                found[image_id] = Image(**cached)
+        if not uncached:
+            return found
+
+        result = await self._execute(
+            "get_many",
+            select(Image).where(
+                Image.id.in_(uncached), Image.expires_at > datetime.now(timezone.utc)
+            ),
+        )
+        for image in result.scalars().all():
+            found[image.id] = image
+        for image_id in uncached:
+            image = found.get(image_id)
+            image_cache.set(
+                image_id,
+                _snapshot(image) if image is not None else None,
+                _cache_ttl(image),
+            )
+        return found
+
+    async def list_page(
+        self,
+        limit: int,
+        after: tuple[datetime, UUID] | None = None,
+        descending: bool = False,
+        content_type: str | None = None,
+        expires_after: datetime | None = None,
+        expires_before: datetime | None = None,
+    ) -> list[Image]:
+        """One page of unexpired images in ``(created_at, id)`` order.
+
+        Pass the last row's ``(created_at, id)`` as ``after`` to continue.
+        """
+        now = datetime.now(timezone.utc)
+        query = select(Image).where(
+            Image.expires_at > max(expires_after or now, now)
+        )
+        if expires_before is not None:
+            query = query.where(Image.expires_at <= expires_before)
+        if content_type is not None:
+            query = query.where(Image.content_type == content_type)
+        if after is not None:
+            created_at, image_id = after
+            # Bounded on created_at alone too, as in list_expired.
+            if descending:
+                query = query.where(
+                    Image.created_at <= created_at,
+                    or_(
+                        Image.created_at < created_at,
+                        and_(Image.created_at == created_at, Image.id < image_id),
+                    ),
+                )
+            else:
+                query = query.where(
+                    Image.created_at >= created_at,
+                    or_(
+                        Image.created_at > created_at,
+                        and_(Image.created_at == created_at, Image.id > image_id),
+                    ),
+                )
+        if descending:
+            query = query.order_by(Image.created_at.desc(), Image.id.desc())
+        else:
+            query = query.order_by(Image.created_at, Image.id)
+        result = await self._execute("list_page", query.limit(limit))
+        return list(result.scalars().all())
+
+    async def find_by_content_hash(
+        self,
+        content_hash: str,
+        bucket: str,
+        content_type: str,
+        expires_after: datetime,
+    ) -> Image | None:
+        result = await self._execute(
+            "find_by_content_hash",
+            select(Image)
+            .where(
+                Image.content_hash == content_hash,
+                Image.bucket == bucket,
+                Image.content_type == content_type,
+                Image.expires_at > expires_after,
+            )
+            .order_by(Image.expires_at.desc())
+            .limit(1),
+        )
         return result.scalar_one_or_none()
 
-    async def list_expired(self, now: datetime) -> list[Image]:
-        result = await self.session.execute(
-            select(Image).where(Image.expires_at <= now)
+    async def count_references_many(
+        self,
+        bucket: str,
+        object_names: list[str],
+        expiring_from: datetime | None = None,
+    ) -> dict[str, int]:
+        """Number of rows referencing each of ``object_names``.
+
+        With ``expiring_from``, only rows expiring at or after it count.
+        """
+        query = select(Image.object_name, func.count()).where(
+            Image.bucket == bucket, Image.object_name.in_(object_names)
+        )
+        if expiring_from is not None:
+            query = query.where(Image.expires_at >= expiring_from)
+        result = await self._execute(
+            "count_references_many", query.group_by(Image.object_name)
+        )
+        return dict(result.tuples().all())
+
+    async def list_expired(
+        self,
+        now: datetime,
+        limit: int,
+        after: tuple[datetime, UUID] | None = None,
+        partition: str | None = None,
+    ) -> list[Image]:
+        """One page of expired images in ``(expires_at, id)`` order.
+
+        Pass the last row's ``(expires_at, id)`` as ``after`` to continue.
+        With ``partition``, only rows stored in that partition are listed.
+        """
+        query = select(Image).where(Image.expires_at <= now)
+        if partition is not None:
+            query = query.where(
+                text("images.tableoid = to_regclass(:partition)").bindparams(
+                    partition=partition
+                )
+            )
+        if after is not None:
+            expires_at, image_id = after
+            # The redundant lower bound lets the index scan start at the
+            # cursor; the OR alone is applied as a filter from the start.
+            query = query.where(
+                Image.expires_at >= expires_at,
+                or_(
+                    Image.expires_at > expires_at,
+                    and_(Image.expires_at == expires_at, Image.id > image_id),
+                ),
+            )
+        result = await self._execute(
+            "list_expired", query.order_by(Image.expires_at, Image.id).limit(limit)
         )
         return list(result.scalars().all())
 
-    async def delete(self, image: Image) -> None:
-        await self.session.delete(image)
-        await self.session.commit()
+    async def add_previews(
+        self, bucket: str, object_name: str, entries: list[dict[str, Any]]
+    ) -> int:
+        """Record ``entries`` on every image sharing the object.
+
+        The rows are locked while their manifests are merged, so concurrent
+        reports (worker and on-demand renders) do not drop each other's
+        entries. Returns the number of images updated.
+        """
+        with _observe("add_previews"):
+            result = await self.session.execute(
+                select(Image)
+                .where(Image.bucket == bucket, Image.object_name == object_name)
+                .with_for_update()
+            )
+            images = list(result.scalars().all())
+            for image in images:
+                image.previews = merge_manifest(image.previews, entries)
+            await self.session.commit()
+        for image in images:
+            image_cache.invalidate(image.id)
+        return len(images)
+
+    async def delete_many(self, image_ids: list[UUID]) -> None:
+        with _observe("delete_many"):
+            await self.session.execute(
+                delete(Image)
+                .where(Image.id.in_(image_ids))
+                .execution_options(synchronize_session=False)
+            )
+            await self.session.commit()
+        for image_id in image_ids:
+            image_cache.invalidate(image_id)
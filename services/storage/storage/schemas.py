@@ -1,7 +1,20 @@
 from datetime import datetime
 from uuid import UUID
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+
+from .settings import get_settings
+
+settings = get_settings()
+
+
+class PreviewInfo(BaseModel):
+    size: int
+    format: str | None = None
+    content_type: str
+    bytes: int
+    width: int
+    height: int
 
 
 class ImageResponse(BaseModel):
@@ -11,8 +24,27 @@ class ImageResponse(BaseModel):
     bucket: str
     content_type: str
     size_bytes: int
+    content_hash: str | None = None
     created_at: datetime
     expires_at: datetime
+    previews: list[PreviewInfo] | None = None
 
     class Config:
         from_attributes = True
+
+
+class ImageLookupRequest(BaseModel):
+    # Bounded here so oversized lookups fail validation before reaching the
+    # endpoint; duplicates count towards the limit.
+    ids: list[UUID] = Field(max_length=settings.lookup_max_ids)
+
+
+class ImageLookupResponse(BaseModel):
+    images: list[ImageResponse]
+    missing: list[UUID]
+
+
+class ImageListResponse(BaseModel):
+    images: list[ImageResponse]
+    # Pass back as ``cursor`` for the next page; None on the last page.
+    next_cursor: str | None = None
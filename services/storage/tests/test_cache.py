@@ -0,0 +1,58 @@
+from storage.cache import MISSING, TTLCache
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_get_distinguishes_missing_from_cached_none() -> None:
+    cache = TTLCache(10)
+
+    assert cache.get("unknown") is MISSING
+    cache.set("unknown", None, ttl=5)
+    assert cache.get("unknown") is None
+
+
+def test_entries_expire_individually() -> None:
+    clock = FakeClock()
+    cache = TTLCache(10, clock=clock)
+    cache.set("short", 1, ttl=5)
+    cache.set("long", 2, ttl=60)
+
+    clock.now = 5
+    assert cache.get("short") is MISSING
+    assert cache.get("long") == 2
+
+
+def test_least_recently_used_entry_is_evicted() -> None:
+    cache = TTLCache(2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    cache.get("a")
+
+    cache.set("c", 3, ttl=60)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_and_non_positive_ttl() -> None:
+    cache = TTLCache(10)
+    cache.set("a", 1, ttl=60)
+    cache.invalidate("a")
+    cache.set("b", 2, ttl=0)
+
+    assert cache.get("a") is MISSING
+    assert cache.get("b") is MISSING
+
+
+def test_zero_capacity_disables_cache() -> None:
+    cache = TTLCache(0)
+    cache.set("a", 1, ttl=60)
+
+    assert cache.get("a") is MISSING
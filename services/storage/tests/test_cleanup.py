@@ -0,0 +1,187 @@
+import asyncio
+import os
+import time
+from datetime import date, datetime, timedelta, timezone
+from uuid import uuid4
+
+# Provide minimal settings so storage.settings.Settings can be constructed
+os.environ.setdefault("STORAGE_DATABASE_URL", "postgresql+asyncpg://test@localhost/test")
+os.environ.setdefault("STORAGE_MINIO_ENDPOINT", "localhost:9000")
+os.environ.setdefault("STORAGE_MINIO_ACCESS_KEY", "test-access-key")
+os.environ.setdefault("STORAGE_MINIO_SECRET_KEY", "test-secret-key")
+
+from storage import cleanup, partitions
+from storage.cleanup import _manifest_previews, _objects_to_remove
+from storage.models import Image
+
+
+def _image(
+    object_name: str,
+    previews: list[dict] | None = None,
+    expires_at: datetime | None = None,
+) -> Image:
+    return Image(
+        id=uuid4(),
+        original_filename="a.png",
+        object_name=object_name,
+        bucket="images",
+        content_type="image/png",
+        size_bytes=1,
+        expires_at=expires_at or datetime.now(timezone.utc),
+        previews=previews,
+    )
+
+
+class FakeSession:
+    def expunge_all(self) -> None:
+        pass
+
+
+class FakeRepository:
+    """Serves one partition's rows and counts later references to them."""
+
+    def __init__(self, rows: list[Image], later: dict[str, int]) -> None:
+        self.rows = rows
+        self.later = later
+        self.session = FakeSession()
+
+    async def list_expired(self, now, limit, after=None, partition=None):
+        if after is not None:
+            return []
+        return self.rows[:limit]
+
+    async def count_references_many(self, bucket, names, expiring_from=None):
+        return {name: self.later.get(name, 0) for name in names}
+
+    async def delete_many(self, image_ids):
+        self.deleted = image_ids
+
+
+def test_objects_removed_only_when_all_references_expire() -> None:
+    rows = {
+        ("images", "solo.png"): [_image("solo.png")],
+        ("images", "shared.png"): [_image("shared.png")],
+        ("images", "both.png"): [_image("both.png"), _image("both.png")],
+    }
+    references = {
+        ("images", "solo.png"): 1,
+        ("images", "shared.png"): 2,
+        ("images", "both.png"): 2,
+    }
+
+    assert _objects_to_remove(rows, references) == [
+        ("images", "solo.png"),
+        ("images", "both.png"),
+    ]
+
+
+def test_objects_without_remaining_rows_are_removed() -> None:
+    rows = {("images", "gone.png"): [_image("gone.png")]}
+
+    assert _objects_to_remove(rows, {}) == [("images", "gone.png")]
+
+
+def test_delete_batch_keeps_objects_still_referenced(monkeypatch) -> None:
+    rows = [
+        _image("solo.png"),
+        _image("both-expired.png"),
+        _image("both-expired.png"),
+        _image("shared.png"),
+    ]
+    removed = []
+
+    async def remove_objects(keys, known_previews):
+        removed.extend(keys)
+        return set()
+
+    monkeypatch.setattr(cleanup, "_remove_objects", remove_objects)
+    # Counts cover every row, expired or not: shared.png has a live one too.
+    repo = FakeRepository(
+        rows, later={"solo.png": 1, "both-expired.png": 2, "shared.png": 2}
+    )
+
+    count = asyncio.run(cleanup._delete_batch(repo, rows))
+
+    assert count == 4
+    assert removed == [("images", "solo.png"), ("images", "both-expired.png")]
+    assert repo.deleted == [image.id for image in rows]
+
+
+def test_manifest_previews_union_shared_rows() -> None:
+    rows = [
+        _image("a.png", [{"size": 64, "object_name": "a_64.png", "complete": True}]),
+        _image(
+            "a.png",
+            [
+                {"size": 64, "object_name": "a_64.png", "complete": True},
+                {"size": 64, "format": "webp", "object_name": "a_64.webp"},
+            ],
+        ),
+    ]
+
+    assert _manifest_previews(rows) == ["a_64.png", "a_64.webp"]
+
+
+def test_manifest_previews_unknown_without_every_manifest() -> None:
+    rows = [_image("a.png", []), _image("a.png")]
+
+    assert _manifest_previews(rows) is None
+
+
+def test_manifest_previews_unknown_until_the_worker_reports() -> None:
+    # Only an on-demand render is recorded; the worker's previews may exist.
+    rows = [_image("a.png", [{"size": 100, "object_name": "a_100.png"}])]
+
+    assert _manifest_previews(rows) is None
+
+
+def test_clear_partition_spares_objects_referenced_after_it(monkeypatch) -> None:
+    partition = partitions.partition_for(date(2026, 10, 18))
+    rows = [
+        _image("solo.png", expires_at=partition.start),
+        _image("shared.png", expires_at=partition.start),
+    ]
+    removed = []
+
+    async def remove_objects(keys, known_previews):
+        removed.extend(keys)
+        return set()
+
+    monkeypatch.setattr(cleanup, "_remove_objects", remove_objects)
+    repo = FakeRepository(rows, later={"shared.png": 1})
+
+    count = asyncio.run(
+        cleanup._clear_partition(repo, partition, partition.end + timedelta(days=1))
+    )
+
+    assert count == 2
+    assert removed == [("images", "solo.png")]
+
+
+def test_drop_expired_partitions_keeps_those_left_incomplete(monkeypatch) -> None:
+    now = datetime(2026, 10, 21, 12, tzinfo=timezone.utc)
+    days = [date(2026, 10, 18), date(2026, 10, 19), date(2026, 10, 20), now.date()]
+    listed = [partitions.partition_for(day) for day in days]
+    incomplete = listed[1]
+    dropped = []
+
+    async def list_partitions(session):
+        return listed
+
+    async def drop_partition(session, partition):
+        dropped.append(partition)
+
+    async def clear_partition(repo, partition, now):
+        return None if partition == incomplete else 3
+
+    monkeypatch.setattr(partitions, "list_partitions", list_partitions)
+    monkeypatch.setattr(partitions, "drop_partition", drop_partition)
+    monkeypatch.setattr(cleanup, "_clear_partition", clear_partition)
+
+    rows = asyncio.run(
+        cleanup._drop_expired_partitions(None, now, time.monotonic() + 60)
+    )
+
+    # Today's partition has not fully expired and stops the walk.
+    assert dropped == [listed[0], listed[2]]
+    assert rows == 6
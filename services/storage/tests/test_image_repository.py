@@ -0,0 +1,96 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+# Provide minimal settings so storage.settings.Settings can be constructed
+os.environ.setdefault("STORAGE_DATABASE_URL", "postgresql+asyncpg://test@localhost/test")
+os.environ.setdefault("STORAGE_MINIO_ENDPOINT", "localhost:9000")
+os.environ.setdefault("STORAGE_MINIO_ACCESS_KEY", "test-access-key")
+os.environ.setdefault("STORAGE_MINIO_SECRET_KEY", "test-secret-key")
+
+from storage.models import Image
+from storage.repositories.image_repository import (
+    ImageRepository,
+    _cache_ttl,
+    image_cache,
+)
+from storage.settings import get_settings
+
+
+class FakeResult:
+    def __init__(self, rows: list[Image]) -> None:
+        self.rows = rows
+
+    def scalars(self) -> "FakeResult":
+        return self
+
+    def all(self) -> list[Image]:
+        return self.rows
+
+
+class FakeSession:
+    def __init__(self, rows: list[Image]) -> None:
+        self.rows = rows
+        self.queries = 0
+
+    async def execute(self, query: object) -> FakeResult:
+        self.queries += 1
+        return FakeResult(self.rows)
+
+
+def _image() -> Image:
+    now = datetime.now(timezone.utc)
+    return Image(
+        id=uuid4(),
+        original_filename="a.png",
+        object_name="a.png",
+        bucket="images",
+        content_type="image/png",
+        size_bytes=1,
+        created_at=now,
+        expires_at=now + timedelta(hours=1),
+    )
+
+
+def test_get_many_loads_uncached_ids_in_one_query() -> None:
+    image_cache.clear()
+    first, second = _image(), _image()
+    unknown = uuid4()
+    session = FakeSession([first, second])
+
+    found = asyncio.run(
+        ImageRepository(session).get_many([first.id, second.id, unknown])
+    )
+
+    assert session.queries == 1
+    assert set(found) == {first.id, second.id}
+
+
+def test_get_many_serves_cached_ids_without_querying() -> None:
+    image_cache.clear()
+    image = _image()
+    unknown = uuid4()
+    asyncio.run(ImageRepository(FakeSession([image])).get_many([image.id, unknown]))
+    session = FakeSession([])
+
+    found = asyncio.run(ImageRepository(session).get_many([image.id, unknown]))
+
+    assert session.queries == 0
+    assert list(found) == [image.id]
+    assert found[image.id].object_name == "a.png"
+
+
+def test_images_awaiting_the_worker_are_cached_briefly() -> None:
+    settings = get_settings()
+    pending = _image()
+    on_demand = _image()
+    on_demand.previews = [{"size": 256, "format": None, "object_name": "p"}]
+    reported = _image()
+    reported.previews = [
+        {"size": 256, "format": None, "object_name": "p", "complete": True}
+    ]
+
+    assert _cache_ttl(pending) == settings.metadata_cache_pending_previews_ttl_seconds
+    assert _cache_ttl(on_demand) == _cache_ttl(pending)
+    assert _cache_ttl(reported) == settings.metadata_cache_ttl_seconds
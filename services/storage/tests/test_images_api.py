@@ -0,0 +1,186 @@
+import hashlib
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+# Provide minimal settings so storage.settings.Settings can be constructed
+os.environ.setdefault("STORAGE_DATABASE_URL", "postgresql+asyncpg://test@localhost/test")
+os.environ.setdefault("STORAGE_MINIO_ENDPOINT", "localhost:9000")
+os.environ.setdefault("STORAGE_MINIO_ACCESS_KEY", "test-access-key")
+os.environ.setdefault("STORAGE_MINIO_SECRET_KEY", "test-secret-key")
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy.sql import Select
+
+from storage.api import images
+from storage.api.images import router
+from storage.db import get_session
+from storage.models import Image
+
+
+class FakeResult:
+    def scalars(self) -> "FakeResult":
+        return self
+
+    def all(self) -> list:
+        return []
+
+
+class FakeSession:
+    def __init__(self) -> None:
+        self.statements: list[Select] = []
+
+    async def execute(self, statement: Select) -> FakeResult:
+        self.statements.append(statement)
+        return FakeResult()
+
+
+def _client(session: FakeSession) -> TestClient:
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_session] = lambda: session
+    return TestClient(app)
+
+
+def test_list_images_reads_naive_expiry_bounds_as_utc() -> None:
+    session = FakeSession()
+
+    response = _client(session).get(
+        "/images",
+        params={
+            "expires_after": "2999-01-01T00:00:00",
+            "expires_before": "2999-01-02T00:00:00",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {"images": [], "next_cursor": None}
+    bounds = sorted(
+        value
+        for value in session.statements[0].compile().params.values()
+        if isinstance(value, datetime)
+    )
+    assert bounds == [
+        datetime(2999, 1, 1, tzinfo=timezone.utc),
+        datetime(2999, 1, 2, tzinfo=timezone.utc),
+    ]
+
+
+class FakeRepository:
+    """Finds ``existing`` by content hash and type, and keeps what is added."""
+
+    def __init__(self, existing: Image) -> None:
+        self.existing = existing
+        self.added: list[Image] = []
+
+    def __call__(self, session: FakeSession) -> "FakeRepository":
+        return self
+
+    async def find_by_content_hash(
+        self,
+        content_hash: str,
+        bucket: str,
+        content_type: str,
+        expires_after: datetime,
+    ) -> Image | None:
+        assert expires_after > datetime.now(timezone.utc)
+        if (content_hash, content_type) == (
+            self.existing.content_hash,
+            self.existing.content_type,
+        ):
+            return self.existing
+        return None
+
+    async def add(self, image: Image) -> Image:
+        self.added.append(image)
+        return image
+
+
+def _deduplicating_upload(
+    monkeypatch, content_type: str
+) -> tuple[dict, Image, list[str], list[dict]]:
+    """Upload b"png" while an image with the same bytes, as PNG, exists."""
+    now = datetime.now(timezone.utc)
+    existing = Image(
+        id=uuid4(),
+        original_filename="first.png",
+        object_name="first.png",
+        bucket=images.settings.minio_bucket,
+        content_type="image/png",
+        size_bytes=3,
+        content_hash=hashlib.sha256(b"png").hexdigest(),
+        previews=[
+            {
+                "size": 256,
+                "format": None,
+                "object_name": "first_256.png",
+                "content_type": "image/png",
+                "bytes": 10,
+                "width": 4,
+                "height": 4,
+                "complete": True,
+            }
+        ],
+        created_at=now,
+        expires_at=now + timedelta(days=1),
+    )
+    uploaded: list[str] = []
+    published: list[dict] = []
+
+    async def upload_image(object_name, data, content_type):
+        uploaded.append(object_name)
+        content = data.read()
+        return len(content), hashlib.sha256(content).hexdigest()
+
+    async def publish_image_uploaded(payload):
+        published.append(payload)
+
+    monkeypatch.setattr(images.settings, "deduplicate_uploads", True)
+    monkeypatch.setattr(images, "ImageRepository", FakeRepository(existing))
+    monkeypatch.setattr(images, "upload_image", upload_image)
+    monkeypatch.setattr(images, "publish_image_uploaded", publish_image_uploaded)
+
+    response = _client(FakeSession()).post(
+        "/images", files={"file": ("second.png", b"png", content_type)}
+    )
+
+    assert response.status_code == 201
+    return response.json(), existing, uploaded, published
+
+
+def test_duplicate_upload_reuses_the_stored_object(monkeypatch) -> None:
+    body, existing, uploaded, published = _deduplicating_upload(
+        monkeypatch, "image/png"
+    )
+
+    assert body["object_name"] == "first.png"
+    assert body["id"] != str(existing.id)
+    assert body["size_bytes"] == 3
+    assert body["content_hash"] == existing.content_hash
+    assert [preview["size"] for preview in body["previews"]] == [256]
+    # Nothing is written to MinIO and no second preview job is queued.
+    assert uploaded == []
+    assert published == []
+
+
+def test_same_bytes_of_another_type_are_stored_separately(monkeypatch) -> None:
+    body, existing, uploaded, published = _deduplicating_upload(
+        monkeypatch, "image/jpeg"
+    )
+
+    assert body["object_name"] != "first.png"
+    assert body["content_type"] == "image/jpeg"
+    assert body["previews"] is None
+    assert uploaded == [body["object_name"]]
+    assert len(published) == 1
+
+
+def test_lookup_rejects_more_ids_than_allowed() -> None:
+    session = FakeSession()
+    ids = [str(uuid4()) for _ in range(images.settings.lookup_max_ids + 1)]
+
+    response = _client(session).post("/images/lookup", json={"ids": ids})
+
+    assert response.status_code == 422
+    assert session.statements == []
@@ -0,0 +1,65 @@
+import os
+
+# Provide minimal settings so storage.settings.Settings can be constructed
+os.environ.setdefault("STORAGE_DATABASE_URL", "postgresql+asyncpg://test@localhost/test")
+os.environ.setdefault("STORAGE_MINIO_ENDPOINT", "localhost:9000")
+os.environ.setdefault("STORAGE_MINIO_ACCESS_KEY", "test-access-key")
+os.environ.setdefault("STORAGE_MINIO_SECRET_KEY", "test-secret-key")
+
+import pytest
+import sqlalchemy as sa
+from alembic import command
+from alembic.config import Config
+
+from storage.db import MIGRATIONS_DIR
+
+
+def _migrate(
+    connection: sa.Connection, revision: str, downgrade: bool = False
+) -> None:
+    config = Config()
+    config.set_main_option("script_location", str(MIGRATIONS_DIR))
+    config.attributes["connection"] = connection
+    # Asked for, but SQLite cannot partition: 0005 must leave images alone.
+    config.attributes["partition_images_by_expiry"] = True
+    if downgrade:
+        command.downgrade(config, revision)
+    else:
+        command.upgrade(config, revision)
+
+
+def test_sqlite_upgrades_to_head_and_back() -> None:
+    engine = sa.create_engine("sqlite://")
+    with engine.begin() as connection:
+        _migrate(connection, "head")
+        inspector = sa.inspect(connection)
+        columns = {column["name"] for column in inspector.get_columns("images")}
+        indexes = {index["name"] for index in inspector.get_indexes("images")}
+        tables = set(inspector.get_table_names())
+
+        _migrate(connection, "base", downgrade=True)
+        remaining = set(sa.inspect(connection).get_table_names())
+
+    assert {"content_hash", "previews", "expires_at", "created_at"} <= columns
+    assert {"ix_images_content_hash", "ix_images_expires_at_id"} <= indexes
+    assert {"images", "event_outbox", "alembic_version"} <= tables
+    assert remaining == {"alembic_version"}
+
+
+def test_downgrade_refuses_to_drop_unrelayed_outbox_events() -> None:
+    engine = sa.create_engine("sqlite://")
+    with engine.begin() as connection:
+        _migrate(connection, "head")
+        connection.execute(
+            sa.text(
+                "INSERT INTO event_outbox (routing_key, payload, created_at) "
+                "VALUES ('image.uploaded', '{}', '2026-10-18 00:00:00')"
+            )
+        )
+
+        with pytest.raises(RuntimeError, match="1 events not yet relayed"):
+            _migrate(connection, "0006", downgrade=True)
+
+        tables = set(sa.inspect(connection).get_table_names())
+
+    assert "event_outbox" in tables
@@ -0,0 +1,27 @@
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+
+from storage.pagination import Cursor, InvalidCursor, decode_cursor, encode_cursor
+
+
+def test_cursor_round_trips() -> None:
+    cursor = Cursor(datetime(2026, 10, 18, 12, 30, tzinfo=timezone.utc), uuid4(), True)
+
+    assert decode_cursor(encode_cursor(cursor)) == cursor
+
+
+def test_naive_timestamps_are_taken_as_utc() -> None:
+    image_id = uuid4()
+    token = encode_cursor(Cursor(datetime(2026, 10, 18, 12, 30), image_id, False))
+
+    assert decode_cursor(token) == Cursor(
+        datetime(2026, 10, 18, 12, 30, tzinfo=timezone.utc), image_id, False
+    )
+
+
+@pytest.mark.parametrize("token", ["", "not-base64!", "WzEsMiwzXQ", "bnVsbA"])
+def test_malformed_cursors_are_rejected(token: str) -> None:
+    with pytest.raises(InvalidCursor):
+        decode_cursor(token)
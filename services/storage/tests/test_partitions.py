@@ -0,0 +1,38 @@
+from datetime import date, datetime, timezone
+
+from storage.partitions import (
+    create_partition_sql,
+    days_between,
+    parse_partition,
+    partition_for,
+)
+
+
+def test_partition_covers_one_utc_day() -> None:
+    partition = partition_for(date(2026, 10, 18))
+
+    assert partition.name == "images_p20261018"
+    assert partition.start == datetime(2026, 10, 18, tzinfo=timezone.utc)
+    assert partition.end == datetime(2026, 10, 19, tzinfo=timezone.utc)
+    assert create_partition_sql(partition) == (
+        "CREATE TABLE IF NOT EXISTS images_p20261018 PARTITION OF images "
+        "FOR VALUES FROM ('2026-10-18T00:00:00+00:00') "
+        "TO ('2026-10-19T00:00:00+00:00')"
+    )
+
+
+def test_parse_partition_round_trips_and_skips_others() -> None:
+    assert parse_partition("images_p20261018") == partition_for(date(2026, 10, 18))
+    assert parse_partition("images_default") is None
+    assert parse_partition("images_pnotadate") is None
+
+
+def test_days_between_is_inclusive_in_utc() -> None:
+    first = datetime(2026, 10, 18, 23, 30, tzinfo=timezone.utc)
+    last = datetime(2026, 10, 20, 1, 0, tzinfo=timezone.utc)
+
+    assert days_between(first, last) == [
+        date(2026, 10, 18),
+        date(2026, 10, 19),
+        date(2026, 10, 20),
+    ]
@@ -0,0 +1,111 @@
+import io
+
+import pytest
+from PIL import Image
+
+from storage.previews import (
+    ImageTooLargeError,
+    PreviewError,
+    merge_manifest,
+    preview_candidates,
+    render_preview,
+)
+
+
+def _encode(image: Image.Image, fmt: str) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def test_render_preview_fits_box_in_original_format() -> None:
+    original = _encode(Image.new("RGB", (1200, 800), (0, 128, 255)), "JPEG")
+
+    rendered = render_preview(original, 300, "image/jpeg", max_pixels=10_000_000)
+
+    assert (rendered.width, rendered.height) == (300, 200)
+    with Image.open(io.BytesIO(rendered.content)) as preview:
+        assert preview.format == "JPEG"
+        assert preview.size == (300, 200)
+
+
+def test_render_preview_does_not_upscale() -> None:
+    original = _encode(Image.new("RGBA", (40, 20)), "PNG")
+
+    rendered = render_preview(original, 300, "image/png", max_pixels=10_000_000)
+
+    with Image.open(io.BytesIO(rendered.content)) as preview:
+        assert preview.size == (40, 20)
+
+
+def test_render_preview_enforces_pixel_limit() -> None:
+    original = _encode(Image.new("RGB", (200, 200)), "PNG")
+
+    with pytest.raises(ImageTooLargeError):
+        render_preview(original, 64, "image/png", max_pixels=10_000)
+
+
+def test_render_preview_rejects_non_images() -> None:
+    with pytest.raises(PreviewError):
+        render_preview(b"not an image", 64, "image/png", max_pixels=10_000)
+
+
+def test_render_preview_rejects_truncated_images() -> None:
+    photo = Image.effect_noise((1200, 800), 40).convert("RGB")
+    original = _encode(photo, "JPEG")
+
+    with pytest.raises(PreviewError):
+        render_preview(
+            original[: len(original) // 3], 300, "image/jpeg", max_pixels=10_000_000
+        )
+
+
+def test_render_preview_encodes_variant() -> None:
+    original = _encode(Image.new("P", (400, 400)), "PNG")
+
+    rendered = render_preview(
+        original, 100, "image/png", max_pixels=10_000_000, variant="webp"
+    )
+
+    with Image.open(io.BytesIO(rendered.content)) as preview:
+        assert preview.format == "WEBP"
+        assert preview.size == (100, 100)
+
+
+@pytest.mark.parametrize(
+    ("accept", "expected"),
+    [
+        (None, [None]),
+        ("*/*", [None]),
+        ("image/*,*/*;q=0.8", [None]),
+        ("image/avif,image/webp,*/*", ["avif", "webp", None]),
+        ("image/webp,image/avif;q=0.9", ["webp", "avif", None]),
+        ("image/avif;q=0, image/webp", ["webp", None]),
+    ],
+)
+def test_preview_candidates_follow_accept(
+    accept: str | None, expected: list[str | None]
+) -> None:
+    assert preview_candidates(accept, ["avif", "webp"]) == expected
+
+
+def test_preview_candidates_only_offer_configured_variants() -> None:
+    assert preview_candidates("image/avif,image/webp", ["webp"]) == ["webp", None]
+
+
+def test_merge_manifest_replaces_entries_per_size_and_format() -> None:
+    manifest = [
+        {"size": 512, "format": None, "bytes": 10},
+        {"size": 256, "format": None, "bytes": 5},
+    ]
+    entries = [
+        {"size": 256, "format": "webp", "bytes": 3},
+        {"size": 512, "format": None, "bytes": 11},
+    ]
+
+    assert merge_manifest(manifest, entries) == [
+        {"size": 256, "format": None, "bytes": 5},
+        {"size": 256, "format": "webp", "bytes": 3},
+        {"size": 512, "format": None, "bytes": 11},
+    ]
+    assert merge_manifest(None, entries[:1]) == entries[:1]
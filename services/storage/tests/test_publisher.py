@@ -0,0 +1,170 @@
+import asyncio
+
+from storage.publisher import Event, EventPublisher
+
+
+class FakeBroker:
+    def __init__(self, failures: int = 0) -> None:
+        # Every batch fails its first event this many times.
+        self.failures = failures
+        self.batches: list[list[Event]] = []
+
+    async def send(self, events: list[Event]) -> list[Event]:
+        self.batches.append(list(events))
+        if self.failures:
+            self.failures -= 1
+            return events[:1]
+        return []
+
+
+def _publisher(broker: FakeBroker, **kwargs: object) -> EventPublisher:
+    options = {"max_queue": 100, "batch_size": 10, "retry_initial": 0.001}
+    options.update(kwargs)
+    return EventPublisher(broker.send, **options)
+
+
+def test_publish_sends_queued_events_in_batches() -> None:
+    broker = FakeBroker()
+
+    async def scenario() -> EventPublisher:
+        publisher = _publisher(broker, batch_size=10)
+        for n in range(25):
+            await publisher.publish("image.uploaded", {"n": n})
+        publisher.start()
+        await publisher.stop(timeout=1)
+        return publisher
+
+    publisher = asyncio.run(scenario())
+
+    assert [len(batch) for batch in broker.batches] == [10, 10, 5]
+    assert [e.payload["n"] for b in broker.batches for e in b] == list(range(25))
+    stats = publisher.stats()
+    assert stats["published"] == 25
+    assert stats["queue_depth"] == 0
+    assert stats["publish_latency_ms"]["max"] >= 0
+
+
+def test_only_unconfirmed_events_are_retried() -> None:
+    broker = FakeBroker(failures=2)
+
+    async def scenario() -> EventPublisher:
+        publisher = _publisher(broker)
+        for n in range(3):
+            await publisher.publish("image.uploaded", {"n": n})
+        publisher.start()
+        await publisher.stop(timeout=1)
+        return publisher
+
+    publisher = asyncio.run(scenario())
+
+    assert [len(batch) for batch in broker.batches] == [3, 1, 1]
+    assert publisher.stats()["published"] == 3
+    assert publisher.stats()["retries"] == 2
+
+
+def test_failing_batch_is_spilled_after_max_attempts() -> None:
+    broker = FakeBroker(failures=100)
+    spilled: list[Event] = []
+
+    async def spill(events: list[Event]) -> None:
+        spilled.extend(events)
+
+    async def scenario() -> EventPublisher:
+        publisher = _publisher(broker, max_attempts=3, spill=spill)
+        await publisher.publish("image.uploaded", {"n": 1})
+        publisher.start()
+        await publisher.stop(timeout=1)
+        return publisher
+
+    publisher = asyncio.run(scenario())
+
+    assert len(broker.batches) == 3
+    assert spilled == [Event("image.uploaded", {"n": 1})]
+    assert publisher.stats()["spilled"] == 1
+
+
+def test_full_queue_spills_without_waiting() -> None:
+    spilled: list[Event] = []
+
+    async def spill(events: list[Event]) -> None:
+        spilled.extend(events)
+
+    async def scenario() -> None:
+        publisher = _publisher(FakeBroker(), max_queue=2, spill=spill)
+        for n in range(5):
+            await publisher.publish("image.uploaded", {"n": n})
+
+    asyncio.run(scenario())
+
+    assert [e.payload["n"] for e in spilled] == [2, 3, 4]
+
+
+def test_full_queue_without_spill_drops_after_timeout() -> None:
+    async def scenario() -> EventPublisher:
+        publisher = _publisher(FakeBroker(), max_queue=1, enqueue_timeout=0.01)
+        await publisher.publish("image.uploaded", {"n": 1})
+        await publisher.publish("image.uploaded", {"n": 2})
+        return publisher
+
+    stats = asyncio.run(scenario()).stats()
+
+    assert stats["blocked"] == 1
+    assert stats["dropped"] == 1
+    assert stats["queue_depth"] == 1
+
+
+def test_stop_spills_events_it_could_not_send() -> None:
+    spilled: list[Event] = []
+
+    async def hang(events: list[Event]) -> list[Event]:
+        await asyncio.sleep(10)
+        return []
+
+    async def spill(events: list[Event]) -> None:
+        spilled.extend(events)
+
+    async def scenario() -> None:
+        publisher = EventPublisher(hang, max_queue=10, batch_size=2, spill=spill)
+        for n in range(3):
+            await publisher.publish("image.uploaded", {"n": n})
+        publisher.start()
+        await asyncio.sleep(0)
+        await publisher.stop(timeout=0.01)
+
+    asyncio.run(scenario())
+
+    assert sorted(e.payload["n"] for e in spilled) == [0, 1, 2]
+
+
+def test_relay_publishes_spilled_events_while_queue_is_quiet() -> None:
+    relayed = [5, 2, 0]
+
+    async def relay() -> int:
+        return relayed.pop(0) if relayed else 0
+
+    async def scenario() -> EventPublisher:
+        publisher = _publisher(FakeBroker(), relay=relay, relay_interval=0.001)
+        publisher.start()
+        await asyncio.sleep(0.05)
+        await publisher.stop(timeout=1)
+        return publisher
+
+    assert asyncio.run(scenario()).stats()["relayed"] == 7
+
+
+def test_relay_runs_with_a_single_slot_queue() -> None:
+    relayed = [1, 0]
+
+    async def relay() -> int:
+        return relayed.pop(0) if relayed else 0
+
+    async def scenario() -> EventPublisher:
+        publisher = _publisher(
+            FakeBroker(), max_queue=1, relay=relay, relay_interval=0.001
+        )
+        publisher.start()
+        await asyncio.sleep(0.05)
+        await publisher.stop(timeout=1)
+        return publisher
+
+    assert asyncio.run(scenario()).stats()["relayed"] == 1
@@ -0,0 +1,60 @@
+import pytest
+
+from storage.ranges import (
+    RangeNotSatisfiable,
+    multipart_closing,
+    multipart_length,
+    multipart_part_header,
+    parse_range_header,
+)
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("bytes=0-99", [(0, 99)]),
+        ("bytes=100-", [(100, 999)]),
+        ("bytes=-100", [(900, 999)]),
+        ("bytes=900-2000", [(900, 999)]),
+        ("bytes=-5000", [(0, 999)]),
+        ("bytes=0-9, 20-29", [(0, 9), (20, 29)]),
+        ("bytes=20-29,0-9", [(0, 9), (20, 29)]),
+        ("bytes=0-9,5-19,20-29", [(0, 29)]),
+        ("bytes=0-9,2000-3000", [(0, 9)]),
+    ],
+)
+def test_parse_range_header(header: str, expected: list[tuple[int, int]]) -> None:
+    assert parse_range_header(header, 1000) == expected
+
+
+@pytest.mark.parametrize(
+    "header",
+    [None, "", "items=0-9", "bytes=", "bytes=abc", "bytes=9-0", "bytes=-"],
+)
+def test_parse_range_header_ignores_invalid(header: str | None) -> None:
+    assert parse_range_header(header, 1000) is None
+
+
+def test_parse_range_header_ignores_too_many_ranges() -> None:
+    header = "bytes=" + ",".join(f"{i * 10}-{i * 10 + 1}" for i in range(50))
+    assert parse_range_header(header, 1000) is None
+
+
+@pytest.mark.parametrize(
+    ("header", "size"),
+    [("bytes=1000-", 1000), ("bytes=-0", 1000), ("bytes=0-", 0)],
+)
+def test_parse_range_header_unsatisfiable(header: str, size: int) -> None:
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range_header(header, size)
+
+
+def test_multipart_length_matches_rendered_body() -> None:
+    ranges = [(0, 9), (20, 29)]
+    body = b""
+    for start, end in ranges:
+        body += multipart_part_header("b0undary", "image/png", start, end, 100)
+        body += b"x" * (end - start + 1) + b"\r\n"
+    body += multipart_closing("b0undary")
+
+    assert multipart_length(ranges, "b0undary", "image/png", 100) == len(body)
@@ -0,0 +1,175 @@
+import asyncio
+import io
+import socket
+import threading
+import time
+from typing import Iterator
+
+import pytest
+import uvicorn
+from minio.error import S3Error
+from starlette.requests import Request
+from starlette.responses import Response
+
+from benchmarks.fake_s3 import FakeS3
+from storage.clients.s3_async import AsyncS3Client
+
+ACCESS_KEY = "test-access-key"
+SECRET_KEY = "test-secret-key"
+
+
+class FailingCompletionS3(FakeS3):
+    """Answers CompleteMultipartUpload with a 200 carrying an error document."""
+
+    async def object(self, request: Request) -> Response:
+        if request.method == "POST" and "uploadId" in request.query_params:
+            return Response(
+                "<Error><Code>InternalError</Code><Message>We encountered an "
+                "internal error</Message></Error>",
+                media_type="application/xml",
+            )
+        return await super().object(request)
+
+
+def _serve(fake: FakeS3) -> Iterator[str]:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    server = uvicorn.Server(
+        uvicorn.Config(fake.app(), host="127.0.0.1", port=port, log_level="error")
+    )
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+@pytest.fixture(scope="module")
+def fake() -> FakeS3:
+    return FakeS3(credentials=(ACCESS_KEY, SECRET_KEY))
+
+
+@pytest.fixture(scope="module")
+def endpoint(fake: FakeS3) -> Iterator[str]:
+    yield from _serve(fake)
+
+
+def _run(endpoint: str, scenario, secret_key: str = SECRET_KEY, **kwargs):
+    async def main():
+        client = AsyncS3Client(endpoint, ACCESS_KEY, secret_key, **kwargs)
+        try:
+            if not await client.bucket_exists("images"):
+                await client.make_bucket("images")
+            return await scenario(client)
+        finally:
+            await client.aclose()
+
+    return asyncio.run(main())
+
+
+async def _read(client: AsyncS3Client, name: str, **kwargs) -> tuple[bytes, int]:
+    stream = await client.get_object("images", name, **kwargs)
+    return b"".join([chunk async for chunk in stream]), stream.size
+
+
+def test_signed_requests_round_trip_awkward_names(endpoint: str) -> None:
+    name = "dir/a file+ü&x=1.png"
+
+    async def scenario(client: AsyncS3Client):
+        await client.put_object(
+            "images", name, io.BytesIO(b"content"), "image/png", part_size=1024
+        )
+        stat = await client.stat_object("images", name)
+        return stat, await _read(client, name), await client.list_objects(
+            "images", "dir/"
+        )
+
+    stat, (body, size), names = _run(endpoint, scenario)
+
+    assert stat["content-type"] == "image/png"
+    assert (body, size) == (b"content", 7)
+    assert name in names
+
+
+def test_bad_signature_is_rejected(endpoint: str) -> None:
+    async def scenario(client: AsyncS3Client):
+        await client.stat_object("images", "missing")
+
+    with pytest.raises(S3Error) as exc_info:
+        _run(endpoint, scenario, secret_key="wrong")
+
+    assert exc_info.value.code == "HTTP403"
+
+
+def test_multipart_upload_joins_parts(endpoint: str, fake: FakeS3) -> None:
+    content = bytes(range(256)) * 400
+
+    async def scenario(client: AsyncS3Client):
+        await client.put_object(
+            "images", "big.bin", io.BytesIO(content), "image/png", part_size=40_000
+        )
+        return await _read(client, "big.bin")
+
+    assert _run(endpoint, scenario) == (content, len(content))
+    assert fake.uploads == {}
+
+
+def test_ranged_get_reports_the_range_length(endpoint: str) -> None:
+    async def scenario(client: AsyncS3Client):
+        await client.put_object(
+            "images", "range.txt", io.BytesIO(b"0123456789"), "text/plain", 1024
+        )
+        return await _read(client, "range.txt", offset=2, length=3)
+
+    assert _run(endpoint, scenario) == (b"234", 3)
+
+
+def test_missing_objects_raise_no_such_key(endpoint: str) -> None:
+    async def get(client: AsyncS3Client):
+        await client.get_object("images", "missing")
+
+    async def stat(client: AsyncS3Client):
+        await client.stat_object("images", "missing")
+
+    for scenario in (get, stat):
+        with pytest.raises(S3Error) as exc_info:
+            _run(endpoint, scenario)
+        assert exc_info.value.code == "NoSuchKey"
+
+
+def test_closing_an_unread_stream_releases_its_connection(endpoint: str) -> None:
+    async def scenario(client: AsyncS3Client):
+        await client.put_object(
+            "images", "held.txt", io.BytesIO(b"x" * 10), "text/plain", 1024
+        )
+        for _ in range(3):
+            stream = await asyncio.wait_for(
+                client.get_object("images", "held.txt"), timeout=2
+            )
+            await stream.aclose()
+
+    # With a single connection, a leaked one would block the next request.
+    _run(endpoint, scenario, max_connections=1)
+
+
+def test_error_document_in_completion_aborts_the_upload() -> None:
+    fake = FailingCompletionS3(credentials=(ACCESS_KEY, SECRET_KEY))
+
+    async def scenario(client: AsyncS3Client):
+        await client.put_object(
+            "images", "big.bin", io.BytesIO(b"x" * 100), "image/png", part_size=40
+        )
+
+    for endpoint in _serve(fake):
+        with pytest.raises(S3Error) as exc_info:
+            _run(endpoint, scenario)
+
+    assert exc_info.value.code == "InternalError"
+    assert fake.uploads == {}
+    assert "big.bin" not in fake.buckets["images"]
+
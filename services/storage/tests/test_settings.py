@@ -32,8 +32,45 @@ def test_allowed_content_types_accepts_list() -> None:
     assert settings.allowed_content_types == values
 
 
-@pytest.mark.parametrize("field", ["image_ttl_seconds", "cleanup_interval_seconds"])
+@pytest.mark.parametrize(
+    "field",
+    ["image_ttl_seconds", "cleanup_interval_seconds", "presigned_url_ttl_seconds"],
+)
 def test_numeric_fields_must_be_positive(field: str) -> None:
     with pytest.raises(ValueError):
         _build_settings(**{field: 0})
 
+
+def test_upload_part_size_must_meet_minio_minimum() -> None:
+    with pytest.raises(ValueError):
+        _build_settings(upload_part_size=1024 * 1024)
+
+    settings = _build_settings(upload_part_size=16 * 1024 * 1024)
+    assert settings.upload_part_size == 16 * 1024 * 1024
+
+
+def test_presigned_url_refresh_must_be_shorter_than_ttl() -> None:
+    with pytest.raises(ValueError):
+        _build_settings(presigned_url_ttl_seconds=60, presigned_url_refresh_seconds=60)
+
+    settings = _build_settings(
+        presigned_url_ttl_seconds=600, presigned_url_refresh_seconds=30
+    )
+    assert settings.presigned_url_refresh_seconds == 30
+
+
+def test_presigned_url_ttl_capped_at_seven_days() -> None:
+    with pytest.raises(ValueError):
+        _build_settings(presigned_url_ttl_seconds=8 * 24 * 60 * 60)
+
+
+def test_preview_sizes_whitelist_and_range() -> None:
+    settings = _build_settings(preview_sizes="128, 640", preview_max_size=0)
+    assert settings.preview_sizes == [128, 640]
+    assert settings.is_preview_size_allowed(640)
+    assert not settings.is_preview_size_allowed(300)
+
+    settings = _build_settings(preview_sizes=[128], preview_max_size=2048)
+    assert settings.is_preview_size_allowed(300)
+    assert not settings.is_preview_size_allowed(4096)
+    assert not settings.is_preview_size_allowed(0)